@@ -41,10 +41,15 @@ class ArgumentParser:
         # Set version
         parser.version = __version__
 
-        parser.add_argument('-f',
+        inputs = parser.add_mutually_exclusive_group(required=True)
+        inputs.add_argument('-f',
             '--file', dest="file",
-            help='Input NetWas file - tab seperated txt or csv file',
-            required=True)
+            help='Input NetWas file - tab seperated txt or csv file')
+
+        inputs.add_argument('-c',
+            '--config', dest="config",
+            help='Configuration file (e.g. config.yml) - parse the NetWas files of all '\
+                'traits in default: traits: in parallel')
 
         parser.add_argument('-t',
             '--threshold', dest="threshold",
@@ -53,9 +58,16 @@ class ArgumentParser:
 
         parser.add_argument('-o',
             '--output', dest="output",
-            help='Location and name of the ouput file.',
+            help='Location and name of the ouput file. With --config the output '\
+                'directory, the results of each trait are written to <output>/<trait>.txt',
             required=True)
 
+        parser.add_argument('-w',
+            '--workers', dest="workers",
+            help='Number of traits that are parsed at the same time with --config, '\
+                'default = number of traits (at most the number of CPUs)',
+            default=None, type=int)
+
         parser.add_argument('--gene_list', dest="gene_list",
             help='Specify if only gene symbols are written out."\
                 "Default is NetWas file with filtered genes',
@@ -141,3 +153,18 @@ class CLIArgValidator:
         """
         if not input_path.suffix in [".txt", ".csv"]:
             raise FileNotFoundError('Input file should be either a .txt or .csv')
+
+    def validate_config_file(self, config_path: str) -> None:
+        """
+        Validate the configuration file by checking if it actually exists
+        and if it is a yaml file.
+
+        :parameters
+        -----------
+        config_path - str
+            Path to a configuration file
+        """
+        config_path = Path(config_path)
+        self._validate_input_exists(config_path)
+        if not config_path.suffix in [".yml", ".yaml"]:
+            raise FileNotFoundError('Configuration file should be either a .yml or .yaml')
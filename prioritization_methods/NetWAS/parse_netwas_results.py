@@ -4,8 +4,14 @@
 Module for parsing the results produced by NetWAS.
 """
 
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
 import pandas as pd
+import yaml
 from arg_parser import ArgumentParser, CLIArgValidator
 
 
@@ -14,6 +20,13 @@ __version__ = "v0.1"
 __date__ = "20-5-2022"
 
 
+# Number of lines at the start of a file that are used to find the preamble and delimiter
+SAMPLE_LINES = 200
+
+# Delimiters that are tried, in order of preference. None means any whitespace
+DELIMITERS = ["\t", ",", ";", None]
+
+
 class NetWasParser:
     """
     A class to parse the results produced by NetWAS.
@@ -47,8 +60,8 @@ class NetWasParser:
         else:
             self.write_netwas_data(filtered_df, self.output_file)
 
-    @staticmethod
-    def read_netwas_data(file: Path) -> pd.DataFrame:
+    @classmethod
+    def read_netwas_data(cls, file: Path) -> pd.DataFrame:
         """
         Read in a NetWas result file
 
@@ -57,10 +70,81 @@ class NetWasParser:
         file - Path
             File containing NetWas results
         """
-        df = pd.read_csv(file, sep=None, skiprows=28,
-                        names= ["Gene", "label", "score"], engine='python')
+        skiprows, delimiter = cls.detect_format(file)
+        df = pd.read_csv(file, sep=r"\s+" if delimiter is None else delimiter,
+                        skiprows=skiprows, header=None, names=["Gene", "label", "score"],
+                        dtype={"Gene": str, "label": str, "score": np.float64}, engine="c")
         return df
 
+    @staticmethod
+    def is_data_line(line: str, delimiter: str) -> bool:
+        """
+        Check if a line is a row of NetWas results: a gene, training label and
+        numeric NetWas score.
+
+        :parameters
+        -----------
+        line - str
+            Line of a NetWas file
+        delimiter - str
+            Delimiter of the columns, None for any whitespace
+
+        :returns
+        --------
+        data - bool
+            If the line is a row of results
+        """
+        fields = line.split(delimiter)
+        if len(fields) != 3:
+            return False
+        try:
+            float(fields[2].strip().strip('"'))
+        except ValueError:
+            return False
+        return True
+
+    @classmethod
+    def detect_format(cls, file: Path) -> Tuple[int, str]:
+        """
+        Find the number of preamble lines (the header that NetWAS adds to its output)
+        and the delimiter of a NetWas file from its first lines. The results start at
+        the first line from which all lines of the sample are rows of results.
+
+        :parameters
+        -----------
+        file - Path
+            File containing NetWas results
+
+        :returns
+        --------
+        skiprows - int
+            Number of lines before the results
+        delimiter - str
+            Delimiter of the columns, None for any whitespace
+
+        :raises
+        -------
+        ValueError
+            No results were found in the first lines of the file
+        """
+        with open(file, "r", encoding="utf-8") as file_handler:
+            lines = [line.rstrip("\r\n") for _, line in zip(range(SAMPLE_LINES), file_handler)]
+        # Empty lines at the end of the file (or sample) are not part of the results
+        while lines and not lines[-1].strip():
+            lines.pop()
+
+        best = None
+        for delimiter in DELIMITERS:
+            start = len(lines)
+            while start > 0 and cls.is_data_line(lines[start - 1], delimiter):
+                start -= 1
+            if start < len(lines) and (best is None or start < best[0]):
+                best = (start, delimiter)
+
+        if best is None:
+            raise ValueError(f"No NetWas results found in the first {SAMPLE_LINES} lines of {file}")
+        return best
+
     @staticmethod
     def get_prioritized_genes(df:pd.DataFrame, threshold:float) -> pd.DataFrame:
         """
@@ -113,6 +197,92 @@ class NetWasParser:
             pass
 
 
+def get_config(file: Path) -> dict:
+    """
+    Read in config file and return it as a dictionary.
+
+    :parameter
+    ----------
+    file - str
+        Configuration file in yaml format
+
+    :returns
+    --------
+    config - dict
+        Configuration file in dictionary form.
+    """
+    with open(file, 'r', encoding="utf-8") as stream:
+        config = yaml.safe_load(stream)
+
+    return config
+
+
+def parse_trait(file: Path, output_file: Path, threshold: float, gene_list: bool) -> Path:
+    """
+    Parse the NetWas results of one trait.
+
+    :parameters
+    -----------
+    file - Path
+        File containing NetWas results
+    output_file - Path
+        Name and location of the output file
+    threshold - float
+        Threshold to decide which gene to keep - used on the NetWas score column
+    gene_list - Boolean
+        Flag specifying wheter or not to write out all the columns or only the gene names
+
+    :returns
+    --------
+    output_file - Path
+        Name and location of the output file
+    """
+    NetWasParser(file=file, output_file=output_file).parse_data(threshold=threshold,
+                                                                gene_list=gene_list)
+    return output_file
+
+
+def parse_traits(traits: Dict[str, str], output_dir: Path, threshold: float,
+                    gene_list: bool, workers: int) -> List[str]:
+    """
+    Parse the NetWas results of multiple traits in parallel, the results of each
+    trait are written to <output_dir>/<trait>.txt. A trait that fails is reported
+    and does not stop the other traits.
+
+    :parameters
+    -----------
+    traits - dict
+        File with the NetWas results per trait
+    output_dir - Path
+        Output directory
+    threshold - float
+        Threshold to decide which gene to keep - used on the NetWas score column
+    gene_list - Boolean
+        Flag specifying wheter or not to write out all the columns or only the gene names
+    workers - int
+        Number of processes
+
+    :returns
+    --------
+    failed - list
+        Names of the traits that failed
+    """
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {trait: executor.submit(parse_trait, Path(file), output_dir / f"{trait}.txt",
+                                            threshold, gene_list)
+                    for trait, file in traits.items()}
+        for trait, future in futures.items():
+            try:
+                print(f"{trait}: {future.result()}")
+            except Exception as exc:
+                failed.append(trait)
+                print(f"{trait}: FAILED {type(exc).__name__}: {exc}", file=sys.stderr)
+
+    print(f"Parsed {len(traits) - len(failed)}/{len(traits)} traits")
+    return failed
+
+
 def main():
     """
     Run the main program.
@@ -120,10 +290,24 @@ def main():
     arg_parser = ArgumentParser()
     arg_validator = CLIArgValidator()
     file = arg_parser.get_argument('file')
+    config_file = arg_parser.get_argument('config')
     threshold = arg_parser.get_argument('threshold')
 
     output_file = Path(arg_parser.get_argument('output'))
     gene_list = arg_parser.get_argument("gene_list")
+
+    if config_file is not None:
+        arg_validator.validate_config_file(config_file)
+        traits = get_config(Path(config_file))["default"]["traits"]
+        for trait_file in traits.values():
+            arg_validator.validate_input_file(trait_file)
+
+        workers = arg_parser.get_argument("workers") or \
+            max(1, min(len(traits), os.cpu_count() or 1))
+        if parse_traits(traits, output_file, threshold, gene_list, workers):
+            sys.exit(1)
+        return
+
     arg_validator.validate_input_file(file)
 
     net_was = NetWasParser(file=file, output_file=output_file)
@@ -7,15 +7,41 @@ VEGAS requires as input a GWAS summary statistics file containing rs SNP IDs and
 link: https://vegas2.qimrberghofer.edu.au/
 """
 
+import heapq
+import multiprocessing as mp
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
 from pathlib import Path
+from typing import List, Optional, Tuple
 import pandas as pd
 from fuzzywuzzy import fuzz
 from fuzzywuzzy import process
+from sniff_header import sniff_header
 from validate_config import ConfigValidator
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory usage is not reported there
+    resource = None
+
 __author__ = "Stijn Arends"
 __version__ = "v.01"
 
+# Number of rows of a GWAS summstats file that are read at once
+DEFAULT_CHUNK_SIZE = 1_000_000
+# Maximum number of sorted runs that are merged at once
+MAX_MERGE_RUNS = 256
+# Buffer size of the files written while merging sorted runs
+WRITE_BUFFER_SIZE = 1 << 20
+# Rough estimate of the memory needed per row of a chunk, used to derive the chunk
+# size from the memory budget of a worker. This is a heuristic, the actual memory
+# usage also depends on the length of the SNP IDs and on pandas itself
+BYTES_PER_ROW = 400
+
 
 class AutomaticColumnExtractError(Exception):
     """
@@ -81,7 +107,30 @@ class ExtractVEGASColumns:
         """
         Try to find the column names which are needed to run VEGAS.
         """
-        for column in df.columns:
+        self.check_columns(df.columns)
+
+    def find_column_names_file(self, file) -> None:
+        """
+        Try to find the column names which are needed to run VEGAS
+        by only reading the header of a file.
+
+        :parameter
+        ----------
+        file - Path
+            GWAS summstats file
+        """
+        self.check_columns(sniff_header(file).columns)
+
+    def check_columns(self, columns) -> None:
+        """
+        Check all column names for the SNP and p value columns.
+
+        :parameter
+        ----------
+        columns - list
+            Column names
+        """
+        for column in columns:
             self.check_p_col(column)
             self.check_SNP_col(column)
 
@@ -102,25 +151,76 @@ class ExtractVEGASColumns:
 class PrepGWASData:
     """
     Prepares GWAS data so that it can be used to run VEGAS.
+
+    If a chunk size is given the file is streamed: only the header is read to resolve
+    the SNP and p value columns, after which only those two columns are read in chunks.
+    Each chunk is filtered, sorted and written to disk as a sorted run, so the peak
+    memory usage is bounded by the chunk size instead of by the size of the file.
     """
 
-    def __init__(self, file, vegas, snp_col, pval_col):
+    def __init__(self, file, vegas, snp_col, pval_col, chunk_size: Optional[int] = None,
+                tmp_dir: Optional[Path] = None):
         self.snp_col = snp_col
         self.pval_col = pval_col
         self.vegas = vegas
-        self.df = self.prepare_data(Path(file))
+        self.chunk_size = chunk_size
+        self.runs: List[Path] = []
+        self.run_dir = None
+        if chunk_size is None:
+            self.df = self.prepare_data(Path(file))
+        else:
+            self.df = None
+            self.run_dir = Path(tempfile.mkdtemp(prefix="vegas_runs_", dir=tmp_dir))
+            try:
+                self.runs = self.prepare_data_streaming(Path(file))
+            except BaseException:
+                self.close()
+                raise
 
     def get_df(self) -> pd.DataFrame:
         """
-        Return the data frame
+        Return the data frame. Streamed data is read back from the sorted runs
+        into memory, use write_out to write it with bounded memory.
 
         :returns
         --------
         df - pd.DataFrame
             The data in a data frame
         """
+        if self.df is None:
+            self.df = self.read_runs(self.runs)
         return self.df
 
+    def write_out(self, file) -> None:
+        """
+        Write out the prepared data. Streamed data is written by merging the
+        sorted runs, so the full data frame is never loaded into memory.
+
+        :parameter
+        ----------
+        file - Path
+            Location of the output file
+        """
+        if self.df is not None:
+            write_out_df(file, self.df)
+        else:
+            merge_runs(self.runs, Path(file), self.run_dir)
+
+    def close(self) -> None:
+        """
+        Remove the sorted runs from disk.
+        """
+        if self.run_dir is not None:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            self.run_dir = None
+            self.runs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def prepare_data(self, file) -> pd.DataFrame:
         """
         Prepare the GWAS summstats data by activating a chain of commands.
@@ -150,17 +250,162 @@ class PrepGWASData:
 
         return df
 
+    def prepare_data_streaming(self, file) -> List[Path]:
+        """
+        Prepare the GWAS summstats data chunk by chunk and write every prepared
+        chunk to disk as a sorted run.
+
+        :parameter
+        ----------
+        file - Path
+            GWAS summstats file
+
+        :returns
+        --------
+        runs - list
+            Files containing the sorted runs
+        """
+        columns = self.resolve_columns(file)
+
+        runs = []
+        for chunk in self.read_data_chunks(file, columns, self.chunk_size):
+            # Select the columns in the order snp, pval regardless of the order in the file
+            chunk = chunk.loc[:, columns]
+
+            chunk = self.drop_nan(chunk)
+
+            chunk = self.filter_rs_id(chunk)
+
+            chunk = self.set_index(chunk)
+
+            if chunk.empty:
+                continue
+
+            run = self.run_dir / f"run_{len(runs):05d}.txt"
+            write_out_df(run, chunk)
+            runs.append(run)
+
+        return runs
+
+    def resolve_columns(self, file) -> list:
+        """
+        Resolve the names of the SNP and p value columns using only the header of the file.
+
+        :parameter
+        ----------
+        file - Path
+            GWAS summstats file
+
+        :returns
+        --------
+        columns - list
+            Names of the SNP and p value columns
+        """
+        header = sniff_header(file)
+
+        if self.snp_col == 'None' or self.pval_col == 'None':
+            return self.find_columns(file)
+
+        if not {self.snp_col, self.pval_col}.issubset(header.columns):
+            print("Specified column(s) are not found, trying to find them automatically...")
+            return self.find_columns(file)
+
+        return [self.snp_col, self.pval_col]
+
+    def find_columns(self, file) -> list:
+        """
+        Automatically find the SNP and p value columns.
+
+        :parameter
+        ----------
+        file - Path
+            GWAS summstats file
+
+        :returns
+        --------
+        columns - list
+            Names of the SNP and p value columns
+        """
+        self.vegas.find_column_names_file(file)
+
+        cols = self.vegas.get_col_names()
+
+        if not set(cols).issubset(sniff_header(file).columns):
+            raise AutomaticColumnExtractError(cols)
+
+        return cols
+
+    @staticmethod
+    def read_data_chunks(file, columns, chunk_size):
+        """
+        Read only the SNP and p value columns of a GWAS summstats file in chunks.
+        The delimiter and compression are detected from the start of the file.
+
+        :parameter
+        ----------
+        file - Path
+            GWAS summstats file
+        columns - list
+            Names of the SNP and p value columns
+        chunk_size - int
+            Number of rows per chunk
+
+        :returns
+        --------
+        chunks - iterator
+            Iterator over the chunks
+
+        :raises
+        -------
+        ValueError
+            The p value column contains values that are not numeric
+        """
+        header = sniff_header(file)
+        snp_col, pval_col = columns
+        with pd.read_csv(file, sep=header.delimiter, usecols=columns, chunksize=chunk_size,
+                            dtype={snp_col: str, pval_col: "float64"},
+                            compression=header.compression) as reader:
+            try:
+                yield from reader
+            except ValueError as error:
+                raise ValueError(f"The p value column '{pval_col}' of {file} contains values "\
+                    f"that are not numeric ({error})") from error
+
+    @staticmethod
+    def read_runs(runs) -> pd.DataFrame:
+        """
+        Read the sorted runs back into one sorted data frame.
+
+        :parameter
+        ----------
+        runs - list
+            Files containing the sorted runs
+
+        :returns
+        --------
+        df - pd.DataFrame
+            Dataframe with the SNP column as the index
+        """
+        frames = [pd.read_csv(run, sep="\t", header=None, index_col=0,
+                                dtype={0: str, 1: "float64"}) for run in runs]
+        if not frames:
+            return pd.DataFrame(columns=[1], dtype="float64")
+        return pd.concat(frames).sort_index(kind="mergesort")
+
     @staticmethod
     def read_data(file):
         """
-        Read a tab seperated file into a pandas data frame
+        Read a GWAS summstats file into a pandas data frame, the delimiter and
+        compression are detected from the start of the file.
 
         :parameter
         ----------
         file - Path
             GWAS summstats file
         """
-        return pd.read_csv(file, sep="\t", low_memory=False)
+        header = sniff_header(file)
+        return pd.read_csv(file, sep=header.delimiter, compression=header.compression,
+                            low_memory=False)
 
     def select_columns(self, df):
         """
@@ -236,9 +481,10 @@ class PrepGWASData:
         df - pd.DataFrame
             Dataframe with the SNP column as the index
         """
-        df.set_index(df.iloc[:,0], drop=True, inplace=True)
-        df.drop(columns=df.columns[0], axis=1, inplace=True)
-        df.sort_index(inplace=True)
+        df = df.set_index(df.columns[0])
+        df.index.name = None
+        # A stable sort keeps duplicated SNPs in the order of the file
+        df.sort_index(kind="mergesort", inplace=True)
         return df
 
 
@@ -255,20 +501,143 @@ def write_out_df(file, df):
     """
     df.to_csv(file, header=False, sep="\t")
 
-def main():
+def snp_key(line: str) -> str:
     """
-    Run the main program.
+    Get the SNP ID of a line of a sorted run.
+
+    :parameters
+    -----------
+    line - str
+        Tab seperated line containing a SNP ID and p value
+
+    :returns
+    --------
+    snp - str
+        SNP ID
     """
-    file = "config.yaml"
+    return line.split("\t", 1)[0]
 
-    validator = ConfigValidator(file)
-    validator.validate_config_file()
-    trait_data = validator.config
 
-    vegas = ExtractVEGASColumns()
+def merge_runs(runs: List[Path], file: Path, tmp_dir: Path) -> None:
+    """
+    Merge sorted runs into one sorted file with a k-way merge. The lines are copied
+    as is, so the output is identical to writing the sorted data frame with
+    write_out_df. Lines with the same SNP ID keep the order of the runs, which
+    matches the stable sort of the in-memory path.
+
+    If there are more than MAX_MERGE_RUNS runs, consecutive runs are first merged
+    into larger intermediate runs to limit the number of open files.
+
+    :parameters
+    -----------
+    runs - list
+        Files containing the sorted runs, in the order of the input file
+    file - Path
+        Location of the output file
+    tmp_dir - Path
+        Directory to store intermediate runs in
+    """
+    level = 0
+    while len(runs) > MAX_MERGE_RUNS:
+        merged = []
+        for start in range(0, len(runs), MAX_MERGE_RUNS):
+            merged_run = tmp_dir / f"merge_{level}_{len(merged):05d}.txt"
+            merge_files(runs[start:start + MAX_MERGE_RUNS], merged_run)
+            merged.append(merged_run)
+        runs = merged
+        level += 1
 
-    for trait, info in trait_data["traits"].items():
-        print(f"Processing trait: {trait}")
+    merge_files(runs, file)
+
+
+def merge_files(runs: List[Path], file: Path) -> None:
+    """
+    Merge sorted files into one sorted file through a buffered writer.
+
+    :parameters
+    -----------
+    runs - list
+        Sorted files
+    file - Path
+        Location of the output file
+    """
+    with ExitStack() as stack:
+        handlers = [stack.enter_context(open(run, "r", encoding="utf-8", newline=""))
+                    for run in runs]
+        with open(file, "w", encoding="utf-8", newline="",
+                buffering=WRITE_BUFFER_SIZE) as out_handler:
+            out_handler.writelines(heapq.merge(*handlers, key=snp_key))
+
+
+def get_chunk_size(config: dict) -> int:
+    """
+    Get the number of rows that are read at once. If a memory budget per worker
+    (in MB) is set, the chunk size is lowered to the number of rows that is estimated
+    to fit in that budget (BYTES_PER_ROW). The budget is not enforced, the actual
+    memory usage of a worker can be higher.
+
+    :parameter
+    ----------
+    config - dict
+        Configuration file in dictionary form.
+
+    :returns
+    --------
+    chunk_size - int
+        Number of rows per chunk
+    """
+    chunk_size = config.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    memory_budget = config.get("memory_budget")
+    if memory_budget is not None:
+        chunk_size = min(chunk_size, max(1, memory_budget * 1024**2 // BYTES_PER_ROW))
+    return chunk_size
+
+
+def peak_rss() -> Optional[float]:
+    """
+    Get the peak resident set size of the current process.
+
+    :returns
+    --------
+    peak_rss - float
+        Peak memory usage in MB, None if it can not be determined
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def process_trait(trait: str, info: dict, output: str, chunk_size: int,
+                    tmp_dir: Optional[str]) -> Tuple[str, Optional[str], float, Optional[float]]:
+    """
+    Prepare the GWAS summstats file of one trait for VEGAS. Errors are caught
+    and returned, so a failing trait does not stop the other traits.
+
+    :parameters
+    -----------
+    trait - str
+        Name of the trait
+    info - dict
+        Information about the trait from the config file: file and columns
+    output - str
+        Location where the output file needs to be stored
+    chunk_size - int
+        Number of rows per chunk
+    tmp_dir - str
+        Location of the temporary sorted runs, None for the system default
+
+    :returns
+    --------
+    trait, error, seconds, peak_rss - tuple
+        The name of the trait, the error message (None if successful),
+        the run time in seconds and the peak memory usage in MB of the process
+    """
+    print(f"Processing trait: {trait}", flush=True)
+    start = time.perf_counter()
+    error = None
+    try:
         snp = info["columns"]["snp"]
         pval = info["columns"]["pval"]
 
@@ -277,10 +646,58 @@ def main():
         assert pval == "None" or isinstance(pval, str), "The pval column must be"\
             "either None or a string"
 
-        prep_gwas = PrepGWASData(info["file"], vegas, snp, pval)
+        # A new instance per trait, the column scores must not carry over between traits
+        vegas = ExtractVEGASColumns()
+
+        with PrepGWASData(info["file"], vegas, snp, pval, chunk_size=chunk_size,
+                        tmp_dir=tmp_dir) as prep_gwas:
+            output_file = Path(output) / (trait + "_vegas_input.txt")
+            prep_gwas.write_out(output_file)
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+
+    return trait, error, time.perf_counter() - start, peak_rss()
+
+
+def main():
+    """
+    Run the main program.
+    """
+    file = "config.yaml"
+
+    validator = ConfigValidator(file)
+    validator.validate_config_file()
+    trait_data = validator.config
+
+    if not trait_data["traits"]:
+        print("No traits in the configuration file, nothing to process")
+        return
+
+    chunk_size = get_chunk_size(trait_data)
+    workers = min(trait_data.get("workers", 1), len(trait_data["traits"]))
+    jobs = [(trait, info, trait_data["output"], chunk_size, trait_data.get("tmp_dir"))
+            for trait, info in trait_data["traits"].items()]
+
+    start = time.perf_counter()
+    # Every trait gets a fresh worker process, also if the traits are processed one
+    # at a time, so the peak memory usage of the process is the peak of the trait
+    with mp.Pool(workers, maxtasksperchild=1) as pool:
+        results = list(pool.starmap(process_trait, jobs, chunksize=1))
+
+    failed = []
+    for trait, error, seconds, max_rss in results:
+        memory = f", peak RSS {max_rss:.0f} MB" if max_rss is not None else ""
+        if error is None:
+            print(f"Processed trait {trait} in {seconds:.2f}s{memory}")
+        else:
+            failed.append(trait)
+            print(f"Failed trait {trait} after {seconds:.2f}s: {error}", file=sys.stderr)
+
+    print(f"Finished {len(jobs) - len(failed)}/{len(jobs)} traits in "\
+        f"{time.perf_counter() - start:.2f}s")
 
-        output_file = Path(trait_data["output"]) / (trait + "_vegas_input.txt")
-        write_out_df(output_file, prep_gwas.get_df())
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+"""
+This module is designed to read the header of a GWAS summary statistics file without
+loading the file. Only the first few KB are read (and decompressed), from which the
+compression, delimiter and column names are detected.
+"""
+
+import bz2
+import csv
+import gzip
+import lzma
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Number of (decompressed) bytes that are read to detect the header
+SAMPLE_SIZE = 64 * 1024
+
+# Magic bytes of the supported compression formats, block gzip (.bgz) is gzip as well
+MAGIC_BYTES = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "xz"}
+OPENERS = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+# Delimiters in order of preference, the last one means one or more spaces or tabs
+DELIMITERS = ["\t", ",", ";", "|", " ", r"\s+"]
+
+# Sniffed headers, keyed by (path, modification time)
+_header_cache: Dict[Tuple[str, int], "Header"] = {}
+
+
+@dataclass(frozen=True)
+class Header:
+    """
+    The header of a GWAS summary statistics file.
+
+    columns - list
+        Column names
+    delimiter - str
+        Delimiter of the columns, can be passed to pd.read_csv as sep
+    compression - str
+        Compression of the file (gzip, bz2 or xz), None if the file is not compressed
+    """
+    columns: List[str]
+    delimiter: str
+    compression: Optional[str]
+
+
+def sniff_header(file, sample_size: int = SAMPLE_SIZE) -> Header:
+    """
+    Detect the compression, delimiter and column names of a file by only reading
+    the start of the file. The result is cached per file path and modification time.
+
+    :parameter
+    ----------
+    file - Path
+        GWAS summstats file
+    sample_size - int
+        Number of (decompressed) bytes to read
+
+    :returns
+    --------
+    header - Header
+        The header of the file
+    """
+    path = Path(file).resolve()
+    key = (str(path), os.stat(path).st_mtime_ns)
+
+    if key not in _header_cache:
+        compression = detect_compression(path)
+        lines = read_sample(path, compression, sample_size)
+        delimiter = detect_delimiter(lines)
+        columns = split_line(lines[0], delimiter) if lines else []
+        _header_cache[key] = Header(columns, delimiter, compression)
+
+    return _header_cache[key]
+
+
+def detect_compression(file) -> Optional[str]:
+    """
+    Detect the compression of a file by its magic bytes.
+
+    :parameter
+    ----------
+    file - Path
+        A file
+
+    :returns
+    --------
+    compression - str
+        Compression of the file (gzip, bz2 or xz), None if the file is not compressed
+    """
+    with open(file, "rb") as file_handler:
+        start = file_handler.read(max(len(magic) for magic in MAGIC_BYTES))
+
+    for magic, compression in MAGIC_BYTES.items():
+        if start.startswith(magic):
+            return compression
+    return None
+
+
+def read_sample(file, compression: Optional[str], sample_size: int) -> List[str]:
+    """
+    Read the complete lines within the first sample_size bytes of a file.
+
+    :parameter
+    ----------
+    file - Path
+        A file
+    compression - str
+        Compression of the file, None if the file is not compressed
+    sample_size - int
+        Number of (decompressed) bytes to read
+
+    :returns
+    --------
+    lines - list
+        The first lines of the file, without line endings
+    """
+    opener = OPENERS.get(compression, open)
+    with opener(file, "rb") as file_handler:
+        sample = file_handler.read(sample_size)
+
+    lines = sample.decode("utf-8", errors="replace").splitlines()
+    # The last line is incomplete if the file is larger than the sample
+    if len(sample) == sample_size and len(lines) > 1:
+        lines = lines[:-1]
+    return lines
+
+
+def detect_delimiter(lines: List[str]) -> str:
+    """
+    Detect the delimiter as the first delimiter that splits every line into
+    the same number (>1) of fields.
+
+    :parameter
+    ----------
+    lines - list
+        The first lines of a file
+
+    :returns
+    --------
+    delimiter - str
+        The delimiter, tab if none of the delimiters matches
+    """
+    for delimiter in DELIMITERS:
+        n_fields = {len(split_line(line, delimiter)) for line in lines if line.strip()}
+        if len(n_fields) == 1 and n_fields.pop() > 1:
+            return delimiter
+    return "\t"
+
+
+def split_line(line: str, delimiter: str) -> List[str]:
+    """
+    Split a line into fields, taking quoted fields into account.
+
+    :parameter
+    ----------
+    line - str
+        A line of a file
+    delimiter - str
+        The delimiter
+
+    :returns
+    --------
+    fields - list
+        The fields of the line
+    """
+    if delimiter == r"\s+":
+        return line.split()
+    return next(csv.reader([line], delimiter=delimiter))
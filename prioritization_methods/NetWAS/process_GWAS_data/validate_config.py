@@ -3,9 +3,9 @@ This module is designed to validate the contents of the configuration file assoc
 with the script processing the GWAS summstats files for VEGAS.
 """
 
-import linecache
 from pathlib import Path
 import yaml
+from sniff_header import sniff_header
 
 
 class ConfigValidator:
@@ -46,6 +46,8 @@ class ConfigValidator:
         self.validate_input_exists()
         self.validate_output_exists()
         self.validate_column_names()
+        self.validate_chunk_size()
+        self.validate_workers()
 
     def validate_input_exists(self) -> None:
         """
@@ -75,13 +77,31 @@ class ConfigValidator:
             if snp == "None" or pval == "None":
                 continue
 
-            columns = linecache.getline(info["file"], 1).rstrip().split("\t")
+            columns = sniff_header(info["file"]).columns
 
             if not set([snp, pval]).issubset(columns):
                 print(f"WARNING! The set value for the SNP and/or p value ({snp}, {pval})"\
                     "column are not found amongst the column names of the corresponding file." \
                     " The program will try to automatically detect the correct column.")
 
+    def validate_chunk_size(self) -> None:
+        """
+        Check if the optional chunk size is a positive integer.
+        """
+        chunk_size = self.config.get("chunk_size")
+        if chunk_size is not None and (not isinstance(chunk_size, int) or chunk_size <= 0):
+            raise ValueError(f"The chunk_size must be a positive integer, got: {chunk_size}")
+
+    def validate_workers(self) -> None:
+        """
+        Check if the optional number of workers and memory budget (in MB)
+        are positive integers.
+        """
+        for key in ("workers", "memory_budget"):
+            value = self.config.get(key)
+            if value is not None and (not isinstance(value, int) or value <= 0):
+                raise ValueError(f"The {key} must be a positive integer, got: {value}")
+
 
 def main():
     """
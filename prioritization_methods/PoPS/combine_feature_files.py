@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+
+"""
+Combine prefixed feature files (see rename_file_contents.py) into one feature
+matrix for PoPs, aligned on the gene ID column.
+
+The matrix is written in the format of the munge_feature_directory.py script of
+PoPs: a file with the gene IDs (<out>.rows.txt) and the matrix split into chunks
+of columns, each with the names of its columns (<out>.cols.<i>.txt) and a numpy
+matrix of genes x columns (<out>.mat.<i>.npy). The chunks are written to memory
+mapped files while the feature files are read in blocks of rows, so the memory
+use does not depend on the number of genes or feature files.
+
+Author - Stijn Arends, Raana Roohanitaziani
+Date - 15-6-2022
+"""
+
+import numpy as np
+import pandas as pd
+import os
+from pathlib import Path
+import argparse
+import gzip
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from rename_file_contents import EditFeatureFiles, MANIFEST_FILE, TEMP_PREFIX
+
+__version__ = "V0.1"
+
+# Number of values that are read from a feature file at once
+BLOCK_VALUES = 2 ** 21
+
+
+class FeatureCombiner:
+    """
+    Class that is used to combine the raw feature files that are needed to run
+    the gene prioritization method PoPs into one matrix.
+
+    Every feature file contains a gene ID column followed by the feature columns,
+    the names of the feature columns should be unique over all files.
+    """
+
+    def __init__(self, folder, id_column="ENSGID", select=None, dtype="float64",
+                    missing="nan") -> None:
+        self.folder = Path(folder)
+        self.id_column = id_column
+        self.select = select
+        self.dtype = np.dtype(dtype)
+        self.missing = missing
+
+    def list_files(self) -> List[str]:
+        """
+        Get the feature files of the directory, the manifest and temporary files
+        of rename_file_contents.py are skipped.
+
+        :returns
+        --------
+        files - list
+            Names of the feature files
+        """
+        return [name for name in sorted(os.listdir(self.folder))
+                if (self.folder / name).is_file() and name != MANIFEST_FILE
+                and not name.startswith(TEMP_PREFIX)]
+
+    def read_header(self, file:str) -> List[str]:
+        """
+        Read the column names of a feature file (plain text or gzipped).
+
+        :parameters
+        -----------
+        file - str
+            Name of a file
+
+        :returns
+        --------
+        columns - list
+            Column names
+        """
+        path = self.folder / file
+        opener = gzip.open if EditFeatureFiles.is_gzipped(path) else open
+        with opener(path, "rb") as file_handler:
+            return file_handler.readline().decode("utf-8").rstrip("\r\n").split("\t")
+
+    def select_columns(self, columns:List[str]) -> List[str]:
+        """
+        Get the feature columns of a file that start with one of the selected prefixes.
+
+        :parameters
+        -----------
+        columns - list
+            Column names of a feature file
+
+        :returns
+        --------
+        columns - list
+            Selected feature columns
+        """
+        if self.id_column not in columns:
+            raise ValueError(f"Gene ID column {self.id_column} is missing")
+        features = [column for column in columns if column != self.id_column]
+        if self.select:
+            features = [column for column in features if column.startswith(tuple(self.select))]
+        return features
+
+    def plan(self, files:List[str]) -> List[Tuple[str, List[str]]]:
+        """
+        Get the selected columns of every feature file.
+
+        :parameters
+        -----------
+        files - list
+            Names of the feature files
+
+        :returns
+        --------
+        plan - list
+            Name and selected columns of every file with at least one selected column
+        """
+        plan, seen = [], set()
+        for file in files:
+            columns = self.select_columns(self.read_header(file))
+            duplicates = seen.intersection(columns)
+            if duplicates:
+                raise ValueError(f"Columns of {file} are also in another file: "
+                                    f"{', '.join(sorted(duplicates)[:5])}")
+            seen.update(columns)
+            if columns:
+                plan.append((file, columns))
+        return plan
+
+    def read_genes(self, files:List[str]) -> pd.Index:
+        """
+        Get the union of the gene IDs of the feature files, only the gene ID
+        column of each file is kept in memory.
+
+        :parameters
+        -----------
+        files - list
+            Names of the feature files
+
+        :returns
+        --------
+        genes - pd.Index
+            Sorted unique gene IDs
+        """
+        genes = set()
+        for file in files:
+            genes.update(pd.read_csv(self.folder / file, sep="\t", usecols=[self.id_column],
+                                        dtype=str)[self.id_column])
+        return pd.Index(sorted(genes))
+
+    def read_blocks(self, file:str, columns:List[str]):
+        """
+        Read the gene IDs and selected columns of a feature file in blocks of rows.
+
+        :parameters
+        -----------
+        file - str
+            Name of a file
+        columns - list
+            Columns to read
+
+        :returns
+        --------
+        blocks - iterator
+            Data frames with the gene IDs as index and the columns in the given order
+        """
+        rows = max(1, BLOCK_VALUES // max(1, len(columns)))
+        dtypes = {column: self.dtype for column in columns}
+        dtypes[self.id_column] = str
+        reader = pd.read_csv(self.folder / file, sep="\t", usecols=[self.id_column] + columns,
+                                index_col=self.id_column, dtype=dtypes, chunksize=rows)
+        with reader:
+            for block in reader:
+                yield block[columns]
+
+    def write_chunk(self, matrix:np.ndarray, genes:pd.Index,
+                    parts:List[Tuple[str, List[str]]]) -> int:
+        """
+        Fill a chunk of the combined matrix with columns of the feature files.
+
+        :parameters
+        -----------
+        matrix - np.ndarray
+            Genes x columns matrix (memory mapped) of the chunk
+        genes - pd.Index
+            Gene IDs of the rows of the matrix
+        parts - list
+            Name and columns of each file in the chunk, in the order of the columns
+
+        :returns
+        --------
+        n_bytes - int
+            Number of bytes of the feature files that were read
+        """
+        matrix[:] = np.nan
+        start, n_bytes = 0, 0
+        for file, columns in parts:
+            for block in self.read_blocks(file, columns):
+                codes = genes.get_indexer(block.index)
+                found = codes >= 0
+                matrix[codes[found], start:start + len(columns)] = block.to_numpy()[found]
+            start += len(columns)
+            n_bytes += (self.folder / file).stat().st_size
+        self.fill_missing(matrix)
+        return n_bytes
+
+    def fill_missing(self, matrix:np.ndarray) -> None:
+        """
+        Replace missing values (genes that are not in a feature file and empty
+        values) by zero or the mean of their column, depending on self.missing.
+
+        :parameters
+        -----------
+        matrix - np.ndarray
+            Genes x columns matrix (memory mapped) of a chunk
+        """
+        if self.missing == "nan":
+            return
+
+        rows = max(1, BLOCK_VALUES // max(1, matrix.shape[1]))
+        fill = np.zeros(matrix.shape[1])
+        if self.missing == "mean":
+            sums = np.zeros(matrix.shape[1])
+            counts = np.zeros(matrix.shape[1])
+            for start in range(0, matrix.shape[0], rows):
+                block = matrix[start:start + rows]
+                sums += np.nansum(block, axis=0, dtype=np.float64)
+                counts += (~np.isnan(block)).sum(axis=0)
+            np.divide(sums, counts, out=fill, where=counts > 0)
+
+        for start in range(0, matrix.shape[0], rows):
+            block = matrix[start:start + rows]
+            missing = np.isnan(block)
+            block[missing] = np.broadcast_to(fill, block.shape)[missing]
+
+    def combine(self, output:str, max_cols:int = 5000, genes:Optional[pd.Index] = None) -> int:
+        """
+        Combine the feature files of the directory into chunks of columns.
+
+        :parameters
+        -----------
+        output - str
+            Prefix of the output files
+        max_cols - int
+            Maximum number of columns per chunk
+        genes - pd.Index
+            Gene IDs of the rows, default = all gene IDs of the feature files
+
+        :returns
+        --------
+        n_chunks - int
+            Number of chunks that were written
+        """
+        plan = self.plan(self.list_files())
+        if not plan:
+            raise ValueError("No feature columns were selected")
+        if genes is None:
+            genes = self.read_genes([file for file, _ in plan])
+        n_columns = sum(len(columns) for _, columns in plan)
+        print(f"Combining {n_columns} columns of {len(plan)} files for {len(genes)} genes",
+                flush=True)
+
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{output}.rows.txt", "w", encoding="utf-8") as file_handler:
+            file_handler.write("".join(gene + "\n" for gene in genes))
+
+        start_time = time.perf_counter()
+        n_bytes = 0
+        chunks = self.split_columns(plan, max_cols)
+        for number, parts in enumerate(chunks):
+            columns = [column for _, part_columns in parts for column in part_columns]
+            with open(f"{output}.cols.{number}.txt", "w", encoding="utf-8") as file_handler:
+                file_handler.write("".join(column + "\n" for column in columns))
+
+            matrix = np.lib.format.open_memmap(f"{output}.mat.{number}.npy", mode="w+",
+                                                dtype=self.dtype,
+                                                shape=(len(genes), len(columns)))
+            n_bytes += self.write_chunk(matrix, genes, parts)
+            matrix.flush()
+            del matrix
+
+            elapsed = max(time.perf_counter() - start_time, 1e-9)
+            print(f"[{number + 1}/{len(chunks)}] {len(columns)} columns of {len(parts)} files"
+                    f" | {n_bytes / 1e6 / elapsed:.1f} MB/s", flush=True)
+        return len(chunks)
+
+    @staticmethod
+    def split_columns(plan:List[Tuple[str, List[str]]],
+                        max_cols:int) -> List[List[Tuple[str, List[str]]]]:
+        """
+        Split the selected columns of the files into chunks of at most max_cols
+        columns, the columns of a file can be split over multiple chunks.
+
+        :parameters
+        -----------
+        plan - list
+            Name and selected columns of every file
+        max_cols - int
+            Maximum number of columns per chunk
+
+        :returns
+        --------
+        chunks - list
+            Name and columns of each file per chunk
+        """
+        chunks, chunk, size = [], [], 0
+        for file, columns in plan:
+            while columns:
+                part = columns[:max_cols - size]
+                columns = columns[len(part):]
+                chunk.append((file, part))
+                size += len(part)
+                if size == max_cols:
+                    chunks.append(chunk)
+                    chunk, size = [], 0
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+
+class ArgumentParser:
+    """
+    Class to parse the input arguments.
+    """
+
+    def __init__(self):
+        parser = self._create_argument_parser()
+        # Print help if no arguments are supplied and stop the program
+        if len(sys.argv) == 1:
+            parser.print_help(sys.stderr)
+            sys.exit(1)
+        self.arguments = parser.parse_args()
+
+    @staticmethod
+    def _create_argument_parser():
+        """
+        Create an argument parser.
+
+        :returns
+        --------
+        parser - ArgumentParser
+        """
+        parser = argparse.ArgumentParser(prog=os.path.basename(__file__),
+            description="Combine prefixed feature files for PoPs into one feature matrix "
+                "aligned on the gene IDs, in the format of munge_feature_directory.py.",
+            epilog="Contact: stijnarend@live.nl")
+
+        # Set version
+        parser.version = __version__
+
+        parser.add_argument('-d',
+            '--directory', dest='directory', required=True,
+            help='Location of the directory containing the (prefixed) features.')
+
+        parser.add_argument('-o',
+            '--output', dest='output', required=True,
+            help='Prefix of the output files, e.g. features/pops_features')
+
+        parser.add_argument('-s', '--select', dest='select', nargs="+",
+            help='Only combine the columns that start with one of these prefixes. '
+                'Default = all columns')
+
+        parser.add_argument('-g', '--genes', dest='genes',
+            help='Tab separated file with the gene IDs of the rows in the gene ID column '
+                '(e.g. the gene annotation file of PoPs). Default = all genes of the '
+                'feature files')
+
+        parser.add_argument('--id-column', type=str, dest="id_column", default="ENSGID",
+            help='Name of the gene ID column. Default = ENSGID')
+
+        parser.add_argument('--max-cols', type=int, dest="max_cols", default=5000,
+            help='Maximum number of columns per chunk. Default = 5000')
+
+        parser.add_argument('--dtype', type=str, dest="dtype", default="float64",
+            choices=["float32", "float64"],
+            help='Data type of the matrix. Default = float64')
+
+        parser.add_argument('--missing', type=str, dest="missing", default="nan",
+            choices=["nan", "zero", "mean"],
+            help='Value of genes that are not in a feature file and of empty values: '
+                'NaN, zero or the mean of the column. Default = nan')
+
+        parser.add_argument('-v',
+            '--version',
+            help='Displays the version number of the script and exitst',
+            action='version')
+
+        return parser
+
+    def get_argument(self, argument_key):
+        """
+        Method to get an input argument.
+        :parameters
+        -----------
+        argument_key - str
+            Full command line argument (so --config for the configuration file argument).
+
+        :returns
+        --------
+        value - List or boolean
+        """
+        if self.arguments is not None and argument_key in self.arguments:
+            value = getattr(self.arguments, argument_key)
+        else:
+            value = None
+        return value
+
+
+class CommandLineArgumentsValidator:
+    """
+    Class to check if arguments are valid.
+    """
+
+    def validate_input_path(self, input_path) -> None:
+        """
+        Validate the input directory by checking if it actually exists.
+        :parameters
+        -----------
+        input_path - str
+            Path to a directory
+        """
+        if not Path(input_path).is_dir():
+            raise FileNotFoundError('Input directory does not exist!')
+
+    def validate_input_file(self, input_file) -> None:
+        """
+        Validate an input file by checking if it actually exists.
+        :parameters
+        -----------
+        input_file - str
+            Path to a file
+        """
+        if not Path(input_file).is_file():
+            raise FileNotFoundError(f'Input file does not exist: {input_file}')
+
+    def validate_max_cols(self, max_cols) -> None:
+        """
+        Validate the maximum number of columns per chunk.
+        :parameters
+        -----------
+        max_cols - int
+            Maximum number of columns per chunk
+        """
+        if max_cols < 1:
+            raise ValueError('The maximum number of columns per chunk should be at least 1')
+
+
+def main():
+    """
+    Run the main program
+    """
+
+    cla_parser = ArgumentParser()
+    folder = cla_parser.get_argument('directory')
+    output = cla_parser.get_argument('output')
+    genes_file = cla_parser.get_argument('genes')
+    id_column = cla_parser.get_argument('id_column')
+    max_cols = cla_parser.get_argument('max_cols')
+
+    # Validate passed arguments
+    cla_validator = CommandLineArgumentsValidator()
+    cla_validator.validate_input_path(folder)
+    cla_validator.validate_max_cols(max_cols)
+    if genes_file:
+        cla_validator.validate_input_file(genes_file)
+
+    genes = None
+    if genes_file:
+        genes = pd.Index(pd.read_csv(genes_file, sep="\t", usecols=[id_column],
+                                        dtype=str)[id_column].drop_duplicates())
+
+    combiner = FeatureCombiner(folder=folder, id_column=id_column,
+                                select=cla_parser.get_argument('select'),
+                                dtype=cla_parser.get_argument('dtype'),
+                                missing=cla_parser.get_argument('missing'))
+    n_chunks = combiner.combine(output, max_cols, genes)
+
+    print(f"Wrote {n_chunks} chunks, run PoPs with --feature_mat_prefix {output} "
+            f"--num_feature_chunks {n_chunks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -44,9 +44,9 @@ do
     rm -r ${dir##*/}
 done
 
-gunzip -f *.gz
-
 cd ../../
 
-# Rename the files and columns by adding a prefix.
+# Rename the files and columns by adding a prefix. Only the header line of each
+# file is rewritten, the gzipped files stay compressed (use --compress none to
+# write plain text files instead).
 python3 rename_file_contents.py -d gene_features/features/ --prefix pops_
\ No newline at end of file
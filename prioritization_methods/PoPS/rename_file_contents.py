@@ -13,10 +13,34 @@ import pandas as pd
 import os
 from pathlib import Path
 import argparse
+import gzip
+import shutil
 import sys
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
 
 __version__ = "V0.1"
 
+# Size of the blocks that are copied at once
+BUFFER_SIZE = 16 * 1024 * 1024
+
+# First bytes of every gzip file
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Compression level of written gzip files (the default of the gzip command)
+GZIP_LEVEL = 6
+
+# Files that are being written start with this prefix until they are complete
+TEMP_PREFIX = ".tmp_"
+
+# Finished files of a directory, so an interrupted run can be resumed
+MANIFEST_FILE = ".rename_manifest.tsv"
+
+# Number of files that are copied at the same time when the copies are limited by
+# the disk instead of the CPU, more parallel copies only make the disk seek more
+IO_WORKERS = 4
+
 class EditFeatureFiles:
     """
     Class that is used to process raw feature files that are needed
@@ -26,44 +50,261 @@ class EditFeatureFiles:
     column names should be unique. This is what this class does.
     """
 
-    def __init__(self, folder, prefix) -> None:
+    def __init__(self, folder, prefix, stream=True, compress="keep") -> None:
         self.folder = Path(folder)
         self.prefix = prefix
+        self.stream = stream
+        self.compress = compress
 
-    def edit_file(self, file:str) -> None:
+    def edit_file(self, file:str) -> Tuple[str, int]:
         """
         Edit a file by adding a prefix to the file name, and 
         column names.
 
+        The edited file is written to a temporary file that is flushed to disk and
+        renamed to its final name once it is complete, after which the rename is
+        flushed to disk as well and the old file is removed. An interrupted run or a
+        crash of the machine therefore never leaves a half written feature file.
+
         :parameters
+        -----------
         file - str
             Name of a file
+
+        :returns
+        --------
+        new_name - str
+            Name of the edited file
+        size - int
+            Size of the old file in bytes
         """
-        print(f"Processing: {file}")
         old_file = self.folder / file
-        new_name = (self.prefix + file)
+        size = old_file.stat().st_size
+
+        gz_in = self.is_gzipped(old_file)
+        gz_out = gz_in if self.compress == "keep" else self.compress == "gzip"
+        new_name = self.new_name(file, gz_in, gz_out) if self.stream else self.prefix + file
         new_file = self.folder / new_name
+        temp_file = self.folder / (TEMP_PREFIX + new_name)
+
+        try:
+            if self.stream:
+                self.stream_file(old_file, temp_file, new_name, gz_in, gz_out)
+            else:
+                df = self.read_data(old_file)
+                df = self.rename_col_names(df, new_name)
+                self.write_data(df, temp_file)
+            os.replace(temp_file, new_file)
+            self.sync_directory(self.folder)
+        finally:
+            if temp_file.exists():
+                temp_file.unlink()
+
+        os.remove(old_file)
+        return new_name, size
+
+    def try_edit_file(self, file:str) -> Tuple[str, Optional[str], int, Optional[str]]:
+        """
+        Edit a file, errors are returned instead of raised so one broken
+        file does not stop the other files of a batch. Broken files include
+        unreadable, truncated (EOFError, e.g. half downloaded) and corrupt
+        (zlib.error) gzip files and files that can not be parsed.
 
-        self.rename_file(old_file, new_file)
+        :parameters
+        -----------
+        file - str
+            Name of a file
 
-        df = self.read_data(new_file)
-        df = self.rename_col_names(df, new_name)
+        :returns
+        --------
+        file - str
+            Name of the file
+        new_name - str
+            Name of the edited file, None if the file could not be edited
+        size - int
+            Size of the old file in bytes
+        error - str
+            The error, None if the file was edited
+        """
+        try:
+            new_name, size = self.edit_file(file)
+        except (OSError, EOFError, zlib.error, ValueError, UnicodeDecodeError,
+                pd.errors.ParserError) as error:
+            return file, None, 0, f"{type(error).__name__}: {error}"
+        return file, new_name, size, None
+
+    def new_name(self, file:str, gz_in:bool, gz_out:bool) -> str:
+        """
+        Get the name of an edited file: the prefixed name, with the .gz extension
+        added or removed when the compression changes.
 
-        self.write_data(df, new_file)
+        :parameters
+        -----------
+        file - str
+            Name of a file
+        gz_in - bool
+            If the file is gzipped or not
+        gz_out - bool
+            If the edited file is gzipped or not
+
+        :returns
+        --------
+        new_name - str
+            Name of the edited file
+        """
+        new_name = self.prefix + file
+        if gz_in and not gz_out and new_name.endswith(".gz"):
+            new_name = new_name[:-len(".gz")]
+        elif gz_out and not new_name.endswith(".gz"):
+            new_name += ".gz"
+        return new_name
+
+    def stream_file(self, old_file:Path, new_file:Path, new_name:str,
+                    gz_in:bool, gz_out:bool) -> None:
+        """
+        Edit a file by only rewriting its header line. The rest of the
+        file is copied byte for byte, so the values keep their exact text.
+
+        :parameters
+        -----------
+        old_file - Path
+            A file (plain text or gzipped)
+        new_file - Path
+            Location of the edited file
+        new_name - str
+            Name of the edited file, used as prefix of the columns
+        gz_in - bool
+            If the file is gzipped or not
+        gz_out - bool
+            If the edited file is gzipped or not
+        """
+        opener_in = gzip.open if gz_in else open
+        with opener_in(old_file, "rb") as input_handler, \
+            open(new_file, "wb") as raw_handler:
+            # The name stored inside the gzip file is the final name, not the temporary one
+            output_handler = gzip.GzipFile(filename=new_name, mode="wb", fileobj=raw_handler,
+                                            compresslevel=GZIP_LEVEL) if gz_out else raw_handler
+            header = input_handler.readline()
+            output_handler.write(self.rename_header(header, new_name))
+            self.copy_body(input_handler, output_handler, len(header))
+            if gz_out:
+                output_handler.close()
+            raw_handler.flush()
+            os.fsync(raw_handler.fileno())
+
+    @staticmethod
+    def sync_directory(folder:Path) -> None:
+        """
+        Flush the entries of a directory (e.g. a renamed file) to disk. Not
+        supported on Windows, where directories can not be opened.
+
+        :parameters
+        -----------
+        folder - Path
+            A directory
+        """
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        handle = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(handle)
+        finally:
+            os.close(handle)
+
+    @staticmethod
+    def is_gzipped(file:Path) -> bool:
+        """
+        Check if a file is gzipped by looking at its first bytes.
+
+        :parameters
+        -----------
+        file - Path
+            A file
+
+        :returns
+        --------
+        gzipped - bool
+            If the file is gzipped or not
+        """
+        with open(file, "rb") as file_handler:
+            return file_handler.read(len(GZIP_MAGIC)) == GZIP_MAGIC
 
     @staticmethod
-    def rename_file(old:Path, new:Path) -> None:
+    def column_prefix(name:str) -> str:
         """
-        Rename a file.
+        Get the prefix of the column names: the file name up to the first dot.
 
         :parameters
         -----------
-        old - Path
-            Old file name
-        new - Path
-            New file name
+        name - str
+            Name of the file
+
+        :returns
+        --------
+        prefix - str
+            Prefix of the columns
+        """
+        filename = Path(name)
+        base, _, _ = filename.name.partition('.')
+        return str(filename.with_name(base))
+
+    def rename_header(self, header:bytes, name:str) -> bytes:
         """
-        os.rename(old, new)
+        Add the prefix of the file to the names of all columns except the first
+        (the gene IDs) of a tab separated header line.
+
+        :parameters
+        -----------
+        header - bytes
+            First line of a file, including the line ending
+        name - str
+            Name of the file to use as prefix of the columns
+
+        :returns
+        --------
+        header - bytes
+            The header line with renamed columns and the original line ending
+        """
+        line = header.rstrip(b"\r\n")
+        ending = header[len(line):]
+        columns = line.decode("utf-8").split("\t")
+
+        base_name = self.column_prefix(name)
+        columns[1:] = [base_name + "_" + column for column in columns[1:]]
+        return "\t".join(columns).encode("utf-8") + ending
+
+    @staticmethod
+    def copy_body(input_handler, output_handler, offset:int) -> None:
+        """
+        Copy the rest of a file after the header line. Plain files are copied
+        inside the kernel with os.sendfile where possible, other files in large
+        blocks.
+
+        :parameters
+        -----------
+        input_handler - file object
+            Input file, positioned after the header line
+        output_handler - file object
+            Output file, positioned after the new header line
+        offset - int
+            Position of the input file after the header line
+        """
+        if hasattr(os, "sendfile") and not isinstance(input_handler, gzip.GzipFile) \
+            and not isinstance(output_handler, gzip.GzipFile):
+            output_handler.flush()
+            size = os.fstat(input_handler.fileno()).st_size
+            try:
+                while offset < size:
+                    sent = os.sendfile(output_handler.fileno(), input_handler.fileno(),
+                                        offset, min(size - offset, BUFFER_SIZE))
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError:
+                # e.g. file systems that do not support sendfile, continue below
+                input_handler.seek(offset)
+        shutil.copyfileobj(input_handler, output_handler, BUFFER_SIZE)
 
     def read_data(self, file:Path) -> pd.DataFrame:
         """
@@ -101,9 +342,7 @@ class EditFeatureFiles:
         df - pd.DataFrame
             data with renamed columns
         """
-        filename = Path(name)
-        base, _, _ = filename.name.partition('.')
-        base_name = str(filename.with_name(base))
+        base_name = self.column_prefix(name)
 
         new_cols = [base_name + "_" + column for column in df.columns[1:].values]
         df.columns.values[1:] = new_cols
@@ -123,6 +362,180 @@ class EditFeatureFiles:
             If the file is gziped or not
         """
         df.to_csv(file_name, sep="\t", index=False, mode="w+")
+        # to_csv infers the compression from the name and closes the file, flush it to disk
+        with open(file_name, "rb") as file_handler:
+            os.fsync(file_handler.fileno())
+
+
+class Manifest:
+    """
+    Class that keeps track of the files of a directory that are finished, in a
+    tab separated file with the old name, new name and size of every edited file.
+
+    Only the main process writes to the manifest, every line is flushed to disk
+    once its file is finished.
+    """
+
+    def __init__(self, folder) -> None:
+        self.file = Path(folder) / MANIFEST_FILE
+        self.finished = self.read()
+
+    def read(self) -> Dict[str, str]:
+        """
+        Read the finished files of an earlier run.
+
+        :returns
+        --------
+        finished - dict
+            New name per old name of the finished files
+        """
+        finished = {}
+        if self.file.exists():
+            with open(self.file, "r", encoding="utf-8") as file_handler:
+                for line in file_handler:
+                    fields = line.rstrip("\n").split("\t")
+                    # An incomplete last line of an interrupted run is skipped
+                    if len(fields) == 3:
+                        finished[fields[0]] = fields[1]
+        return finished
+
+    def add(self, old_name:str, new_name:str, size:int) -> None:
+        """
+        Add a finished file.
+
+        :parameters
+        -----------
+        old_name - str
+            Name of the file before it was edited
+        new_name - str
+            Name of the edited file
+        size - int
+            Size of the old file in bytes
+        """
+        with open(self.file, "a", encoding="utf-8") as file_handler:
+            file_handler.write(f"{old_name}\t{new_name}\t{size}\n")
+            file_handler.flush()
+            os.fsync(file_handler.fileno())
+        self.finished[old_name] = new_name
+
+    def is_finished(self, name:str) -> bool:
+        """
+        Check if a file was already edited, or is the result of an edited file.
+
+        :parameters
+        -----------
+        name - str
+            Name of a file
+
+        :returns
+        --------
+        finished - bool
+            If the file should be skipped
+        """
+        return name in self.finished or name in self.finished.values()
+
+
+def select_files(folder:Path, prefix:str, manifest:Manifest) -> List[str]:
+    """
+    Get the files of a directory that still have to be edited. The manifest, files
+    in the manifest and files that already have the prefix are skipped. Temporary
+    files of an interrupted run are removed.
+
+    :parameters
+    -----------
+    folder - Path
+        Directory containing the features
+    prefix - str
+        Prefix of the edited files
+    manifest - Manifest
+        Finished files of the directory
+
+    :returns
+    --------
+    files - list
+        Names of the files to edit
+    """
+    files = []
+    for name in sorted(os.listdir(folder)):
+        path = Path(folder) / name
+        if name.startswith(TEMP_PREFIX):
+            path.unlink()
+        elif path.is_file() and name != MANIFEST_FILE and not manifest.is_finished(name) \
+            and not (prefix and name.startswith(prefix)):
+            files.append(name)
+    return files
+
+
+def default_workers(edit_files:EditFeatureFiles, files:List[str]) -> int:
+    """
+    Get the number of processes of the batch. Streaming plain text files only
+    copies data, so a few processes are enough to keep the disk busy. Reading with
+    pandas and (de)compressing gzip files is limited by the CPU instead.
+
+    :parameters
+    -----------
+    edit_files - EditFeatureFiles
+        Editor of the files
+    files - list
+        Names of the files to edit
+
+    :returns
+    --------
+    workers - int
+        Number of processes
+    """
+    cpu_bound = not edit_files.stream or edit_files.compress == "gzip" or \
+        any(edit_files.is_gzipped(edit_files.folder / file) for file in files)
+    workers = mp.cpu_count() if cpu_bound else min(IO_WORKERS, mp.cpu_count())
+    return max(1, min(workers, len(files)))
+
+
+def run_batch(edit_files:EditFeatureFiles, files:List[str], manifest:Manifest,
+                workers:int) -> int:
+    """
+    Edit files in parallel, every finished file is added to the manifest and the
+    progress and throughput are logged.
+
+    :parameters
+    -----------
+    edit_files - EditFeatureFiles
+        Editor of the files
+    files - list
+        Names of the files to edit
+    manifest - Manifest
+        Finished files of the directory
+    workers - int
+        Number of processes
+
+    :returns
+    --------
+    n_failed - int
+        Number of files that could not be edited
+    """
+    print(f"Editing {len(files)} files with {workers} processes "
+            f"({len(manifest.finished)} files already finished)", flush=True)
+    start = time.perf_counter()
+    n_done, n_failed, n_bytes = 0, 0, 0
+
+    with mp.Pool(workers) as pool:
+        for file, new_name, size, error in pool.imap_unordered(edit_files.try_edit_file, files):
+            n_done += 1
+            if error is not None:
+                n_failed += 1
+                print(f"[{n_done}/{len(files)}] FAILED {file}: {error}", flush=True)
+                continue
+
+            manifest.add(file, new_name, size)
+            n_bytes += size
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            print(f"[{n_done}/{len(files)}] {file} -> {new_name} ({size / 1e6:.1f} MB) | "
+                    f"{(n_done - n_failed) / elapsed:.2f} files/s, "
+                    f"{n_bytes / 1e6 / elapsed:.1f} MB/s", flush=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"Edited {n_done - n_failed} files ({n_bytes / 1e6:.1f} MB) in {elapsed:.1f}s, "
+            f"{n_failed} failed", flush=True)
+    return n_failed
 
 
 class ArgumentParser:
@@ -162,6 +575,20 @@ class ArgumentParser:
             help='Prefix to use when renaming the files and columns. Default = pops_',
             default="pops_")
 
+        parser.add_argument('--compress', type=str, dest="compress",
+            choices=["keep", "gzip", "none"], default="keep",
+            help='Compression of the edited files: keep the compression of each file, '
+                'gzip all files or write all files as plain text. Default = keep')
+
+        parser.add_argument('--pandas', dest="pandas", action="store_true",
+            help='Read and write the whole files with pandas instead of only rewriting '
+                'the header line (slower).')
+
+        parser.add_argument('-w', '--workers', type=int, dest="workers",
+            help='Number of files that are edited at the same time. Default = 4 when '
+                'plain text files are streamed (limited by the disk), the number of CPUs '
+                'when files are (de)compressed or read with pandas')
+
         parser.add_argument('-v',
             '--version',
             help='Displays the version number of the script and exitst',
@@ -224,17 +651,27 @@ def main():
     cla_parser = ArgumentParser()
     folder = cla_parser.get_argument('directory')
     prefix = cla_parser.get_argument('prefix')
+    compress = cla_parser.get_argument('compress')
+    use_pandas = cla_parser.get_argument('pandas')
+    workers = cla_parser.get_argument('workers')
 
     # Validate passed arguments
     cla_validator = CommandLineArgumentsValidator()
     cla_validator.validate_input_path(folder)
 
-    edit_files = EditFeatureFiles(folder=folder, prefix=prefix)
+    edit_files = EditFeatureFiles(folder=folder, prefix=prefix, stream=not use_pandas,
+                                    compress=compress)
 
-    files = os.listdir(folder)
-    
-    with mp.Pool(mp.cpu_count()) as p:
-        p.map(edit_files.edit_file, files)
+    manifest = Manifest(folder)
+    files = select_files(Path(folder), prefix, manifest)
+    if not files:
+        print("All files are already edited")
+        return
+
+    n_failed = run_batch(edit_files, files, manifest,
+                            workers or default_workers(edit_files, files))
+    if n_failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
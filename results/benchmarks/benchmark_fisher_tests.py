@@ -0,0 +1,293 @@
+"""
+Regression benchmark of the fisher's exact tests of the prioritization methods: the
+vectorized tests of PrioritizationMethod.perform_fisher_exact_tests (with the default
+and the compact loading profile) compared to the original implementation, which read
+the complete output file of a method, selected the overlap with pandas isin and ran
+scipy.stats.fisher_exact on a 2x2 table per HPO term.
+
+A synthetic HPO database and an output file of every prioritization method are written
+to a temporary directory. Both implementations are timed and their odds ratios, p values
+and zscores are compared. The benchmark fails (exit code 1) if the results differ.
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+root_dir = os.path.abspath(os.path.join(
+                  os.path.dirname(__file__),
+                  os.pardir))
+
+sys.path.insert(0, root_dir)
+
+from utils.fisher import HPO, FisherTest
+from utils.prioritization_methods import LOADING_PROFILES, get_method
+
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+
+
+# Tolerances of the comparison, the vectorized p values are calculated in log space
+# and can differ from scipy in the last digits
+RTOL = 1e-9
+ATOL = 1e-9
+
+COMPARED_COLUMNS = ["OR", "pvalues", "zscores"]
+
+
+def write_fixtures(directory: Path, n_genes: int, n_terms: int,
+                    seed: int = 0) -> Tuple[Path, pd.DataFrame, Dict[str, Path]]:
+    """
+    Write a synthetic HPO database and an output file of every prioritization method.
+    The outputs contain genes that are not part of the HPO database, the gene IDs
+    and column names of DEPICT are padded with whitespace and some p values of MAGMA
+    are equal to its threshold.
+
+    :parameters
+    -----------
+    directory - Path
+        Location of the files
+    n_genes - int
+        Number of genes of the HPO database
+    n_terms - int
+        Number of HPO terms
+    seed - int
+        Seed of the random number generator
+
+    :returns
+    --------
+    hpo_file - Path
+        HPO database
+    hpo_info - pd.DataFrame
+        All HPO terms and one term that is not part of the HPO database
+    files - dict
+        Output file per prioritization method
+    """
+    rng = np.random.default_rng(seed)
+    genes = [f"ENSG{gene:011d}" for gene in range(n_genes)]
+    terms = [f"HP:{term:07d}" for term in range(n_terms)]
+
+    annotations = rng.random((n_genes, n_terms)) < rng.uniform(0.002, 0.1, n_terms)
+    hpo_file = directory / "hpo.txt.gz"
+    pd.DataFrame(annotations.astype(int), index=pd.Index(genes, name="-"),
+                    columns=terms).to_csv(hpo_file, sep="\t", compression="gzip")
+
+    hpo_info = pd.DataFrame({"GWAS trait": "trait", "Related HPO term": "term",
+                                "HPO ID": terms + ["HP:9999999"]})
+
+    # 80% of the HPO genes and some genes that are not part of the HPO database
+    candidates = genes[:int(n_genes * 0.8)] + \
+        [f"ENSG{gene:011d}" for gene in range(10**8, 10**8 + n_genes // 10)]
+
+    def pick():
+        selected = rng.choice(candidates, int(len(candidates) * 0.7), replace=False)
+        return list(selected), len(selected)
+
+    files = {}
+    method_genes, n = pick()
+    files["NetWAS"] = directory / "netwas.csv"
+    pd.DataFrame({"ensemble_id": method_genes, "netwas_score": rng.random(n)}) \
+        .to_csv(files["NetWAS"], index=False)
+
+    method_genes, n = pick()
+    files["PoPs"] = directory / "pops.preds"
+    pd.DataFrame({"ENSGID": method_genes, "PoPS_Score": rng.normal(size=n),
+                    "Y": rng.random(n)}).to_csv(files["PoPs"], sep="\t", index=False)
+
+    method_genes, n = pick()
+    files["DEPICT"] = directory / "depict.txt"
+    pd.DataFrame({"Ensembl Gene ID ": [gene + "  " for gene in method_genes],
+                    "Nominal P value ": rng.random(n),
+                    "False discovery rate < 5% ": rng.choice(["Yes", "No"], n, p=[0.1, 0.9])}) \
+        .to_csv(files["DEPICT"], sep="\t", index=False)
+
+    method_genes, n = pick()
+    files["Downstreamer"] = directory / "downstreamer.xlsx"
+    pd.DataFrame({"Gene ID": method_genes, "Enrichment P-value": rng.random(n),
+                    "FDR 5% significant": rng.random(n) < 0.1}) \
+        .to_excel(files["Downstreamer"], sheet_name="GenePrioritization", index=False)
+
+    method_genes, n = pick()
+    files["MAGMA"] = directory / "magma.genes.out"
+    p_values = [f"{value:.6g}" for value in 10 ** -rng.uniform(0, 8, n)]
+    # P values equal to the threshold are not significant, also with float32 scores
+    p_values[:5] = ["0.0001084"] * 5
+    lines = ["GENE".rjust(15) + "P".rjust(14)]
+    lines += [gene.rjust(15) + p_value.rjust(14) for gene, p_value in zip(method_genes, p_values)]
+    files["MAGMA"].write_text("\n".join(line.lstrip() for line in lines) + "\n",
+                                encoding="utf-8")
+
+    return hpo_file, hpo_info, files
+
+
+def read_depict(file: Path) -> pd.DataFrame:
+    """
+    Read a DEPICT output file the way the original implementation did.
+
+    :parameters
+    -----------
+    file - Path
+        DEPICT output file
+
+    :returns
+    --------
+    depict_data - pd.DataFrame
+        Data with stripped column names and gene IDs
+    """
+    depict_data = pd.read_csv(file, sep="\t")
+    depict_data.columns = depict_data.columns.str.rstrip()
+    depict_data["Ensembl Gene ID"] = depict_data["Ensembl Gene ID"].str.rstrip()
+    return depict_data
+
+
+# Original reader, gene ID column and selection of the significant genes per method
+ORIGINAL_METHODS: Dict[str, Tuple[Callable, str, Callable]] = {
+    "NetWAS": (lambda file: pd.read_csv(file, sep=","), "ensemble_id",
+                lambda data: data[data["netwas_score"] > 0.5]),
+    "PoPs": (lambda file: pd.read_csv(file, sep="\t"), "ENSGID",
+                lambda data: data.sort_values("PoPS_Score", ascending=False).iloc[0:500, :]),
+    "DEPICT": (read_depict, "Ensembl Gene ID",
+                lambda data: data[data["False discovery rate < 5%"] == "Yes"]),
+    "Downstreamer": (lambda file: pd.read_excel(file, "GenePrioritization"), "Gene ID",
+                lambda data: data[data["FDR 5% significant"] == True]),
+    "MAGMA": (lambda file: pd.read_csv(file, sep=r"\s\s+", engine="python"), "GENE",
+                lambda data: data[data["P"] < 1.084e-4])}
+
+
+def original_fisher_tests(hpo_data: pd.DataFrame, method: str, file: Path,
+                            hpo_info: pd.DataFrame) -> pd.DataFrame:
+    """
+    Perform the fisher's exact tests of a prioritization method the way the original
+    implementation did: one contingency table and scipy.stats.fisher_exact per HPO term.
+
+    :parameters
+    -----------
+    hpo_data - pd.DataFrame
+        HPO metric inside a pandas data frame
+    method - str
+        Name of the prioritization method
+    file - Path
+        Output file of the prioritization method
+    hpo_info - pd.DataFrame
+        A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
+
+    :returns
+    --------
+    hpo_scores - pd.DataFrame
+        The hpo_info data frame with the OR, p values and zscores of the tests
+    """
+    read, id_column, select = ORIGINAL_METHODS[method]
+    data = read(file)
+    genes = data[id_column]
+
+    overlap_hpo = hpo_data[hpo_data.index.isin(genes)]
+    overlap_data = data[data[id_column].isin(genes[genes.isin(overlap_hpo.index)])]
+    significant_genes = select(overlap_data)[id_column]
+
+    overlap_genes = overlap_hpo.index
+    in_gwas = overlap_genes.isin(significant_genes)
+    odds_ratios, p_values = [], []
+    for hpo_term in hpo_info["HPO ID"]:
+        if hpo_term not in overlap_hpo.columns:
+            odds_ratios.append(np.nan)
+            p_values.append(np.nan)
+            continue
+        in_hpo = overlap_genes.isin(overlap_hpo.index[overlap_hpo[hpo_term] == 1])
+        table = [[np.sum(~in_gwas & ~in_hpo), np.sum(~in_gwas & in_hpo)],
+                    [np.sum(in_gwas & ~in_hpo), np.sum(in_gwas & in_hpo)]]
+        odds_ratio, p_value = stats.fisher_exact(table)
+        odds_ratios.append(odds_ratio)
+        p_values.append(p_value)
+
+    hpo_scores = hpo_info.copy()
+    hpo_scores["OR"] = odds_ratios
+    hpo_scores["pvalues"] = p_values
+    zscores = stats.norm.ppf(p_values)
+    hpo_scores["zscores"] = np.where(zscores == np.inf, 4, zscores)
+    return hpo_scores
+
+
+def compare_results(expected: pd.DataFrame, observed: pd.DataFrame) -> Tuple[float, bool]:
+    """
+    Compare the odds ratios, p values and zscores of two results. Values that are NaN
+    or infinite in both results count as equal.
+
+    :parameters
+    -----------
+    expected - pd.DataFrame
+        Results of the original implementation
+    observed - pd.DataFrame
+        Results of the vectorized implementation
+
+    :returns
+    --------
+    difference - float
+        Largest absolute difference between finite values
+    same - bool
+        True if all values are equal within the tolerances (RTOL, ATOL)
+    """
+    difference, same = 0.0, True
+    for column in COMPARED_COLUMNS:
+        a = expected[column].to_numpy(dtype=np.float64)
+        b = observed[column].to_numpy(dtype=np.float64)
+        same &= bool(np.allclose(b, a, rtol=RTOL, atol=ATOL, equal_nan=True))
+        finite = np.isfinite(a) & np.isfinite(b)
+        if finite.any():
+            difference = max(difference, float(np.abs(a[finite] - b[finite]).max()))
+    return difference, same
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                    formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-g", "--genes", type=int, default=5000,
+                        help="Number of genes of the HPO database. Default = 5000")
+    parser.add_argument("-t", "--terms", type=int, default=500,
+                        help="Number of HPO terms. Default = 500")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="Seed of the synthetic data. Default = 0")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        hpo_file, hpo_info, files = write_fixtures(Path(tmp_dir), args.genes, args.terms,
+                                                    args.seed)
+        hpo_data = pd.read_csv(hpo_file, compression="gzip", sep="\t").set_index("-")
+        hpo = HPO(database=hpo_file, cache_dir=Path(tmp_dir) / "cache")
+        fisher = FisherTest()
+
+        print(f"{args.genes} genes x {args.terms} HPO terms")
+        for method, file in files.items():
+            start = time.perf_counter()
+            expected = original_fisher_tests(hpo_data, method, file, hpo_info)
+            original_seconds = time.perf_counter() - start
+
+            for profile in LOADING_PROFILES:
+                start = time.perf_counter()
+                method_instance = get_method(method)(hpo=hpo, fisher=fisher, profile=profile)
+                observed = method_instance.perform_fisher_exact_tests(file, hpo_info)
+                seconds = time.perf_counter() - start
+
+                difference, same = compare_results(expected, observed)
+                failed |= not same
+                print(f"{method:>12} {profile:>8}: original {original_seconds:.3f}s, "
+                        f"vectorized {seconds:.3f}s, max difference {difference:.1e} "
+                        f"{'OK' if same else 'FAIL'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
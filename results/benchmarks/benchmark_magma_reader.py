@@ -0,0 +1,121 @@
+"""
+Micro-benchmark of the MAGMA .genes.out reader: the C engine reader of Magma.read_data
+(which only reads the GENE and P columns) compared to the previous python engine
+reader (regex separator).
+
+A synthetic, genome-wide .genes.out file is written to a temporary directory, read
+multiple times with both readers and the results are checked to be identical.
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+import timeit
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+root_dir = os.path.abspath(os.path.join(
+                  os.path.dirname(__file__),
+                  os.pardir))
+
+sys.path.insert(0, root_dir)
+
+from utils.prioritization_methods import Magma
+
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+
+
+def write_genes_out(file: Path, n_genes: int, seed: int = 0) -> None:
+    """
+    Write a synthetic MAGMA .genes.out file with right aligned columns.
+
+    :parameters
+    -----------
+    file - Path
+        Location of the output file
+    n_genes - int
+        Number of genes
+    seed - int
+        Seed of the random number generator
+    """
+    rng = np.random.default_rng(seed)
+    start = rng.integers(1, 2e8, n_genes)
+    data = pd.DataFrame({
+        "GENE": [f"ENSG{gene:011d}" for gene in rng.choice(10**8, n_genes, replace=False)],
+        "CHR": rng.integers(1, 23, n_genes),
+        "START": start,
+        "STOP": start + rng.integers(1e3, 1e6, n_genes),
+        "NSNPS": rng.integers(1, 1000, n_genes),
+        "NPARAM": rng.integers(1, 100, n_genes),
+        "N": rng.integers(1000, 500000, n_genes),
+        "ZSTAT": np.round(rng.normal(size=n_genes), 4),
+        "P": [f"{value:.6g}" for value in rng.uniform(1e-12, 1, n_genes)]})
+
+    widths = {"GENE": 15, "CHR": 5, "START": 10, "STOP": 10, "NSNPS": 6, "NPARAM": 7,
+                "N": 8, "ZSTAT": 11, "P": 13}
+    lines = [" ".join(column.rjust(width) for column, width in widths.items()).lstrip()]
+    for row in data.itertuples(index=False):
+        lines.append(" ".join(str(value).rjust(widths[column])
+                                for column, value in zip(widths, row)).lstrip())
+
+    file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def read_python_engine(file: Path) -> pd.DataFrame:
+    """
+    Read a .genes.out file the way Magma.read_data used to.
+
+    :parameters
+    -----------
+    file - Path
+        MAGMA .genes.out file
+
+    :returns
+    --------
+    magma_data - pd.DataFrame
+        Data in a data frame
+    """
+    return pd.read_csv(file, sep=r'\s\s+', engine='python')
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-g", "--genes", type=int, default=20000,
+                        help="Number of genes in the synthetic file. Default = 20000")
+    parser.add_argument("-r", "--repeats", type=int, default=5,
+                        help="Number of times each reader is timed. Default = 5")
+    args = parser.parse_args()
+
+    magma = Magma(hpo=None, fisher=None)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = Path(tmp_dir) / "synthetic.genes.out"
+        write_genes_out(file, args.genes)
+
+        old = read_python_engine(file)
+        new, _ = magma.read_data(file)
+        columns = list(magma.get_columns())
+        expected = old[columns].set_axis(list(new.columns), axis=1)
+        assert expected.equals(new), "The readers do not give identical results"
+
+        old_time = min(timeit.repeat(lambda: read_python_engine(file),
+                                    number=1, repeat=args.repeats))
+        new_time = min(timeit.repeat(lambda: magma.read_data(file),
+                                    number=1, repeat=args.repeats))
+
+    print(f"Genes: {args.genes}, best of {args.repeats} runs")
+    print(f"python engine (all columns): {old_time * 1000:8.1f} ms")
+    print(f"C engine ({', '.join(columns)}): {new_time * 1000:8.1f} ms")
+    print(f"Speedup: {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Benchmark of the renaming of the PoPS feature files (prioritization_methods/PoPS/
+rename_file_contents.py): a directory of synthetic feature files, plain text and
+gzipped, is edited with the streaming editor and with pandas and the time is reported.
+
+Every directory also contains broken files: a truncated gzip file (as left by an
+interrupted download), a gzip file with a corrupt stream and a file that is not
+UTF-8. The batch has to report these files as failed and still edit all other
+files. The benchmark fails (exit code 1) if a broken file stops the batch or if an
+edited file differs from the expected output.
+"""
+
+import sys
+import os
+import argparse
+import gzip
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+
+
+root_dir = os.path.abspath(os.path.join(
+                  os.path.dirname(__file__),
+                  os.pardir))
+
+SCRIPT = Path(root_dir, os.pardir, "prioritization_methods", "PoPS",
+                "rename_file_contents.py").resolve()
+
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+
+
+PREFIX = "pops_"
+
+BROKEN_FILES = ["truncated.txt.gz", "corrupt.txt.gz", "latin1.txt"]
+
+
+def feature_content(n_genes: int, n_columns: int, rng: np.random.Generator) -> bytes:
+    """
+    Create the content of a synthetic feature file: a gene ID column and feature columns.
+
+    :parameters
+    -----------
+    n_genes - int
+        Number of rows
+    n_columns - int
+        Number of feature columns
+    rng - np.random.Generator
+        Random number generator
+
+    :returns
+    --------
+    content - bytes
+        Tab separated content with a header line
+    """
+    values = rng.random((n_genes, n_columns))
+    lines = ["ENSGID\t" + "\t".join(f"feature{column}" for column in range(n_columns))]
+    lines += [f"ENSG{gene:011d}\t" + "\t".join(f"{value:.6g}" for value in row)
+                for gene, row in enumerate(values)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def write_fixtures(directory: Path, n_files: int, n_genes: int, n_columns: int,
+                    seed: int = 0) -> Dict[str, bytes]:
+    """
+    Write synthetic feature files, half of them gzipped, and the broken files.
+
+    :parameters
+    -----------
+    directory - Path
+        Location of the files
+    n_files - int
+        Number of valid feature files
+    n_genes - int
+        Number of rows per file
+    n_columns - int
+        Number of feature columns per file
+    seed - int
+        Seed of the random number generator
+
+    :returns
+    --------
+    contents - dict
+        Uncompressed content per name of the valid files
+    """
+    rng = np.random.default_rng(seed)
+    contents = {}
+    for number in range(n_files):
+        content = feature_content(n_genes, n_columns, rng)
+        if number % 2:
+            name = f"features{number}.txt.gz"
+            (directory / name).write_bytes(gzip.compress(content))
+        else:
+            name = f"features{number}.txt"
+            (directory / name).write_bytes(content)
+        contents[name] = content
+
+    compressed = gzip.compress(feature_content(n_genes, n_columns, rng))
+    (directory / "truncated.txt.gz").write_bytes(compressed[:len(compressed) // 2])
+    # Inverting the first byte of the deflate stream gives an invalid block
+    corrupt = bytearray(gzip.compress(feature_content(10, n_columns, rng)))
+    corrupt[10] ^= 0xff
+    (directory / "corrupt.txt.gz").write_bytes(bytes(corrupt))
+    (directory / "latin1.txt").write_bytes("ENSGID\tcaf\xe9\n".encode("latin-1"))
+    return contents
+
+
+def expected_content(name: str, content: bytes) -> bytes:
+    """
+    Get the expected content of an edited file: the prefix of the file is added
+    to the names of the feature columns.
+
+    :parameters
+    -----------
+    name - str
+        Name of the edited file
+    content - bytes
+        Uncompressed content of the original file
+
+    :returns
+    --------
+    content - bytes
+        Uncompressed content of the edited file
+    """
+    header, _, body = content.partition(b"\n")
+    base_name = name.partition(".")[0]
+    columns = header.decode("utf-8").split("\t")
+    columns[1:] = [f"{base_name}_{column}" for column in columns[1:]]
+    return "\t".join(columns).encode("utf-8") + b"\n" + body
+
+
+def check_directory(directory: Path, contents: Dict[str, bytes], stdout: str,
+                    exact: bool = True) -> List[str]:
+    """
+    Check the edited files and the reported failures of a batch.
+
+    :parameters
+    -----------
+    directory - Path
+        Directory that was edited
+    contents - dict
+        Uncompressed content per name of the valid files
+    stdout - str
+        Output of the batch
+    exact - bool
+        Compare the whole files, otherwise only the header line and the number of
+        lines (pandas writes the values in its own format)
+
+    :returns
+    --------
+    problems - list
+        Description of every problem, empty if the batch is correct
+    """
+    problems = []
+    for name, content in contents.items():
+        file = directory / (PREFIX + name)
+        if not file.exists():
+            problems.append(f"{name} was not edited")
+            continue
+        data = file.read_bytes()
+        if name.endswith(".gz"):
+            data = gzip.decompress(data)
+        expected = expected_content(PREFIX + name, content)
+        if not exact:
+            data = data.partition(b"\n")[0], data.count(b"\n")
+            expected = expected.partition(b"\n")[0], expected.count(b"\n")
+        if data != expected:
+            problems.append(f"{name} differs from the expected output")
+    for name in BROKEN_FILES:
+        if f"FAILED {name}" not in stdout:
+            problems.append(f"{name} was not reported as failed")
+    return problems
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                    formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-f", "--files", type=int, default=8,
+                        help="Number of valid feature files. Default = 8")
+    parser.add_argument("-g", "--genes", type=int, default=20000,
+                        help="Number of rows per feature file. Default = 20000")
+    parser.add_argument("-c", "--columns", type=int, default=20,
+                        help="Number of feature columns per file. Default = 20")
+    args = parser.parse_args()
+
+    failed = False
+    for mode, options in (("stream", []), ("pandas", ["--pandas"])):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = Path(tmp_dir)
+            contents = write_fixtures(directory, args.files, args.genes, args.columns)
+
+            start = time.perf_counter()
+            process = subprocess.run([sys.executable, str(SCRIPT), "-d", tmp_dir,
+                                        "--prefix", PREFIX] + options,
+                                        capture_output=True, text=True, check=False)
+            seconds = time.perf_counter() - start
+
+            problems = check_directory(directory, contents, process.stdout, exact=not options)
+            # The broken files are expected to fail, any other error stops the batch
+            if process.returncode != 1 or "Traceback" in process.stderr:
+                problems.append(f"exit code {process.returncode}: "
+                                f"{process.stderr.strip().splitlines()[-1:]}")
+            failed |= bool(problems)
+
+            print(f"{mode:>6}: {args.files} files in {seconds:.2f}s "
+                    f"{'OK' if not problems else 'FAIL'}")
+            for problem in problems:
+                print(f"        {problem}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Startup benchmark of the fisher's exact test scripts: every script is started with
+--help and with an argument error under `python -X importtime` in a new process, the
+wall time and the import time are reported and the imported modules are checked.
+
+The heavy dependencies (numpy, pandas, scipy, yaml, matplotlib and the prioritization
+methods) should only be imported once the arguments are valid, so printing the help
+(or an argument error) should stay fast. The benchmark fails (exit code 1) if one of
+them is imported or if a script starts slower than the budget, so it can be used to
+guard against startup regressions.
+"""
+
+import sys
+import os
+import argparse
+import re
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+root_dir = os.path.abspath(os.path.join(
+                  os.path.dirname(__file__),
+                  os.pardir))
+
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+
+
+SCRIPTS = [Path("fisher_tests", "single_test", "fisher_exact_test.py"),
+            Path("fisher_tests", "multiple_tests", "fisher_exact_test_prio_methods.py"),
+            Path("fisher_tests", "all_methods", "run_all_methods.py")]
+
+HEAVY_MODULES = ["numpy", "pandas", "scipy", "yaml", "matplotlib", "matplotlib_venn",
+                "utils.prioritization_methods", "utils.fisher"]
+
+# Arguments of every run: the help message and an argument error (a required argument
+# is missing or the option is unknown), with the exit code they should give
+RUNS = [(["--help"], 0),
+        (["-m", "NetWAS", "--no-such-option"], 2)]
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """
+    Parse the output of `python -X importtime`.
+
+    :parameters
+    -----------
+    stderr - str
+        Standard error of the process
+
+    :returns
+    --------
+    imports - dict
+        Cumulative import time in microseconds of every imported top level
+        import (the imports that are not done by another import)
+    """
+    imports = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Top level imports are indented by a single space
+        if match and len(match.group(3)) == 1:
+            imports[match.group(4)] = imports.get(match.group(4), 0) + int(match.group(2))
+    return imports
+
+
+def imported_modules(stderr: str) -> List[str]:
+    """
+    Get the names of all modules that were imported according to `python -X importtime`.
+
+    :parameters
+    -----------
+    stderr - str
+        Standard error of the process
+
+    :returns
+    --------
+    modules - list
+        Names of the imported modules
+    """
+    return [match.group(4) for match in map(IMPORT_LINE.match, stderr.splitlines()) if match]
+
+
+def time_script(script: Path, arguments: List[str],
+                returncode: int) -> Tuple[float, Dict[str, int], List[str]]:
+    """
+    Start a script under `python -X importtime`.
+
+    :parameters
+    -----------
+    script - Path
+        Location of the script
+    arguments - list
+        Command line arguments of the script
+    returncode - int
+        Exit code the script should give
+
+    :returns
+    --------
+    seconds - float
+        Wall time of the process
+    imports - dict
+        Cumulative import time in microseconds per top level import
+    heavy - list
+        Heavy modules that were imported
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", str(script)] + arguments,
+                                capture_output=True, text=True, cwd=script.parent, check=False)
+    seconds = time.perf_counter() - start
+    if process.returncode != returncode:
+        raise RuntimeError(f"{script} {' '.join(arguments)} exited with "
+                            f"{process.returncode}:\n{process.stderr.strip()}")
+
+    modules = set(imported_modules(process.stderr))
+    heavy = [module for module in HEAVY_MODULES if module in modules]
+    return seconds, parse_importtime(process.stderr), heavy
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                    formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-r", "--repeats", type=int, default=5,
+                        help="Number of times each script is started. Default = 5")
+    parser.add_argument("--max-ms", type=float, default=500,
+                        help="Startup budget per script in milliseconds (best of the "\
+                            "repeats). Default = 500")
+    parser.add_argument("--top", type=int, default=5,
+                        help="Number of slowest imports that are shown per script. Default = 5")
+    args = parser.parse_args()
+
+    failed = False
+    for script in SCRIPTS:
+        for arguments, returncode in RUNS:
+            name = f"{script} {' '.join(arguments)}"
+            try:
+                runs = [time_script(Path(root_dir) / script, arguments, returncode)
+                        for _ in range(args.repeats)]
+            except RuntimeError as error:
+                print(f"{name}: FAIL\n{str(error).splitlines()[-1]}")
+                failed = True
+                continue
+            seconds, imports, heavy = min(runs, key=lambda run: run[0])
+            import_ms = sum(imports.values()) / 1000
+
+            print(f"{name}: {seconds * 1000:.1f} ms wall, {import_ms:.1f} ms imports "
+                    f"(best of {args.repeats})")
+            for module, microseconds in sorted(imports.items(),
+                                                key=lambda item: -item[1])[:args.top]:
+                print(f"    {microseconds / 1000:8.1f} ms  {module}")
+
+            if heavy:
+                print(f"    FAIL: imports {', '.join(heavy)}")
+                failed = True
+            if seconds * 1000 > args.max_ms:
+                print(f"    FAIL: startup exceeds the budget of {args.max_ms:.0f} ms")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
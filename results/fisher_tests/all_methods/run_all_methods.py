@@ -0,0 +1,231 @@
+"""
+Perform the fisher exact tests for every combination of prioritization method
+and trait in a single run.
+
+The HPO database is loaded (and if needed converted to its binary cache) once,
+after which the (method, trait) grid is processed by a pool of worker processes
+that all memory-map the same read-only HPO cache.
+"""
+
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+
+root_dir = os.path.abspath(os.path.join(
+                  os.path.dirname(__file__),
+                  os.pardir,
+                  os.pardir))
+
+sys.path.insert(0, root_dir)
+
+from arg_parser import ArgumentParser, CLIArgValidator
+from utils.config import (get_config, get_correction_family, get_loading_profile,
+                            read_hpo_info, write_out_data)
+
+# pandas, yaml and the utils modules (numpy, scipy) are imported where they are
+# used, so --help and argument errors do not wait for them
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+__data__ = "9-8-2022"
+
+
+# State of a worker process, set once by init_worker
+_worker = {}
+
+
+def make_out_dir(path: Path) -> None:
+    """
+    Create a directory (if it does not exsit yet) to store the
+    data.
+
+    :parameter
+    ----------
+    path - Path
+        Location of directory
+    """
+    path.mkdir(parents=True, exist_ok=True)
+
+
+def get_grid(config: dict) -> List[Tuple[str, str, Path]]:
+    """
+    Get all (trait, method, file) combinations from the results_methods section
+    of the configuration file.
+
+    :parameter
+    ----------
+    config - dict
+        Configuration file in dictionary form.
+
+    :returns
+    --------
+    grid - list
+        List of (trait, method, file) tuples
+
+    :raises
+    -------
+    ValueError
+        A method in the configuration file is not supported
+    """
+    from utils.prioritization_methods import get_method
+
+    grid = []
+    for trait, methods in config["results_methods"].items():
+        for method, file in methods.items():
+            # Raises a ValueError for methods that are not registered
+            get_method(method)
+            grid.append((trait, method, Path(file)))
+    return grid
+
+
+def init_worker(hpo_database: Path, cache_dir: Optional[Path], ontology: Optional[Path],
+                hpo_info: "pd.DataFrame") -> None:
+    """
+    Initialize a worker process by memory-mapping the HPO cache.
+
+    :parameters
+    -----------
+    hpo_database - Path
+        Location of the HPO database
+    cache_dir - Path
+        Location of the HPO cache
+    ontology - Path
+        Location of the HPO ontology (hp.obo), None to not propagate the annotations
+    hpo_info - pd.DataFrame
+        A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
+    """
+    from utils.fisher import HPO, FisherTest
+
+    _worker["hpo"] = HPO(database=hpo_database, cache_dir=cache_dir, ontology=ontology)
+    _worker["fisher"] = FisherTest()
+    _worker["hpo_info"] = hpo_info
+
+
+def run_cell(trait: str, method: str, file: Path, out_dir: Path,
+                profile: str = "default") -> Tuple[str, str, Path, float]:
+    """
+    Perform the fisher exact tests for one (method, trait) combination and
+    write out the results.
+
+    :parameters
+    -----------
+    trait - str
+        Name of the trait
+    method - str
+        Name of the prioritization method
+    file - Path
+        Results of the prioritization method for the trait
+    out_dir - Path
+        Location where the output files need to be stored
+    profile - str
+        Loading profile of the results of the prioritization method
+
+    :returns
+    --------
+    trait, method, out_file, seconds - tuple
+        The processed combination, the output file and the run time in seconds
+    """
+    from utils.prioritization_methods import get_method
+
+    start = time.perf_counter()
+
+    method_instance = get_method(method)(hpo=_worker["hpo"], fisher=_worker["fisher"],
+                                            profile=profile)
+    fish_results = method_instance.perform_fisher_exact_tests(file, _worker["hpo_info"])
+
+    out_file = out_dir / method / ("fisher_result_" + file.stem + ".csv")
+    write_out_data(fish_results, out_file)
+
+    return trait, method, out_file, time.perf_counter() - start
+
+
+def main():
+    """
+    Run the program.
+    """
+    arg_parse = ArgumentParser()
+
+    config_file = arg_parse.get_argument("c")
+    output_dir = arg_parse.get_argument("o")
+    workers = arg_parse.get_argument("w")
+
+    cli_validator = CLIArgValidator()
+    cli_validator.validate_input_file(config_file)
+    cli_validator.validate_workers(workers)
+
+    config = get_config(Path(config_file))
+    grid = get_grid(config)
+    correction_family = get_correction_family(config)
+    loading_profile = get_loading_profile(config)
+
+    out_dir = Path(output_dir)
+    for method in {method for _, method, _ in grid}:
+        make_out_dir(out_dir / method)
+
+    hpo_info_data = read_hpo_info(Path(config["hpo_info"]))
+    init_args = (config["hpo_data"], config.get("hpo_cache"), config.get("hpo_ontology"),
+                hpo_info_data)
+
+    # Load the HPO data once, this also builds the cache the workers memory-map
+    start = time.perf_counter()
+    init_worker(*init_args)
+    print(f"Loaded HPO data in {time.perf_counter() - start:.2f}s")
+
+    if config.get("test_ancestors"):
+        if _worker["hpo"].obo is None:
+            raise ValueError("test_ancestors requires the HPO ontology (hpo_ontology)")
+        _worker["hpo_info"] = _worker["hpo"].obo.add_ancestor_terms(hpo_info_data)
+        init_args = init_args[:-1] + (_worker["hpo_info"],)
+
+    workers = min(workers or os.cpu_count() or 1, len(grid))
+    failed = []
+    finished = []
+
+    if workers == 1:
+        for trait, method, file in grid:
+            try:
+                _, _, out_file, seconds = run_cell(trait, method, file, out_dir,
+                                                    loading_profile)
+                print(f"Processed {method} - {trait} in {seconds:.2f}s: {out_file}")
+                finished.append((method, out_file))
+            except Exception as error:
+                failed.append((trait, method, error))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                initargs=init_args) as executor:
+            futures = {executor.submit(run_cell, trait, method, file, out_dir,
+                                        loading_profile): (trait, method)
+                        for trait, method, file in grid}
+            for future in as_completed(futures):
+                try:
+                    trait, method, out_file, seconds = future.result()
+                    print(f"Processed {method} - {trait} in {seconds:.2f}s: {out_file}")
+                    finished.append((method, out_file))
+                except Exception as error:
+                    failed.append((*futures[future], error))
+
+    # The results are corrected per trait, correct the larger families over all files
+    if correction_family != "trait":
+        from utils.multiple_testing import correct_result_files
+        correct_result_files({out_file: method if correction_family == "method" else "all"
+                                for method, out_file in finished})
+
+    for trait, method, error in failed:
+        print(f"Failed {method} - {trait}: {error!r}", file=sys.stderr)
+
+    print(f"Finished {len(grid) - len(failed)}/{len(grid)} combinations in "\
+        f"{time.perf_counter() - start:.2f}s")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
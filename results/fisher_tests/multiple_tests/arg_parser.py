@@ -7,6 +7,7 @@ import argparse
 import os
 from pathlib import Path
 from typing import Any
+from utils.method_names import validate_method_name
 
 __author__ = "Stijn Arends"
 __version__ = "v0.1"
@@ -25,6 +26,7 @@ class ArgumentParser:
             self.parser.print_help(sys.stderr)
             sys.exit(1)
         self.arguments = self.parser.parse_args()
+        self.arguments.m = validate_method_name(self.parser, self.arguments.m)
 
     @staticmethod
     def _create_argument_parser():
@@ -47,14 +49,46 @@ class ArgumentParser:
                            help="Location of the configuration file.")
 
         parser.add_argument("-m", "--method", action="store",
-                           dest="m", required=True, choices=["NetWAS", "PoPs", "DEPICT",
-                           "MAGMA", "Downstreamer"],
-                           help="Name of the prioritization method")
+                           dest="m", required=True,
+                           metavar="METHOD", help="Name of the prioritization method "\
+                            "(NetWAS, PoPs, DEPICT, MAGMA, Downstreamer or another "\
+                            "registered method)")
 
         parser.add_argument("-o", '--output', dest='o',
                         help="Location where the output files need to be stored.",
                         required=True)
 
+        parser.add_argument("--sweep", dest="sweep", action="store_true",
+                        help="Threshold sweep mode, perform the tests on the top k genes "\
+                            "for a range of k (set in the configuration file) instead of "\
+                            "only on the significant genes.")
+
+        cache_group = parser.add_mutually_exclusive_group()
+
+        cache_group.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Do not use the result cache, always perform the tests.")
+
+        cache_group.add_argument("--rebuild", dest="rebuild", action="store_true",
+                        help="Perform all tests again and replace the cached results.")
+
+        permutation_group = parser.add_argument_group("permutation test",
+            "Calculate empirical p values by comparing the observed overlap with "\
+            "random gene sets of the same size.")
+
+        permutation_group.add_argument("--permutations", dest="permutations", type=int,
+                        default=0, help="Number of random gene sets, default = 0 (no "\
+                            "permutation test)")
+
+        permutation_group.add_argument("--seed", dest="seed", type=int, default=None,
+                        help="Seed of the random number generator.")
+
+        permutation_group.add_argument("--chunk-size", dest="chunk_size", type=int,
+                        default=500, help="Number of random gene sets that are evaluated "\
+                            "at once, bounds the memory usage. Default = 500")
+
+        permutation_group.add_argument("--workers", dest="workers", type=int, default=1,
+                        help="Number of worker processes for the permutations. Default = 1")
+
         parser.add_argument('-v',
             '--version',
             help='Displays the version number of the script and exitst',
@@ -123,3 +157,22 @@ class CLIArgValidator:
         """
         if not input_path.is_file():
             raise FileNotFoundError(f'Input file does not exist!: {input_path}')
+
+    @staticmethod
+    def validate_permutation_args(permutations: int, chunk_size: int, workers: int) -> None:
+        """
+        Check if the arguments of the permutation test are valid.
+
+        :parameters
+        -----------
+        permutations - int
+            Number of random gene sets
+        chunk_size - int
+            Number of random gene sets that are evaluated at once
+        workers - int
+            Number of worker processes
+        """
+        if permutations < 0:
+            raise ValueError(f"The number of permutations can not be negative: {permutations}")
+        if chunk_size < 1 or workers < 1:
+            raise ValueError("The chunk size and number of workers should be at least 1.")
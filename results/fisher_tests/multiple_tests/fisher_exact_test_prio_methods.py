@@ -6,11 +6,10 @@ import sys
 import os
 # from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING
 # import numpy as np
-import pandas as pd
 # from scipy import stats
 # import scipy.stats as stats
-import yaml
 
 
 root_dir = os.path.abspath(os.path.join(
@@ -20,9 +19,14 @@ root_dir = os.path.abspath(os.path.join(
 
 sys.path.insert(0, root_dir)
 
-from utils.prioritization_methods import Downstreamer, Magma, Depict, PoPs, NetWAS
-from utils.fisher import HPO, FisherTest
 from arg_parser import ArgumentParser, CLIArgValidator
+from utils.config import (get_config, get_correction_family, get_loading_profile,
+                            read_hpo_info, write_out_data)
+
+# pandas, yaml and the utils modules (numpy, scipy) are imported where they are
+# used, so --help and argument errors do not wait for them
+if TYPE_CHECKING:
+    from utils.cache import ResultCache
 
 
 __author__ = "Stijn Arends"
@@ -30,43 +34,6 @@ __version__ = "v0.1"
 __data__ = "9-8-2022"
 
 
-def get_config(file: Path) -> dict:
-    """
-    Read in config file and return it as a dictionary.
-
-    :parameter
-    ----------
-    file - str
-        Configuration file in yaml format
-
-    :returns
-    --------
-    config - dict
-        Configuration file in dictionary form.
-    """
-    if not file.exists():
-        raise FileExistsError(f"The file that was supplied does not exists: {file}")
-
-    with open(file, 'r', encoding="utf-8") as stream:
-        config = yaml.safe_load(stream)
-
-    return config
-
-
-def read_hpo_info(hpo_info: pd.DataFrame) -> pd.DataFrame:
-    """
-    Read in a CSV file containing information about HPO terms
-    and related GWAS traits.
-
-    :parameter
-    ----------
-    hpo_info - str
-        CSV containing info about hpo/GWAS traits
-    """
-    hpo_info_data = pd.read_csv(hpo_info, sep=",")
-    return hpo_info_data
-
-
 def make_out_dir(path: Path) -> None:
     """
     Create a directory (if it does not exsit yet) to store the
@@ -88,18 +55,49 @@ def make_out_dir(path: Path) -> None:
         print(f"[{make_out_dir.__name__}] {path} already exists.")
 
 
-def write_out_data(data: pd.DataFrame, file: Path) -> None:
+def get_top_k(config: dict) -> range:
     """
-    Write out a pandas data frame to a file.
+    Get the numbers of top ranked genes to use in the threshold sweep mode
+    from the configuration file.
+
+    :parameter
+    ----------
+    config - dict
+        Configuration file in dictionary form.
+
+    :returns
+    --------
+    top_k - range
+        Numbers of top ranked genes, default = 50, 100, ..., 5000
+    """
+    sweep = config.get("sweep") or {}
+    return range(sweep.get("start", 50), sweep.get("stop", 5000) + 1, sweep.get("step", 50))
+
+
+def get_result_cache(config: dict, output_dir: Path, rebuild: bool) -> "ResultCache":
+    """
+    Create the result cache, by default in a .result_cache directory inside the
+    output directory.
 
     :parameters
     -----------
-    data - pd.DataFrame
-        Data
-    file - Path
-        Name and location of output file
+    config - dict
+        Configuration file in dictionary form.
+    output_dir - Path
+        Location where the output files are stored
+    rebuild - bool
+        Ignore the cached results and replace them
+
+    :returns
+    --------
+    result_cache - ResultCache
+        The result cache
     """
-    data.to_csv(file, sep="\t")
+    from utils.cache import ResultCache
+
+    directory = config.get("result_cache") or output_dir / ".result_cache"
+    max_size = config.get("result_cache_size", 1024) * 1024**2
+    return ResultCache(directory, max_size=max_size, rebuild=rebuild)
 
 
 def main():
@@ -111,11 +109,25 @@ def main():
     config_file = arg_parse.get_argument("c")
     method = arg_parse.get_argument("m")
     output_dir = arg_parse.get_argument("o")
+    sweep = arg_parse.get_argument("sweep")
+    permutations = arg_parse.get_argument("permutations")
+    chunk_size = arg_parse.get_argument("chunk_size")
+    workers = arg_parse.get_argument("workers")
+    seed = arg_parse.get_argument("seed")
 
     cli_validator = CLIArgValidator()
     cli_validator.validate_input_file(config_file)
+    cli_validator.validate_permutation_args(permutations, chunk_size, workers)
+
+    from utils.prioritization_methods import get_method
+    from utils.fisher import HPO, FisherTest
+    from utils.multiple_testing import FAMILIES, correct_result_files
+    from utils.permutation import PermutationTest
 
     config = get_config(Path(config_file))
+    # A single method can not be corrected over all methods
+    correction_family = get_correction_family(config, FAMILIES[:2])
+    loading_profile = get_loading_profile(config)
 
     out_dir = Path(output_dir) / method
 
@@ -124,32 +136,63 @@ def main():
     hpo_data = config["hpo_data"]
     hpo_info_data = read_hpo_info(Path(config["hpo_info"]))
 
-    methods = {"NetWAS": NetWAS, "PoPs": PoPs, "DEPICT": Depict,
-                "Downstreamer": Downstreamer, "MAGMA":Magma}
-
-    hpo = HPO(database=hpo_data)
+    hpo = HPO(database=hpo_data, cache_dir=config.get("hpo_cache"),
+                ontology=config.get("hpo_ontology"))
+    if config.get("test_ancestors"):
+        if hpo.obo is None:
+            raise ValueError("test_ancestors requires the HPO ontology (hpo_ontology)")
+        hpo_info_data = hpo.obo.add_ancestor_terms(hpo_info_data)
     fisher = FisherTest()
 
-    method_instance = methods[method](hpo=hpo, fisher=fisher)
-
+    method_instance = get_method(method)(hpo=hpo, fisher=fisher, profile=loading_profile)
+
+    permutation_test = None
+    if permutations:
+        permutation_test = PermutationTest(n_permutations=permutations,
+                                            seed=seed,
+                                            chunk_size=chunk_size, workers=workers)
+
+    # Permutation tests without a seed are random, their results can not be reused
+    use_cache = not arg_parse.get_argument("no_cache") and not (permutations and seed is None)
+    result_cache = get_result_cache(config, Path(output_dir),
+                                    arg_parse.get_argument("rebuild")) if use_cache else None
+    # The significance rule contains the threshold used to select the significant genes
+    params = {"method": method, "threshold": repr(method_instance.significance),
+                "sweep": list(get_top_k(config)) if sweep else None,
+                "permutations": [permutations, seed, chunk_size] if permutations else None,
+                "test_ancestors": bool(config.get("test_ancestors"))}
+    input_files = {"hpo_data": hpo_data, "hpo_info": config["hpo_info"]}
+    if config.get("hpo_ontology"):
+        input_files["hpo_ontology"] = config["hpo_ontology"]
+
+    out_files = []
     for trait, file in config["traits"].items():
         print(f"Processing trait: {trait}")
         file = Path(file)
+        out_file = out_dir / (("sweep_result_" if sweep else "fisher_result_") + file.stem + ".csv")
+        out_files.append(out_file)
+
+        if result_cache is not None:
+            key = result_cache.key({"method_file": file, **input_files}, params)
+            if result_cache.get(key, out_file):
+                print(f"Using cached result for trait: {trait}")
+                continue
+
+        if sweep:
+            fish_results = method_instance.perform_threshold_sweep(file, hpo_info_data,
+                                                                    get_top_k(config))
+        else:
+            fish_results = method_instance.perform_fisher_exact_tests(file, hpo_info_data,
+                                                    permutation_test=permutation_test)
 
-        method_data, genes = method_instance.read_data(file)
-
-        overlap_hpo, overlap_genes, _ = method_instance.get_overlap(hpo.hpo_data, genes)
-
-        overlap_method = method_instance.get_overlap_genes(method_data, overlap_genes)
-
-        _, sig_genes = method_instance.filter_data(overlap_method)
-
-        fish_results = method_instance.fisher.perform_fisher_exact_tests(overlap_hpo,
-                                    sig_genes, hpo_info_data)
+        write_out_data(fish_results, out_file)
 
-        out_file = out_dir / ("fisher_result_" + file.stem + ".csv")
+        if result_cache is not None:
+            result_cache.put(key, out_file)
 
-        write_out_data(fish_results, out_file)
+    # The (cached) results are corrected per trait, correct all traits together
+    if correction_family == "method":
+        correct_result_files({out_file: method for out_file in out_files})
 
 
 if __name__ == "__main__":
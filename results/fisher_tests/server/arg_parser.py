@@ -0,0 +1,180 @@
+"""
+Module for parsing arguments.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from typing import Any
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+__data__ = "9-8-2022"
+
+
+class ServerArgumentParser:
+    """
+    Class to parse the input arguments of the enrichment server.
+    """
+
+    def __init__(self):
+        self.parser = self._create_argument_parser()
+        self.arguments = self.parser.parse_args()
+
+    @staticmethod
+    def _create_argument_parser():
+        """
+        Create an argument parser.
+
+        :returns
+        --------
+        parser - ArgumentParser
+        """
+        parser = argparse.ArgumentParser(prog="enrichment_server.py",
+            description="Local server that keeps the HPO database loaded and performs "\
+                "fisher exact tests of gene lists against HPO terms",
+            epilog="Contact: stijnarend@live.nl")
+
+        parser.version = __version__
+
+        parser.add_argument("-c", "--config", action="store",
+                           dest="c", required=False, default="config.yaml",
+                           help="Location of the configuration file.")
+
+        parser.add_argument("--host", dest="host", default=None,
+                        help="Host to listen on, overrides the configuration file. "\
+                            "Default = 127.0.0.1")
+
+        parser.add_argument("--port", dest="port", type=int, default=None,
+                        help="Port to listen on, overrides the configuration file. "\
+                            "Default = 8765")
+
+        parser.add_argument('-v',
+            '--version',
+            help='Displays the version number of the script and exitst',
+            action='version')
+
+        return parser
+
+    def get_argument(self, argument_key: str) -> Any:
+        """
+        Method to get an input argument.
+
+        :parameters
+        -----------
+        argument_key - str
+            Name of command line argument.
+
+        :returns
+        --------
+        value - Any
+            Value of a command line argument
+        """
+        if self.arguments is not None and argument_key in self.arguments:
+            value = getattr(self.arguments, argument_key)
+        else:
+            value = None
+        return value
+
+
+class ClientArgumentParser(ServerArgumentParser):
+    """
+    Class to parse the input arguments of the enrichment client.
+    """
+
+    def __init__(self):
+        self.parser = self._create_argument_parser()
+        # Print help if no arguments are supplied and stop the program
+        if len(sys.argv) == 1:
+            self.parser.print_help(sys.stderr)
+            sys.exit(1)
+        self.arguments = self.parser.parse_args()
+
+    @staticmethod
+    def _create_argument_parser():
+        """
+        Create an argument parser.
+
+        :returns
+        --------
+        parser - ArgumentParser
+        """
+        parser = argparse.ArgumentParser(prog="enrich_cli.py",
+            description="Perform fisher exact tests of a gene list against HPO terms "\
+                "on a running enrichment server",
+            epilog="Contact: stijnarend@live.nl")
+
+        parser.version = __version__
+
+        parser.add_argument("-g", "--genes", dest="g", required=True,
+                        help="File with the ensembl gene IDs of the gene list, one per line.")
+
+        parser.add_argument("-t", "--terms", dest="t", nargs="+", default=None,
+                        help="IDs of the HPO terms to test. Default = all HPO terms")
+
+        parser.add_argument("--terms-file", dest="terms_file", default=None,
+                        help="File with the IDs of the HPO terms to test, one per line.")
+
+        parser.add_argument("-b", "--background", dest="b", default=None,
+                        help="File with the ensembl gene IDs of all tested genes, one per "\
+                            "line. Default = all genes of the HPO database")
+
+        parser.add_argument("-o", '--output', dest='o', required=True,
+                        help="Location of the output file.")
+
+        parser.add_argument("--host", dest="host", default="127.0.0.1",
+                        help="Host of the server. Default = 127.0.0.1")
+
+        parser.add_argument("--port", dest="port", type=int, default=8765,
+                        help="Port of the server. Default = 8765")
+
+        parser.add_argument('-v',
+            '--version',
+            help='Displays the version number of the script and exitst',
+            action='version')
+
+        return parser
+
+
+class CLIArgValidator:
+    """
+    Class to check if arguments are valid.
+    """
+
+    def validate_input_file(self, input_path: str) -> None:
+        """
+        Validate the input files by checking if they actually exists.
+
+        :parameters
+        -----------
+        input_path - str
+            Path to a file
+        """
+        input_path = Path(input_path)
+        self._validate_input_exists(input_path)
+
+    @staticmethod
+    def _validate_input_exists(input_path: Path) -> None:
+        """
+        Check if a file exists.
+
+        :parameters
+        -----------
+        input_path - Path
+            Path to a file
+        """
+        if not input_path.is_file():
+            raise FileNotFoundError(f'Input file does not exist!: {input_path}')
+
+    @staticmethod
+    def validate_port(port) -> None:
+        """
+        Check if the port number is valid.
+
+        :parameters
+        -----------
+        port - int
+            Port number
+        """
+        if not 0 <= int(port) <= 65535:
+            raise ValueError(f"The port should be between 0 and 65535, got: {port}")
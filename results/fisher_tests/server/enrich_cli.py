@@ -0,0 +1,102 @@
+"""
+Client of the enrichment server (enrichment_server.py).
+
+Sends a gene list to a running enrichment server and writes the results of the
+fisher's exact tests to a tab separated file. Only the standard library is used,
+so the client starts without importing the scientific stack. From python (e.g. a
+notebook) utils.enrichment_client.enrich can be used, which returns a pandas data frame.
+"""
+
+import sys
+import os
+import csv
+from pathlib import Path
+from typing import List
+
+
+root_dir = os.path.abspath(os.path.join(
+                  os.path.dirname(__file__),
+                  os.pardir,
+                  os.pardir))
+
+sys.path.insert(0, root_dir)
+
+from utils.enrichment_client import post_enrich
+from arg_parser import ClientArgumentParser, CLIArgValidator
+
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+__data__ = "9-8-2022"
+
+
+def read_list(file: Path) -> List[str]:
+    """
+    Read a file with one value (e.g. an ensembl gene ID) per line.
+
+    :parameter
+    ----------
+    file - Path
+        Text file
+
+    :returns
+    --------
+    values - list
+        The non empty lines of the file
+    """
+    with open(file, "r", encoding="utf-8") as file_handler:
+        return [line.strip() for line in file_handler if line.strip()]
+
+
+def write_results(results: dict, file: Path) -> None:
+    """
+    Write the results of an enrichment request to a tab separated file.
+
+    :parameters
+    -----------
+    results - dict
+        Results per column
+    file - Path
+        Name and location of output file
+    """
+    columns = list(results)
+    with open(file, "w", newline="", encoding="utf-8") as file_handler:
+        writer = csv.writer(file_handler, delimiter="\t")
+        writer.writerow(columns)
+        writer.writerows(zip(*(["" if value is None else value for value in results[column]]
+                                for column in columns)))
+
+
+def main():
+    """
+    Run the program.
+    """
+    arg_parse = ClientArgumentParser()
+
+    genes_file = arg_parse.get_argument("g")
+    terms = arg_parse.get_argument("t")
+    terms_file = arg_parse.get_argument("terms_file")
+    background_file = arg_parse.get_argument("b")
+    output_file = arg_parse.get_argument("o")
+    port = arg_parse.get_argument("port")
+
+    cli_validator = CLIArgValidator()
+    for file in (genes_file, terms_file, background_file):
+        if file is not None:
+            cli_validator.validate_input_file(file)
+    cli_validator.validate_port(port)
+
+    if terms_file is not None:
+        terms = (terms or []) + read_list(Path(terms_file))
+    background = read_list(Path(background_file)) if background_file else None
+
+    content, seconds = post_enrich(read_list(Path(genes_file)), terms, background,
+                                    arg_parse.get_argument("host"), port)
+    write_results(content["results"], Path(output_file))
+
+    print(f"Tested {len(content['results']['HPO ID'])} HPO terms: server "
+            f"{content['latency_ms']:.1f} ms, round trip {seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
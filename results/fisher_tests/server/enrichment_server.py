@@ -0,0 +1,205 @@
+"""
+Local enrichment server that keeps the HPO database loaded.
+
+The HPO data is loaded once, after which fisher's exact tests of gene lists against
+a list of HPO terms (or all HPO terms) are answered over HTTP. Requests are handled
+concurrently by a thread per request. Every request is logged with its latency.
+
+Endpoints:
+    GET  /health  status of the server and the size of the HPO database
+    POST /enrich  {"genes": [...], "terms": [...] (optional), "background": [...] (optional)}
+"""
+
+import sys
+import os
+import json
+import math
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Tuple
+import numpy as np
+
+
+root_dir = os.path.abspath(os.path.join(
+                  os.path.dirname(__file__),
+                  os.pardir,
+                  os.pardir))
+
+sys.path.insert(0, root_dir)
+
+from utils.config import get_config
+from utils.enrichment import EnrichmentService
+from utils.fisher import HPO, FisherTest
+from arg_parser import ServerArgumentParser, CLIArgValidator
+
+
+__author__ = "Stijn Arends"
+__version__ = "v0.1"
+__data__ = "9-8-2022"
+
+
+def to_json_value(value):
+    """
+    Convert a value of the results to a value that is valid JSON. NaN, Infinity and
+    -Infinity are not part of JSON, missing values (NaN) are sent as null and infinite
+    values (e.g. the OR of a term without genes outside the gene list) as the strings
+    "inf" and "-inf".
+
+    :parameters
+    -----------
+    value
+        Value of the results
+
+    :returns
+    --------
+    value
+        The value, None or "inf"/"-inf"
+    """
+    if isinstance(value, float) and not math.isfinite(value):
+        return None if math.isnan(value) else str(value)
+    return value
+
+
+class EnrichmentServer(ThreadingHTTPServer):
+    """
+    HTTP server holding the enrichment service, each request is handled in its own thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: EnrichmentService) -> None:
+        super().__init__(address, EnrichmentHandler)
+        self.service = service
+        self.started = time.time()
+        self.n_requests = 0
+        self.lock = threading.Lock()
+
+    def count_request(self) -> None:
+        """
+        Count a handled request.
+        """
+        with self.lock:
+            self.n_requests += 1
+
+
+class EnrichmentHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the requests to the enrichment server.
+    """
+
+    server: EnrichmentServer
+
+    def do_GET(self) -> None:
+        """
+        Report the status of the server.
+        """
+        start = time.perf_counter()
+        if self.path != "/health":
+            self.send_json(404, {"error": f"Unknown path: {self.path}"}, start)
+            return
+
+        hpo_data = self.server.service.hpo.hpo_data
+        self.send_json(200, {"status": "ok", "genes": hpo_data.shape[0],
+                            "terms": hpo_data.shape[1],
+                            "requests": self.server.n_requests,
+                            "uptime": round(time.time() - self.server.started, 1)}, start)
+
+    def do_POST(self) -> None:
+        """
+        Perform the fisher's exact tests of a gene list.
+        """
+        start = time.perf_counter()
+        if self.path != "/enrich":
+            self.send_json(404, {"error": f"Unknown path: {self.path}"}, start)
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(request, dict) or not isinstance(request.get("genes"), list):
+                raise ValueError("The request should contain a list of genes")
+            results = self.server.service.enrich(request["genes"], request.get("terms"),
+                                                    request.get("background"))
+            columns = {column: [to_json_value(value) for value in results[column].tolist()]
+                        for column in results.columns}
+        except (ValueError, TypeError) as error:
+            self.send_json(400, {"error": str(error)}, start)
+            return
+        except Exception as error:
+            # Any other error is a bug of the server, the client still gets a response
+            traceback.print_exc()
+            self.send_json(500, {"error": f"Internal server error: {error}"}, start)
+            return
+
+        self.send_json(200, {"results": columns}, start,
+                        f"{len(request['genes'])} genes x {len(results)} terms")
+
+    def send_json(self, status: int, body: dict, start: float, info: str = "") -> None:
+        """
+        Send a JSON response, with the time spent on the request in milliseconds.
+
+        :parameters
+        -----------
+        status - int
+            HTTP status code
+        body - dict
+            Content of the response
+        start - float
+            Start time of the request (time.perf_counter)
+        info - str
+            Description of the request for the log
+        """
+        body["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        content = json.dumps(body, allow_nan=False, default=lambda value: value.item()
+                                if isinstance(value, np.generic) else str(value)).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+        self.server.count_request()
+        print(f"[{EnrichmentServer.__name__}] {self.command} {self.path} {status} "
+                f"{info + ' ' if info else ''}{body['latency_ms']:.1f} ms", flush=True)
+
+    def log_message(self, format, *args) -> None:
+        """
+        Requests are logged by send_json, including their latency.
+        """
+
+
+def main():
+    """
+    Run the program.
+    """
+    arg_parse = ServerArgumentParser()
+
+    config_file = arg_parse.get_argument("c")
+
+    cli_validator = CLIArgValidator()
+    cli_validator.validate_input_file(config_file)
+
+    config = get_config(Path(config_file))
+    host = arg_parse.get_argument("host") or config.get("host", "127.0.0.1")
+    port = arg_parse.get_argument("port") or config.get("port", 8765)
+    cli_validator.validate_port(port)
+
+    start = time.perf_counter()
+    hpo = HPO(database=config["hpo_data"], cache_dir=config.get("hpo_cache"),
+                ontology=config.get("hpo_ontology"))
+    service = EnrichmentService(hpo, FisherTest())
+    print(f"Loaded HPO data in {time.perf_counter() - start:.2f}s")
+
+    with EnrichmentServer((host, port), service) as server:
+        print(f"Serving enrichment requests on http://{host}:{port}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopping the server")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ import argparse
 import os
 from pathlib import Path
 from typing import Any
+from utils.method_names import validate_method_name
 
 __author__ = "Stijn Arends"
 __version__ = "v0.1"
@@ -25,6 +26,7 @@ class ArgumentParser:
             self.parser.print_help(sys.stderr)
             sys.exit(1)
         self.arguments = self.parser.parse_args()
+        self.arguments.m = validate_method_name(self.parser, self.arguments.m)
 
     @staticmethod
     def _create_argument_parser():
@@ -47,9 +49,10 @@ class ArgumentParser:
                            help="Location of the configuration file.")
 
         parser.add_argument("-m", "--method", action="store",
-                           dest="m", required=True, choices=["NetWAS", "PoPs", "DEPICT",
-                           "MAGMA", "Downstreamer"],
-                           help="Name of the prioritization method")
+                           dest="m", required=True,
+                           metavar="METHOD", help="Name of the prioritization method "\
+                            "(NetWAS, PoPs, DEPICT, MAGMA, Downstreamer or another "\
+                            "registered method)")
 
         parser.add_argument("-o", '--output', dest='o',
                         help="Location where the output files need to be stored.",
@@ -5,9 +5,6 @@ Perform fisher's exact tests on the results from a number of prioritization meth
 import sys
 import os
 from pathlib import Path
-import yaml
-from matplotlib_venn import venn2, venn2_circles
-import matplotlib.pyplot as plt
 
 
 root_dir = os.path.abspath(os.path.join(
@@ -18,14 +15,14 @@ root_dir = os.path.abspath(os.path.join(
 sys.path.insert(0, root_dir)
 
 from fisher_tests.single_test.arg_parser import ArgumentParser, CLIArgValidator
-from utils.prioritization_methods import Downstreamer, Magma, Depict, PoPs, NetWAS
-from utils.fisher import HPO, FisherTest
+from utils.config import get_config, get_loading_profile
 
 
 class VennDiagram:
     """
     Create a venn diagram that can be displayed
-    or saved to disc.
+    or saved to disc. matplotlib and matplotlib_venn are only
+    imported once a diagram is plotted.
     """
 
     def __init__(self, n_sig_genes, n_hpo_term_genes, overlap_sig_hpo) -> None:
@@ -37,6 +34,8 @@ class VennDiagram:
         """
         Plot a venn diagram with three circles
         """
+        from matplotlib_venn import venn2, venn2_circles
+
         venn2(subsets=(self.n_sig_genes, self.n_hpo_term_genes, self.overlap_sig_hpo),
             set_labels=('HPO genes', 'GWAS genes'),
             set_colors=("silver", "lightsteelblue"), alpha=0.7)
@@ -48,6 +47,8 @@ class VennDiagram:
         """
         Show the venn diagram on screen.
         """
+        import matplotlib.pyplot as plt
+
         self.__plot_venn_diagram()
         plt.show()
 
@@ -60,33 +61,12 @@ class VennDiagram:
         output_file - Path
             Location and name of the output file
         """
+        import matplotlib.pyplot as plt
+
         self.__plot_venn_diagram()
         plt.savefig(output_file)
 
 
-def get_config(file: Path) -> dict:
-    """
-    Read in config file and return it as a dictionary.
-
-    :parameter
-    ----------
-    file - str
-        Configuration file in yaml format
-
-    :returns
-    --------
-    config - dict
-        Configuration file in dictionary form.
-    """
-    if not file.exists():
-        raise FileExistsError(f"The file that was supplied does not exists: {file}")
-
-    with open(file, 'r', encoding="utf-8") as stream:
-        config = yaml.safe_load(stream)
-
-    return config
-
-
 def make_out_dir(path: Path) -> None:
     """
     Create a directory (if it does not exsit yet) to store the
@@ -172,16 +152,25 @@ def main():
     if output_dir:
         make_out_dir(Path(output_dir))
 
-    config = get_config(Path(config_file))
+    if mode == "save":
+        # Diagrams are only written to files, no display is needed
+        import matplotlib
+        matplotlib.use("Agg")
 
-    methods = {"NetWAS": NetWAS, "PoPs": PoPs, "DEPICT": Depict,
-                "Downstreamer": Downstreamer, "MAGMA":Magma}
+    # The scientific stack is imported after the arguments are checked
+    from utils.prioritization_methods import get_method
+    from utils.fisher import HPO, FisherTest
+
+    config = get_config(Path(config_file))
+    loading_profile = get_loading_profile(config)
 
     hpo_data = config["hpo_data"]
-    hpo = HPO(database=hpo_data)
+    hpo = HPO(database=hpo_data, cache_dir=config.get("hpo_cache"),
+                ontology=config.get("hpo_ontology"))
     fisher = FisherTest()
 
-    method_instance = methods[method](hpo=hpo, fisher=fisher)
+    method_instance = get_method(method)(hpo=hpo, fisher=fisher,
+                                        profile=loading_profile)
 
     for trait, info in config["traits"].items():
         print(f"Processing trait: {trait}")
@@ -195,9 +184,10 @@ def main():
 
         _, sig_genes = method_instance.filter_data(overlap_method)
 
-        _, genes_hpo_term = hpo.get_data_hpo_term(hpo.hpo_data, hpo_term)
+        genes_hpo_term = hpo.term_genes(hpo_term)
 
-        fisher_data = fisher.create_fisher_table(overlap_genes, sig_genes, genes_hpo_term)
+        fisher_data = fisher.create_fisher_table(overlap_genes, sig_genes, genes_hpo_term,
+                                                hpo.universe)
         fisher_table = fisher_data.to_string()
 
         odds_ratio, pval = fisher.fishers_exact_test(fisher_data.iloc[0:2, 0:2].values)
@@ -0,0 +1,795 @@
+"""
+Module that provides on-disk caches for input files that are expensive to parse,
+so that they only have to be processed once.
+"""
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from stat import S_ISREG
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from utils.genes import TermGeneSets
+from utils.ontology import Ontology
+
+# Parquet needs pyarrow, without it the cached sheets are stored as pickle files
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, see ResultCache.lock_digests
+    fcntl = None
+
+
+def file_digest(file: Path, chunk_size: int = 1 << 20) -> str:
+    """
+    Calculate the SHA-256 hash of the contents of a file.
+
+    :parameters
+    -----------
+    file - Path
+        A file
+    chunk_size - int
+        Number of bytes to read at once
+
+    :returns
+    --------
+    digest - str
+        Hexadecimal SHA-256 hash of the file
+    """
+    sha = hashlib.sha256()
+    with open(file, "rb") as file_handler:
+        for chunk in iter(lambda: file_handler.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class SourceCache:
+    """
+    Base class of a cache directory holding data derived from a single source file.
+
+    The cache is keyed by the SHA-256 hash of the source file. The size and modification
+    time are stored as well, so the source file only has to be hashed when those change.
+    """
+
+    meta_file = "source.json"
+
+    def __init__(self, source: Path, directory: Path) -> None:
+        self.source = Path(source)
+        self.directory = Path(directory)
+
+    def outdated_digest(self) -> Optional[str]:
+        """
+        Check if the cache is missing or out of date.
+
+        :returns
+        --------
+        digest - str
+            SHA-256 hash of the source file if the cache has to be (re)built,
+            None if the cache is up to date
+        """
+        meta = self.read_meta()
+        stat = self.source.stat()
+
+        if meta is None or (meta["size"], meta["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            # Only hash the source file if the cheap checks do not match
+            digest = file_digest(self.source)
+            if meta is None or meta["sha256"] != digest:
+                return digest
+            self.write_meta(self.directory, digest)
+
+        return None
+
+    def read_meta(self) -> Optional[dict]:
+        """
+        Read the information about the source file the cache was built from.
+
+        :returns
+        --------
+        meta - dict
+            Size, modification time and hash of the source file. None if there is
+            no (complete) cache.
+        """
+        meta_file = self.directory / self.meta_file
+        if not meta_file.is_file():
+            return None
+        with open(meta_file, "r", encoding="utf-8") as file_handler:
+            return json.load(file_handler)
+
+    def write_meta(self, directory: Path, digest: str) -> None:
+        """
+        Write the information about the source file to the cache directory.
+
+        :parameters
+        -----------
+        directory - Path
+            Cache directory
+        digest - str
+            SHA-256 hash of the source file
+        """
+        stat = self.source.stat()
+        meta = {"source": str(self.source), "sha256": digest,
+                "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        with open(directory / self.meta_file, "w", encoding="utf-8") as file_handler:
+            json.dump(meta, file_handler, indent=2)
+
+
+class HPOMatrixCache(SourceCache):
+    """
+    Binary cache of the gzip compressed HPO gene x term matrix.
+
+    The matrix is stored once as an uint8 numpy array (one row per HPO term, so that
+    the genes of a term are contiguous on disk) together with a gene and a term index
+    file. Later runs memory-map the matrix instead of parsing the gzip file again.
+    The sparse gene sets of the terms (see utils.genes.TermGeneSets) are stored next
+    to the matrix. The cache is rebuilt automatically when the source file changes.
+    """
+
+    matrix_file = "matrix.npy"
+    genes_file = "genes.txt"
+    terms_file = "terms.txt"
+    indptr_file = "term_indptr.npy"
+    indices_file = "term_genes.npy"
+
+    def __init__(self, source: Path, cache_dir: Optional[Path] = None) -> None:
+        source = Path(source)
+        if cache_dir is None:
+            cache_dir = source.parent / ".hpo_cache"
+        super().__init__(source, Path(cache_dir) / source.name)
+
+    def load(self) -> pd.DataFrame:
+        """
+        Load the HPO matrix from the cache, (re)building the cache first if it is
+        missing or out of date.
+
+        :returns
+        --------
+        hpo_data - pd.DataFrame
+            Memory-mapped HPO matrix, index: ensembl gene IDs, columns: HPO terms
+        """
+        digest = self.outdated_digest()
+        if digest is not None:
+            print(f"[{HPOMatrixCache.__name__}] Building HPO cache: {self.directory}")
+            self.build(digest)
+
+        return self.read()
+
+    def build(self, digest: str) -> None:
+        """
+        Parse the gzip compressed HPO matrix and write it to the cache.
+        The cache is written to a temporary directory first and then moved
+        into place, so an interrupted build never leaves a partial cache behind.
+
+        :parameters
+        -----------
+        digest - str
+            SHA-256 hash of the source file
+        """
+        hpo_data = self.parse_source(self.source)
+
+        self.directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.directory.parent, prefix=".tmp_"))
+        tmp_dir.chmod(0o755)
+        try:
+            matrix = np.ascontiguousarray(hpo_data.values.T)
+            np.save(tmp_dir / self.matrix_file, matrix)
+            self.write_gene_sets(tmp_dir, TermGeneSets.from_dense(matrix, hpo_data.columns))
+            self.write_index(tmp_dir / self.genes_file, hpo_data.index)
+            self.write_index(tmp_dir / self.terms_file, hpo_data.columns)
+            self.write_meta(tmp_dir, digest)
+
+            if self.directory.exists():
+                shutil.rmtree(self.directory)
+            tmp_dir.rename(self.directory)
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+
+    def read(self) -> pd.DataFrame:
+        """
+        Memory-map the cached HPO matrix.
+
+        :returns
+        --------
+        hpo_data - pd.DataFrame
+            HPO matrix, index: ensembl gene IDs, columns: HPO terms
+        """
+        matrix = np.load(self.directory / self.matrix_file, mmap_mode="r")
+        genes = pd.Index(self.read_index(self.directory / self.genes_file), name="-")
+        terms = pd.Index(self.read_index(self.directory / self.terms_file))
+        # The transpose is a column-major view on the memory-mapped file, no data is copied
+        return pd.DataFrame(matrix.T, index=genes, columns=terms, copy=False)
+
+    def read_gene_sets(self) -> TermGeneSets:
+        """
+        Memory-map the sparse gene sets of the HPO terms. Caches that were built
+        without the gene sets get them added from the cached matrix.
+
+        :returns
+        --------
+        gene_sets - TermGeneSets
+            The gene sets of all HPO terms
+        """
+        matrix = np.load(self.directory / self.matrix_file, mmap_mode="r")
+        terms = pd.Index(self.read_index(self.directory / self.terms_file))
+
+        if not (self.directory / self.indptr_file).is_file():
+            self.write_gene_sets(self.directory, TermGeneSets.from_dense(matrix, terms))
+
+        return TermGeneSets(np.load(self.directory / self.indptr_file, mmap_mode="r"),
+                            np.load(self.directory / self.indices_file, mmap_mode="r"),
+                            terms, matrix.shape[1])
+
+    def write_gene_sets(self, directory: Path, gene_sets: TermGeneSets) -> None:
+        """
+        Write the sparse gene sets of the HPO terms to a cache directory. The index
+        pointers are written last, so a partially written cache is not used.
+
+        :parameters
+        -----------
+        directory - Path
+            Cache directory
+        gene_sets - TermGeneSets
+            The gene sets of all HPO terms
+        """
+        for file, array in ((self.indices_file, gene_sets.indices),
+                            (self.indptr_file, gene_sets.indptr)):
+            # A unique temporary file per process, workers may add the gene sets at
+            # the same time
+            handle, tmp_file = tempfile.mkstemp(dir=directory, prefix=f".tmp_{file}")
+            try:
+                with os.fdopen(handle, "wb") as file_handler:
+                    np.save(file_handler, array)
+                os.chmod(tmp_file, 0o644)
+                os.replace(tmp_file, directory / file)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+
+    @staticmethod
+    def parse_source(file: Path) -> pd.DataFrame:
+        """
+        Read in the gzip compressed HPO matrix with compact data types.
+
+        :parameters
+        -----------
+        file - Path
+            HPO matrix, first column ('-') contains the gene IDs
+
+        :returns
+        --------
+        hpo_data - pd.DataFrame
+            HPO matrix, index: ensembl gene IDs, columns: HPO terms
+        """
+        with gzip.open(file, "rt", encoding="utf-8") as file_handler:
+            header = file_handler.readline().rstrip("\n").split("\t")
+
+        dtypes = {column: np.uint8 for column in header[1:]}
+        dtypes[header[0]] = str
+
+        hpo_data = pd.read_csv(file, compression="gzip", sep="\t", dtype=dtypes)
+        hpo_data.set_index(header[0], inplace=True)
+        return hpo_data
+
+    @staticmethod
+    def write_index(file: Path, index: pd.Index) -> None:
+        """
+        Write an index to a text file, one value per line.
+
+        :parameters
+        -----------
+        file - Path
+            Output file
+        index - pd.Index
+            Gene IDs or HPO terms
+        """
+        with open(file, "w", encoding="utf-8") as file_handler:
+            file_handler.write("\n".join(index.astype(str)))
+            file_handler.write("\n")
+
+    @staticmethod
+    def read_index(file: Path) -> List[str]:
+        """
+        Read an index from a text file, one value per line.
+
+        :parameters
+        -----------
+        file - Path
+            Index file
+
+        :returns
+        --------
+        index - list
+            Gene IDs or HPO terms
+        """
+        with open(file, "r", encoding="utf-8") as file_handler:
+            return file_handler.read().splitlines()
+
+
+class OntologyCache(SourceCache):
+    """
+    Cache of the transitive closure of the HPO ontology and of the gene sets of the
+    HPO matrix propagated up the ontology. It is stored inside the directory of the
+    HPO matrix cache, so it is removed together with that cache when the HPO database
+    changes, and it is rebuilt when the ontology file changes.
+
+    Next to the sparse propagated gene sets the propagated matrix is stored as an uint8
+    numpy array with one row per term, like the matrix of the HPO matrix cache, so it
+    can be memory-mapped and shared by processes instead of being made dense in memory.
+    """
+
+    indptr_file = "propagated_indptr.npy"
+    indices_file = "propagated_genes.npy"
+    terms_file = "propagated_terms.txt"
+    matrix_file = "propagated_matrix.npy"
+
+    def __init__(self, source: Path, hpo_cache: HPOMatrixCache) -> None:
+        super().__init__(source, hpo_cache.directory / f"ontology_{Path(source).name}")
+        self.hpo_cache = hpo_cache
+
+    def load(self) -> Tuple[Ontology, TermGeneSets]:
+        """
+        Load the ontology and the propagated gene sets from the cache, (re)building
+        the cache first if it is missing or out of date.
+
+        :returns
+        --------
+        ontology - Ontology
+            The ontology with its transitive closure
+        propagated - TermGeneSets
+            Propagated gene sets of all terms
+        """
+        digest = self.outdated_digest()
+        if digest is not None:
+            print(f"[{OntologyCache.__name__}] Building ontology cache: {self.directory}")
+            self.build(digest)
+
+        return Ontology.load(self.directory), self.read_gene_sets()
+
+    def read_gene_sets(self) -> TermGeneSets:
+        """
+        Memory-map the propagated gene sets.
+
+        :returns
+        --------
+        propagated - TermGeneSets
+            Propagated gene sets of all terms
+        """
+        return TermGeneSets(np.load(self.directory / self.indptr_file, mmap_mode="r"),
+                            np.load(self.directory / self.indices_file, mmap_mode="r"),
+                            pd.Index(HPOMatrixCache.read_index(self.directory
+                                                                / self.terms_file)),
+                            len(HPOMatrixCache.read_index(self.hpo_cache.directory
+                                                            / self.hpo_cache.genes_file)))
+
+    def read_matrix(self) -> np.ndarray:
+        """
+        Memory-map the propagated term x gene matrix. Caches that were built without
+        the matrix get it added from the propagated gene sets.
+
+        :returns
+        --------
+        matrix - np.ndarray
+            Read-only uint8 matrix, one row per term of the ontology
+        """
+        file = self.directory / self.matrix_file
+        if not file.is_file():
+            # A unique temporary file per process, workers may add the matrix at the same time
+            handle, tmp_file = tempfile.mkstemp(dir=self.directory,
+                                                prefix=f".tmp_{self.matrix_file}")
+            os.close(handle)
+            try:
+                self.write_matrix(Path(tmp_file), self.read_gene_sets())
+                os.chmod(tmp_file, 0o644)
+                os.replace(tmp_file, file)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+
+        return np.load(file, mmap_mode="r")
+
+    @staticmethod
+    def write_matrix(file: Path, gene_sets: TermGeneSets, chunk_size: int = 1024) -> None:
+        """
+        Write gene sets as a dense uint8 term x gene matrix, a chunk of terms at a
+        time so the dense matrix is never completely in memory.
+
+        :parameters
+        -----------
+        file - Path
+            Output file (.npy)
+        gene_sets - TermGeneSets
+            Gene sets of the terms
+        chunk_size - int
+            Number of terms that are written at once
+        """
+        matrix = np.lib.format.open_memmap(file, mode="w+", dtype=np.uint8,
+                                            shape=(len(gene_sets), gene_sets.n_genes))
+        term_genes = gene_sets.to_csr()
+        for start in range(0, len(gene_sets), chunk_size):
+            matrix[start:start + chunk_size] = term_genes[start:start + chunk_size].toarray()
+        matrix.flush()
+        del matrix
+
+    def build(self, digest: str) -> None:
+        """
+        Parse the ontology, propagate the gene sets of the HPO matrix and write
+        both to the cache.
+
+        :parameters
+        -----------
+        digest - str
+            SHA-256 hash of the ontology file
+        """
+        ontology = Ontology.from_obo(self.source)
+        propagated = ontology.propagate(self.hpo_cache.read_gene_sets())
+
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.directory.parent, prefix=".tmp_"))
+        tmp_dir.chmod(0o755)
+        try:
+            ontology.save(tmp_dir)
+            np.save(tmp_dir / self.indptr_file, propagated.indptr)
+            np.save(tmp_dir / self.indices_file, propagated.indices)
+            HPOMatrixCache.write_index(tmp_dir / self.terms_file, propagated.terms)
+            self.write_matrix(tmp_dir / self.matrix_file, propagated)
+            self.write_meta(tmp_dir, digest)
+
+            if self.directory.exists():
+                shutil.rmtree(self.directory)
+            tmp_dir.rename(self.directory)
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+
+
+class SheetCache(SourceCache):
+    """
+    Columnar cache of a few columns of an Excel sheet.
+
+    The sheet is streamed with openpyxl in read-only mode, keeping only the requested
+    columns, and stored as Parquet (or as a pickle file if pyarrow is not installed)
+    in a cache directory next to the workbook. Later runs read the cached columns
+    instead of parsing the workbook. The cache is rebuilt automatically when the
+    workbook changes or when columns are requested that are not cached.
+    """
+
+    def __init__(self, source: Path, sheet: str, columns: List[str],
+                cache_dir: Optional[Path] = None) -> None:
+        source = Path(source)
+        if cache_dir is None:
+            cache_dir = source.parent / ".sheet_cache"
+        super().__init__(source, Path(cache_dir) / f"{source.name}_{sheet}")
+        self.sheet = sheet
+        self.columns = list(columns)
+        self.data_file = "data.parquet" if HAS_PYARROW else "data.pkl"
+
+    def load(self) -> pd.DataFrame:
+        """
+        Load the columns of the sheet from the cache, (re)building the cache first
+        if it is missing or out of date.
+
+        :returns
+        --------
+        data - pd.DataFrame
+            The requested columns of the sheet
+        """
+        digest = self.outdated_digest()
+        if digest is None and (self.directory / self.data_file).is_file():
+            data = self.read()
+            if set(self.columns).issubset(data.columns):
+                return data[self.columns]
+
+        # The metadata can be current while the data file is missing (e.g. pyarrow
+        # was installed after a pickle cache was written)
+        if digest is None:
+            digest = file_digest(self.source)
+
+        data = self.read_sheet(self.source, self.sheet, self.columns)
+        try:
+            self.build(data, digest)
+        except OSError as error:
+            print(f"[{SheetCache.__name__}] Could not write cache {self.directory}: {error}")
+        return data
+
+    def build(self, data: pd.DataFrame, digest: str) -> None:
+        """
+        Write the columns of the sheet to the cache. The cache is written to a temporary
+        directory first and then moved into place.
+
+        :parameters
+        -----------
+        data - pd.DataFrame
+            The requested columns of the sheet
+        digest - str
+            SHA-256 hash of the workbook
+        """
+        self.directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.directory.parent, prefix=".tmp_"))
+        tmp_dir.chmod(0o755)
+        try:
+            if HAS_PYARROW:
+                data.to_parquet(tmp_dir / self.data_file, index=False)
+            else:
+                data.to_pickle(tmp_dir / self.data_file)
+            self.write_meta(tmp_dir, digest)
+
+            if self.directory.exists():
+                shutil.rmtree(self.directory)
+            tmp_dir.rename(self.directory)
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+
+    def read(self) -> pd.DataFrame:
+        """
+        Read the cached columns.
+
+        :returns
+        --------
+        data - pd.DataFrame
+            The cached columns of the sheet
+        """
+        if HAS_PYARROW:
+            return pd.read_parquet(self.directory / self.data_file)
+        return pd.read_pickle(self.directory / self.data_file)
+
+    @staticmethod
+    def read_sheet(file: Path, sheet: str, columns: List[str]) -> pd.DataFrame:
+        """
+        Stream the rows of a sheet with openpyxl in read-only mode and keep
+        only the requested columns.
+
+        :parameters
+        -----------
+        file - Path
+            Excel workbook
+        sheet - str
+            Name of the sheet, the first row contains the column names
+        columns - list
+            Names of the columns to keep
+
+        :returns
+        --------
+        data - pd.DataFrame
+            The requested columns of the sheet
+
+        :raises
+        -------
+        KeyError
+            A requested column is not part of the sheet
+        """
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook[sheet].iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            missing = [column for column in columns if column not in header]
+            if missing:
+                raise KeyError(f"Columns {missing} not found in sheet {sheet} of {file}")
+
+            positions = [header.index(column) for column in columns]
+            values = {column: [] for column in columns}
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                for column, position in zip(columns, positions):
+                    values[column].append(row[position] if position < len(row) else None)
+        finally:
+            workbook.close()
+
+        return pd.DataFrame(values, columns=columns)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of result files.
+
+    A result is stored under the SHA-256 hash of everything it depends on: the contents
+    of the input files and a set of parameters (e.g. the method name and threshold).
+    A changed input file therefore gets a new key, while results of unchanged inputs
+    are served from the cache. The total size of the cache is bounded, the least
+    recently used results are evicted first.
+
+    The hashes of the input files are remembered by their size and modification time,
+    so unchanged files are only hashed once.
+    """
+
+    # Increase when the results change for the same inputs, invalidates all cached results
+    version = 2
+    digests_file = "digests.json"
+    lock_file = ".digests.lock"
+
+    def __init__(self, directory: Path, max_size: int = 1 << 30, rebuild: bool = False) -> None:
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.rebuild = rebuild
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.digests = self.read_digests()
+
+    def read_digests(self) -> Dict[str, dict]:
+        """
+        Read the remembered hashes of input files.
+
+        :returns
+        --------
+        digests - dict
+            Size, modification time and hash per file
+        """
+        digests_file = self.directory / self.digests_file
+        if not digests_file.is_file():
+            return {}
+        try:
+            with open(digests_file, "r", encoding="utf-8") as file_handler:
+                return json.load(file_handler)
+        except ValueError:
+            return {}
+
+    @contextmanager
+    def lock_digests(self) -> Iterator[None]:
+        """
+        Lock the remembered hashes of the cache for the other runs that share the
+        cache while they are updated. Without fcntl (Windows) nothing is locked and
+        the hashes of runs that update them at the same time can be lost, a lost
+        hash is only computed again.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / self.lock_file, "a", encoding="utf-8") as file_handler:
+            fcntl.flock(file_handler.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file_handler.fileno(), fcntl.LOCK_UN)
+
+    def digest(self, file: Path) -> str:
+        """
+        Get the SHA-256 hash of a file, only hashing it if it is not
+        remembered or changed since it was hashed.
+
+        :parameters
+        -----------
+        file - Path
+            A file
+
+        :returns
+        --------
+        digest - str
+            Hexadecimal SHA-256 hash of the file
+        """
+        path = str(Path(file).resolve())
+        stat = os.stat(path)
+        known = self.digests.get(path)
+        if known is None or (known["size"], known["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            known = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                    "sha256": file_digest(Path(path))}
+            # Other runs may share the cache, keep the hashes they added in the meantime
+            with self.lock_digests():
+                self.digests = {**self.read_digests(), **self.digests, path: known}
+                self.write_json(self.directory / self.digests_file, self.digests)
+        return known["sha256"]
+
+    def key(self, files: Dict[str, Path], params: Dict[str, Any]) -> str:
+        """
+        Get the key of a result.
+
+        :parameters
+        -----------
+        files - dict
+            Input files the result depends on, by name
+        params - dict
+            Other values the result depends on (must be JSON serializable)
+
+        :returns
+        --------
+        key - str
+            Hexadecimal SHA-256 hash
+        """
+        content = {"version": self.version,
+                    "files": {name: self.digest(file) for name, file in files.items()},
+                    "params": params}
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str)
+                                .encode("utf-8")).hexdigest()
+
+    def get(self, key: str, file: Path) -> bool:
+        """
+        Copy a cached result to a file.
+
+        :parameters
+        -----------
+        key - str
+            Key of the result
+        file - Path
+            Output file
+
+        :returns
+        --------
+        hit - bool
+            True if the result was cached (and copied), False otherwise
+        """
+        cached = self.directory / key
+        if self.rebuild or not cached.is_file():
+            return False
+        shutil.copyfile(cached, file)
+        # The modification time marks the last use
+        os.utime(cached)
+        return True
+
+    def put(self, key: str, file: Path) -> None:
+        """
+        Store a result file in the cache and evict the least recently used
+        results if the cache is too large.
+
+        :parameters
+        -----------
+        key - str
+            Key of the result
+        file - Path
+            Result file
+        """
+        # A unique temporary file per process, runs may share the cache
+        handle, tmp_file = tempfile.mkstemp(dir=self.directory, prefix=f".tmp_{key}")
+        os.close(handle)
+        try:
+            shutil.copyfile(file, tmp_file)
+            os.chmod(tmp_file, 0o644)
+            os.replace(tmp_file, self.directory / key)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used results until the cache fits in its maximum size.
+        Results that another run removed in the meantime are skipped.
+        """
+        results = []
+        for entry in self.directory.iterdir():
+            if entry.name == self.digests_file or entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if S_ISREG(stat.st_mode):
+                results.append((stat.st_mtime_ns, stat.st_size, entry))
+        results.sort(key=lambda result: result[0])
+
+        total_size = sum(size for _, size, _ in results)
+        for _, size, entry in results:
+            if total_size <= self.max_size:
+                break
+            total_size -= size
+            entry.unlink(missing_ok=True)
+
+    @staticmethod
+    def write_json(file: Path, data: dict) -> None:
+        """
+        Write a dictionary to a JSON file, replacing the file at once.
+
+        :parameters
+        -----------
+        file - Path
+            Output file
+        data - dict
+            Data
+        """
+        handle, tmp_file = tempfile.mkstemp(dir=file.parent, prefix=f".tmp_{file.name}")
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as file_handler:
+                json.dump(data, file_handler, indent=2)
+            os.chmod(tmp_file, 0o644)
+            os.replace(tmp_file, file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
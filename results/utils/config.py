@@ -0,0 +1,136 @@
+"""
+Module that provides the reading of the configuration files and the input and output
+files that are shared by the scripts of the fisher_tests folder.
+
+pandas, yaml and the other utils modules are imported where they are used, so the
+scripts can import this module before their arguments are checked.
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Sequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def get_config(file: Path) -> dict:
+    """
+    Read in config file and return it as a dictionary.
+
+    :parameter
+    ----------
+    file - str
+        Configuration file in yaml format
+
+    :returns
+    --------
+    config - dict
+        Configuration file in dictionary form.
+    """
+    if not file.exists():
+        raise FileExistsError(f"The file that was supplied does not exists: {file}")
+
+    import yaml
+
+    with open(file, 'r', encoding="utf-8") as stream:
+        config = yaml.safe_load(stream)
+
+    return config
+
+
+def read_hpo_info(hpo_info: Path) -> "pd.DataFrame":
+    """
+    Read in a CSV file containing information about HPO terms
+    and related GWAS traits.
+
+    :parameter
+    ----------
+    hpo_info - Path
+        CSV containing info about hpo/GWAS traits
+
+    :returns
+    --------
+    hpo_info_data - pd.DataFrame
+        A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
+    """
+    import pandas as pd
+
+    hpo_info_data = pd.read_csv(hpo_info, sep=",")
+    return hpo_info_data
+
+
+def write_out_data(data: "pd.DataFrame", file: Path) -> None:
+    """
+    Write out a pandas data frame to a file.
+
+    :parameters
+    -----------
+    data - pd.DataFrame
+        Data
+    file - Path
+        Name and location of output file
+    """
+    data.to_csv(file, sep="\t")
+
+
+def get_correction_family(config: dict, families: Optional[Sequence[str]] = None) -> str:
+    """
+    Get the level at which the p values are corrected for multiple testing
+    from the configuration file.
+
+    :parameter
+    ----------
+    config - dict
+        Configuration file in dictionary form.
+    families - list
+        Families the script supports, default = all families of utils.multiple_testing
+
+    :returns
+    --------
+    family - str
+        trait (each trait of each method is a family, default), method (all traits
+        of a method together) or all (all traits and methods together)
+
+    :raises
+    -------
+    ValueError
+        The family in the configuration file is not supported
+    """
+    from utils.multiple_testing import FAMILIES
+
+    families = FAMILIES if families is None else families
+    family = config.get("correction_family", "trait")
+    if family not in families:
+        raise ValueError(f"Unsupported correction family: {family}, "\
+            f"choose from: {', '.join(families)}")
+    return family
+
+
+def get_loading_profile(config: dict) -> str:
+    """
+    Get the profile used to load the results of the prioritization methods
+    from the configuration file.
+
+    :parameter
+    ----------
+    config - dict
+        Configuration file in dictionary form.
+
+    :returns
+    --------
+    profile - str
+        default (dtypes of pd.read_csv, default) or compact (categorical gene IDs
+        and float32 scores where the precision allows it)
+
+    :raises
+    -------
+    ValueError
+        The profile in the configuration file is not supported
+    """
+    from utils.prioritization_methods import LOADING_PROFILES
+
+    profile = config.get("loading_profile", "default")
+    if profile not in LOADING_PROFILES:
+        raise ValueError(f"Unsupported loading profile: {profile}, "\
+            f"choose from: {', '.join(LOADING_PROFILES)}")
+    return profile
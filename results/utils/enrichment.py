@@ -0,0 +1,109 @@
+"""
+Module that provides gene set enrichment of arbitrary gene lists against the HPO
+database, for long-running processes (see fisher_tests/server) that load the HPO
+data once and answer many requests.
+"""
+
+from typing import Optional
+import numpy as np
+import pandas as pd
+from utils.fisher import HPO, FisherTest
+from utils.genes import GeneIDs
+from utils.multiple_testing import add_corrections
+
+
+class EnrichmentService:
+    """
+    Perform fisher's exact tests of gene lists against (all) HPO terms.
+
+    The HPO terms of every gene are kept as a sparse gene x term matrix, so the
+    overlap of a gene list with all terms only touches the rows of the genes in the
+    list instead of the whole HPO matrix. The service is read-only after it is made
+    and can be shared by multiple threads.
+    """
+
+    def __init__(self, hpo: HPO, fisher: FisherTest) -> None:
+        self.hpo = hpo
+        self.fisher = fisher
+        self.terms = hpo.gene_sets.terms
+        self.gene_terms = hpo.gene_sets.to_csc().tocsr().astype(np.int32)
+        self.term_sizes = hpo.gene_sets.sizes().to_numpy()
+
+    def count_genes(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Count for every HPO term how many of the genes belong to the term.
+
+        :parameters
+        -----------
+        codes - np.ndarray
+            Unique gene codes of the HPO gene universe
+
+        :returns
+        --------
+        counts - np.ndarray
+            Number of genes per HPO term
+        """
+        return np.asarray(self.gene_terms[codes].sum(axis=0)).ravel()
+
+    def enrich(self, genes: GeneIDs, terms: Optional[list] = None,
+                background: Optional[GeneIDs] = None) -> pd.DataFrame:
+        """
+        Perform fisher's exact test of a gene list against HPO terms.
+
+        :parameters
+        -----------
+        genes - GeneIDs
+            Ensembl gene IDs of the gene list (e.g. the significant genes of a method)
+        terms - list
+            IDs of the HPO terms to test, default = all HPO terms
+        background - GeneIDs
+            Ensembl gene IDs of all genes that were tested (e.g. all genes scored by a
+            method), only these genes are counted. Default = all genes of the HPO database
+
+        :returns
+        --------
+        results - pd.DataFrame
+            One row per HPO term with the HPO ID, the number of genes of the term and of
+            the overlap with the gene list, the OR, p value, zscore and the corrected p
+            values over the tested terms. HPO terms that are not in the HPO database get
+            NaN values.
+        """
+        universe = self.hpo.universe
+        significant = universe.codes(genes)
+
+        if background is None:
+            n_genes = len(universe)
+            hpo_counts = self.term_sizes
+        else:
+            background = universe.codes(background)
+            significant = np.intersect1d(significant, background, assume_unique=True)
+            n_genes = len(background)
+            hpo_counts = self.count_genes(background)
+        overlap_counts = self.count_genes(significant)
+
+        term_ids = self.terms if terms is None else pd.Index(terms)
+        if terms is None:
+            term_index = np.arange(len(self.terms))
+        elif self.hpo.obo is None:
+            term_index = self.terms.get_indexer(term_ids)
+        else:
+            # Alternative IDs are looked up by the primary ID of their term
+            term_index = self.hpo.obo.get_indexer(self.terms, term_ids)
+        found = term_index >= 0
+
+        tables = self.fisher.create_contingency_tables(n_genes, len(significant),
+                                                        hpo_counts[term_index[found]],
+                                                        overlap_counts[term_index[found]])
+
+        odds_ratios = np.full(len(term_ids), np.nan)
+        log_pvalues = np.full(len(term_ids), np.nan)
+        odds_ratios[found], log_pvalues[found] = self.fisher.fishers_exact_tests(tables, log=True)
+
+        results = pd.DataFrame({"HPO ID": term_ids,
+                                "term genes": np.nan, "overlap": np.nan,
+                                "OR": odds_ratios, "pvalues": np.exp(log_pvalues),
+                                "zscores": self.fisher.calculate_zscores(
+                                    log_p_values=log_pvalues)})
+        results.loc[found, "term genes"] = tables[:, 0, 1] + tables[:, 1, 1]
+        results.loc[found, "overlap"] = tables[:, 1, 1]
+        return add_corrections(results)
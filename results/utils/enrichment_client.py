@@ -0,0 +1,96 @@
+"""
+Module that provides a client of the enrichment server (fisher_tests/server). Only the
+standard library is imported, pandas is only imported by enrich.
+"""
+
+import json
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional, Tuple
+
+
+def post_enrich(genes: List[str], terms: Optional[List[str]] = None,
+                background: Optional[List[str]] = None, host: str = "127.0.0.1",
+                port: int = 8765, timeout: float = 600) -> Tuple[dict, float]:
+    """
+    Send an enrichment request to the server.
+
+    :parameters
+    -----------
+    genes - list
+        Ensembl gene IDs of the gene list
+    terms - list
+        IDs of the HPO terms to test, default = all HPO terms
+    background - list
+        Ensembl gene IDs of all tested genes, default = all genes of the HPO database
+    host - str
+        Host of the server
+    port - int
+        Port of the server
+    timeout - float
+        Maximum number of seconds to wait for the response
+
+    :returns
+    --------
+    response - dict
+        Response of the server, with the results per column and the latency of the server
+    seconds - float
+        Round trip time of the request
+
+    :raises
+    -------
+    ValueError
+        The server rejected the request
+    """
+    body = {"genes": list(genes)}
+    if terms is not None:
+        body["terms"] = list(terms)
+    if background is not None:
+        body["background"] = list(background)
+
+    request = urllib.request.Request(f"http://{host}:{port}/enrich",
+                                    data=json.dumps(body).encode(),
+                                    headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content = json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        raise ValueError(json.loads(error.read()).get("error", str(error))) from error
+    return content, time.perf_counter() - start
+
+
+def enrich(genes: List[str], terms: Optional[List[str]] = None,
+            background: Optional[List[str]] = None, host: str = "127.0.0.1",
+            port: int = 8765):
+    """
+    Perform fisher's exact tests of a gene list on a running enrichment server.
+
+    :parameters
+    -----------
+    genes - list
+        Ensembl gene IDs of the gene list
+    terms - list
+        IDs of the HPO terms to test, default = all HPO terms
+    background - list
+        Ensembl gene IDs of all tested genes, default = all genes of the HPO database
+    host - str
+        Host of the server
+    port - int
+        Port of the server
+
+    :returns
+    --------
+    results - pd.DataFrame
+        One row per HPO term with the HPO ID, number of term genes, overlap, OR,
+        p value, zscore and the corrected p values
+    """
+    import pandas as pd
+
+    content, _ = post_enrich(genes, terms, background, host, port)
+    # Infinite values are sent as strings, JSON has no infinity
+    results = pd.DataFrame({column: [float(value) if value in ("inf", "-inf") else value
+                                        for value in values]
+                            for column, values in content["results"].items()})
+    return results.infer_objects()
@@ -4,26 +4,222 @@ specifically on results of gene prioritization methods.
 """
 
 from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 import numpy as np
 import pandas as pd
-from scipy import stats
+from scipy import special, stats
+from utils.cache import HPOMatrixCache, OntologyCache
+from utils.genes import GeneIDs, GeneUniverse, TermGeneSets, normalize_gene_ids
+from utils.multiple_testing import add_corrections
+from utils.ontology import Ontology
+from utils.ontology import Ontology
 
 
 @dataclass
 class HPO:
     """
     Dataclass containing a HPO database.
+
+    By default the database is converted once to a binary cache (see
+    utils.cache.HPOMatrixCache) which is memory-mapped on later runs.
+
+    Next to the dense gene x term matrix (hpo_data) the genes of every term are
+    available as sparse, sorted gene code arrays (gene_sets), on which single term
+    lookups and set operations across terms do not scan the whole matrix.
+
+    When an ontology file (hp.obo) is given, its transitive closure is available as
+    obo and, if propagate is True, the annotations are propagated up the ontology
+    (a gene of a term is also a gene of all ancestors of that term), so hpo_data
+    and gene_sets contain the propagated genes of every term of the ontology. The
+    closure, the propagated gene sets and the propagated matrix are cached inside
+    the HPO cache, the matrix is memory-mapped like the HPO matrix.
     """
     database: Path
+    cache_dir: Optional[Path] = None
+    use_cache: bool = True
+    ontology: Optional[Path] = None
+    propagate: bool = True
 
     def __post_init__(self) -> None:
         """
         Read in the HPO database and the HPO info.
         """
-        self.hpo_data = pd.read_csv(self.database, compression='gzip', sep="\t")
-        self.hpo_data.set_index('-', inplace=True)
+        if self.use_cache:
+            self.hpo_data = HPOMatrixCache(self.database, self.cache_dir).load()
+        else:
+            self.hpo_data = pd.read_csv(self.database, compression='gzip', sep="\t")
+            self.hpo_data.set_index('-', inplace=True)
+
+        self.obo = None
+        if self.ontology is not None:
+            self.obo, propagated, matrix = self.load_ontology()
+            if self.propagate:
+                # Overrides the cached property, the genes (rows) stay the same
+                self.gene_sets = propagated
+                # The transpose of the term x gene matrix is a view, no data is copied
+                self.hpo_data = pd.DataFrame(matrix.T, index=self.hpo_data.index,
+                                                columns=propagated.terms, copy=False)
+
+        # Gene IDs are interned once per run, the code of a gene is its row in hpo_data
+        self.universe = GeneUniverse(self.hpo_data.index)
+
+    def load_ontology(self) -> Tuple[Ontology, TermGeneSets, np.ndarray]:
+        """
+        Read the ontology and propagate the gene sets of the HPO database up
+        the ontology, from the cache if it is enabled.
+
+        :returns
+        --------
+        ontology - Ontology
+            The ontology with its transitive closure
+        propagated - TermGeneSets
+            Propagated gene sets of all terms
+        matrix - np.ndarray
+            Propagated uint8 term x gene matrix, memory-mapped from the cache if
+            it is enabled
+        """
+        if self.use_cache:
+            cache = OntologyCache(self.ontology, HPOMatrixCache(self.database, self.cache_dir))
+            ontology, propagated = cache.load()
+            return ontology, propagated, cache.read_matrix()
+        ontology = Ontology.from_obo(self.ontology)
+        propagated = ontology.propagate(self.gene_sets)
+        # Without the cache the HPO matrix is in memory as well
+        return ontology, propagated, propagated.to_csr().toarray()
+
+    def get_universe(self, hpo_data: pd.DataFrame) -> GeneUniverse:
+        """
+        Get the gene universe of (a subset of) the HPO database.
+
+        :parameters
+        -----------
+        hpo_data - pd.DataFrame
+            HPO metric inside a pandas data frame
+
+        :returns
+        --------
+        universe - GeneUniverse
+            The shared universe if hpo_data is the full HPO database, otherwise
+            a new universe made from the genes of hpo_data
+        """
+        if hpo_data is self.hpo_data:
+            return self.universe
+        return GeneUniverse(hpo_data.index)
+
+    @cached_property
+    def gene_sets(self) -> TermGeneSets:
+        """
+        The sparse gene sets of all HPO terms, memory-mapped from the cache.
+        """
+        if self.use_cache:
+            return HPOMatrixCache(self.database, self.cache_dir).read_gene_sets()
+        return TermGeneSets.from_dense(self.hpo_data.to_numpy().T, self.hpo_data.columns)
+
+    def resolve(self, hpo_term: str) -> str:
+        """
+        Get the ID under which a HPO term is part of the HPO data. An alternative ID
+        of the ontology that is not part of the HPO data is replaced by the primary
+        ID of its term, with propagation the HPO data only contains primary IDs.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+
+        :returns
+        --------
+        hpo_term - str
+            ID of the HPO term in the HPO data
+        """
+        if self.obo is None or hpo_term in self.gene_sets.terms:
+            return hpo_term
+        return self.obo.resolve(hpo_term)
+
+    def term_codes(self, hpo_term: str) -> np.ndarray:
+        """
+        Get the genes of a HPO term as sorted gene codes of the universe.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 codes of the genes of the HPO term
+        """
+        return np.asarray(self.gene_sets.genes(self.resolve(hpo_term)))
+
+    def term_genes(self, hpo_term: str) -> np.ndarray:
+        """
+        Get the ensembl gene IDs of the genes of a HPO term.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+
+        :returns
+        --------
+        genes - np.ndarray
+            Gene IDs, in the order of the HPO database
+        """
+        return self.universe.decode(self.term_codes(hpo_term))
+
+    def union(self, hpo_terms: list) -> np.ndarray:
+        """
+        Get the genes that belong to at least one of the HPO terms.
+
+        :parameters
+        -----------
+        hpo_terms - list
+            IDs of HPO terms
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 gene codes
+        """
+        return self.gene_sets.union([self.resolve(hpo_term) for hpo_term in hpo_terms])
+
+    def intersection(self, hpo_terms: list) -> np.ndarray:
+        """
+        Get the genes that belong to all of the HPO terms.
+
+        :parameters
+        -----------
+        hpo_terms - list
+            IDs of HPO terms
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 gene codes
+        """
+        return self.gene_sets.intersection([self.resolve(hpo_term) for hpo_term in hpo_terms])
+
+    def memory_report(self) -> pd.DataFrame:
+        """
+        Compare the memory usage of the dense HPO matrix with the sparse gene sets.
+
+        :returns
+        --------
+        report - pd.DataFrame
+            Shape, number of stored values and size in MB of both representations
+        """
+        n_genes, n_terms = self.hpo_data.shape
+        dense_bytes = n_genes * n_terms * self.hpo_data.to_numpy().itemsize
+        nnz = len(self.gene_sets.indices)
+        report = pd.DataFrame({"shape": [f"{n_genes} x {n_terms}"] * 2,
+                                "values": [n_genes * n_terms, nnz],
+                                "bytes": [dense_bytes, self.gene_sets.nbytes]},
+                                index=pd.Index(["dense matrix", "sparse gene sets"],
+                                                name="representation"))
+        report["MB"] = (report["bytes"] / 1024**2).round(2)
+        return report
 
     @staticmethod
     def get_data_hpo_term(hpo_data: pd.DataFrame,
@@ -32,6 +228,8 @@ class HPO:
         Subset the entire HPO database to get the data for a
         specific HPO term. Where the columns of the HPO database are
         different HPO terms and the index consists of ensembl gene IDs.
+        For repeated lookups on the full database use HPO.term_genes, which
+        does not scan the column.
 
         :parameters
         -----------
@@ -59,11 +257,15 @@ class FisherTest:
     """
 
     @staticmethod
-    def create_fisher_table(overlap_genes: pd.Series, gwas_genes: pd.Series,
-                            hpo_genes: pd.Series) -> pd.DataFrame:
+    def create_fisher_table(overlap_genes: GeneIDs, gwas_genes: GeneIDs,
+                            hpo_genes: GeneIDs,
+                            universe: Optional[GeneUniverse] = None) -> pd.DataFrame:
         """
         Create a 2x2 contingency table needed for fisher exact test.
 
+        The gene lists are encoded once as integer codes, after which all four
+        quadrants are counted with integer set operations.
+
         :parameters
         -----------
         overlap_genes - pd.Series
@@ -72,16 +274,27 @@ class FisherTest:
             List of significant genes
         hpo_genes - pd.Series
             List of HPO genes
+        universe - GeneUniverse
+            Universe to encode the genes with, default = a universe made from the
+            overlap genes
 
         :returns
         --------
         metrix - pd.DataFrame
             2x2 contingency table
         """
-        top_left = overlap_genes[~overlap_genes.isin(gwas_genes) & ~overlap_genes.isin(hpo_genes)].shape[0]
-        bottom_left = overlap_genes[overlap_genes.isin(gwas_genes) & ~overlap_genes.isin(hpo_genes)].shape[0]
-        top_right = overlap_genes[~overlap_genes.isin(gwas_genes) & overlap_genes.isin(hpo_genes)].shape[0]
-        bottom_right = overlap_genes[overlap_genes.isin(gwas_genes) & overlap_genes.isin(hpo_genes)].shape[0]
+        if universe is None:
+            universe = GeneUniverse(pd.unique(normalize_gene_ids(overlap_genes)))
+
+        overlap_codes = universe.encode(overlap_genes)
+        overlap_codes = overlap_codes[overlap_codes >= 0]
+        in_gwas = universe.bitset(gwas_genes)[overlap_codes]
+        in_hpo = universe.bitset(hpo_genes)[overlap_codes]
+
+        top_left = int(np.count_nonzero(~in_gwas & ~in_hpo))
+        bottom_left = int(np.count_nonzero(in_gwas & ~in_hpo))
+        top_right = int(np.count_nonzero(~in_gwas & in_hpo))
+        bottom_right = int(np.count_nonzero(in_gwas & in_hpo))
 
         total = top_left + bottom_left + top_right + bottom_right
 
@@ -112,12 +325,136 @@ class FisherTest:
         odds_ratio, p_val = stats.fisher_exact(fisher_data)
         return odds_ratio, p_val
 
+    @staticmethod
+    def count_contingency_tables(hpo_matrix: np.ndarray, significant: np.ndarray,
+                                terms: Optional[np.ndarray] = None,
+                                chunk_size: int = 2048) -> np.ndarray:
+        """
+        Create the 2x2 contingency tables of all HPO terms at once. The number of
+        significant genes per term is the matrix-vector product of the HPO matrix
+        with the indicator vector of the significant genes, which is evaluated as
+        a sum over the rows of the significant genes.
+
+        :parameters
+        -----------
+        hpo_matrix - np.ndarray
+            Gene x term HPO matrix (0/1)
+        significant - np.ndarray
+            Boolean indicator vector of the significant genes, one value per gene (row)
+        terms - np.ndarray
+            Column indices of the HPO terms to use, default = all terms
+        chunk_size - int
+            Number of HPO terms that are counted at once, bounds the memory usage
+
+        :returns
+        --------
+        tables - np.ndarray
+            Contingency tables of shape (n_terms, 2, 2), with the same layout as
+            the tables made by create_fisher_table: [[No GWAS & No HPO, No GWAS & Yes HPO],
+            [Yes GWAS & No HPO, Yes GWAS & Yes HPO]]
+        """
+        significant = np.asarray(significant, dtype=bool)
+        if terms is None:
+            terms = np.arange(hpo_matrix.shape[1])
+
+        hpo_counts = np.empty(len(terms), dtype=np.int64)
+        overlap_counts = np.empty(len(terms), dtype=np.int64)
+        for start in range(0, len(terms), chunk_size):
+            stop = start + chunk_size
+            block = np.asarray(hpo_matrix[:, terms[start:stop]])
+            hpo_counts[start:stop] = block.sum(axis=0, dtype=np.int64)
+            overlap_counts[start:stop] = block[significant].sum(axis=0, dtype=np.int64)
+
+        return FisherTest.create_contingency_tables(hpo_matrix.shape[0], int(significant.sum()),
+                                                    hpo_counts, overlap_counts)
+
+    @staticmethod
+    def create_contingency_tables(n_genes: int, n_significant: int, hpo_counts: np.ndarray,
+                                    overlap_counts: np.ndarray) -> np.ndarray:
+        """
+        Create the 2x2 contingency tables of HPO terms from their gene counts.
+
+        :parameters
+        -----------
+        n_genes - int
+            Total number of genes
+        n_significant - int
+            Number of significant genes
+        hpo_counts - np.ndarray
+            Number of genes per HPO term
+        overlap_counts - np.ndarray
+            Number of significant genes per HPO term
+
+        :returns
+        --------
+        tables - np.ndarray
+            Contingency tables of shape (n_terms, 2, 2), see count_contingency_tables
+        """
+        hpo_counts = np.asarray(hpo_counts, dtype=np.int64)
+        overlap_counts = np.asarray(overlap_counts, dtype=np.int64)
+
+        tables = np.empty((len(hpo_counts), 2, 2), dtype=np.int64)
+        tables[:, 0, 0] = n_genes - n_significant - hpo_counts + overlap_counts
+        tables[:, 0, 1] = hpo_counts - overlap_counts
+        tables[:, 1, 0] = n_significant - overlap_counts
+        tables[:, 1, 1] = overlap_counts
+        return tables
+
+    @staticmethod
+    def fishers_exact_tests(tables: np.ndarray, log: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Perform the (two-sided) fisher's exact test on a stack of 2x2 contingency
+        tables at once. Gives the same results as scipy.stats.fisher_exact on each
+        of the tables separately.
+
+        :parameters
+        -----------
+        tables - np.ndarray
+            2x2 contingency tables, shape (n_tables, 2, 2)
+        log - bool
+            Return the natural logarithm of the p values, which does not underflow
+            for extremely small p values
+
+        :returns
+        --------
+        odds_ratios - np.ndarray
+            Odds ratios of the fisher's exact tests
+        p_values - np.ndarray
+            (Log) p values of the fisher's exact tests
+        """
+        tables = np.asarray(tables, dtype=np.int64)
+        top_left, top_right = tables[:, 0, 0], tables[:, 0, 1]
+        bottom_left, bottom_right = tables[:, 1, 0], tables[:, 1, 1]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            odds_ratios = (top_left * bottom_right) / (bottom_left * top_right)
+        odds_ratios[(bottom_left == 0) | (top_right == 0)] = np.inf
+
+        total = tables.sum(axis=(1, 2))
+        n_hpo = top_right + bottom_right
+        n_gwas = bottom_left + bottom_right
+
+        log_pvalues = np.zeros(len(tables))
+        # Tables with an empty row or column carry no information
+        degenerate = (tables.sum(axis=1) == 0).any(axis=1) | (tables.sum(axis=2) == 0).any(axis=1)
+        odds_ratios[degenerate] = np.nan
+
+        informative = ~degenerate
+        log_pvalues[informative] = hypergeom_log_pvalues(bottom_right[informative],
+                        total[informative], n_hpo[informative], n_gwas[informative])
+        return odds_ratios, log_pvalues if log else np.exp(log_pvalues)
+
     def perform_fisher_exact_tests(self, hpo_data: pd.DataFrame, gene_data: pd.Series,
-                                    hpo_info: pd.DataFrame) -> pd.DataFrame:
+                                    hpo_info: pd.DataFrame,
+                                    universe: Optional[GeneUniverse] = None,
+                                    ontology: Optional[Ontology] = None) -> pd.DataFrame:
         """
         Perform fisher's exact test on the intersect of the HPO genes, and
         genes produced by a gene prioritization method.
 
+        All HPO terms are tested at once, so testing every term in the HPO
+        database is about as fast as testing a handful of them.
+
         :parameters
         -----------
         hpo_data - pd.DataFrame
@@ -126,32 +463,335 @@ class FisherTest:
             List of genes
         hpo_info - pd.DataFrame
             A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
+        universe - GeneUniverse
+            Universe of the genes (rows) of hpo_data, default = a universe made from
+            the genes of hpo_data
+        ontology - Ontology
+            Ontology of the HPO terms, if given HPO IDs that are alternative IDs are
+            looked up by the primary ID of their term
 
         :returns
         --------
         hpo_scores - pd.DataFrame
             The original hpo_info data frame with some additional information:
-            OR and p values from the fisher exact test and zscores from the p values.
+            OR and p values from the fisher exact test, zscores from the p values and
+            the Bonferroni, Benjamini-Hochberg and Storey q value corrections of the p
+            values over all HPO terms (see utils.multiple_testing).
         """
         hpo_scores = hpo_info.copy()
-        odds_ratios = []
-        p_values = []
-        for hpo in hpo_info["HPO ID"]:
 
-            try:
-                hpo_genes = hpo_data.loc[hpo_data[hpo] == 1, hpo].index
-                fisher_data = self.create_fisher_table(hpo_data.index, gene_data, hpo_genes).iloc[0:2, 0:2].values
+        # HPO terms that are not in the HPO database get a NaN
+        term_index = hpo_data.columns.get_indexer(hpo_info["HPO ID"]) if ontology is None \
+            else ontology.get_indexer(hpo_data.columns, hpo_info["HPO ID"])
+        found = term_index >= 0
 
-                odds_ratio, p_val = self.fishers_exact_test(fisher_data)
-            except KeyError:
-                odds_ratio, p_val = np.nan, np.nan
+        # Gene IDs are compared after normalization, like in the overlap with HPO
+        if universe is None:
+            universe = GeneUniverse(hpo_data.index)
+        significant = universe.bitset(gene_data)
+        tables = self.count_contingency_tables(hpo_data.to_numpy(), significant,
+                                                term_index[found])
 
-            odds_ratios.append(odds_ratio)
-            p_values.append(p_val)
+        odds_ratios = np.full(len(hpo_info), np.nan)
+        log_pvalues = np.full(len(hpo_info), np.nan)
+        odds_ratios[found], log_pvalues[found] = self.fishers_exact_tests(tables, log=True)
 
         hpo_scores["OR"] = odds_ratios
-        hpo_scores["pvalues"] = p_values
-        zscores = stats.norm.ppf(p_values)
-        hpo_scores["zscores"] = np.where(zscores == np.inf, 4, zscores)
+        hpo_scores["pvalues"] = np.exp(log_pvalues)
+        hpo_scores["zscores"] = self.calculate_zscores(log_p_values=log_pvalues)
+
+        return add_corrections(hpo_scores)
+
+    @staticmethod
+    def count_hpo_genes(hpo_matrix: np.ndarray, terms: np.ndarray,
+                        chunk_size: int = 2048) -> np.ndarray:
+        """
+        Count the number of genes of each HPO term.
+
+        :parameters
+        -----------
+        hpo_matrix - np.ndarray
+            Gene x term HPO matrix (0/1)
+        terms - np.ndarray
+            Column indices of the HPO terms
+        chunk_size - int
+            Number of HPO terms that are counted at once, bounds the memory usage
+
+        :returns
+        --------
+        hpo_counts - np.ndarray
+            Number of genes per HPO term
+        """
+        hpo_counts = np.empty(len(terms), dtype=np.int64)
+        for start in range(0, len(terms), chunk_size):
+            block = np.asarray(hpo_matrix[:, terms[start:start + chunk_size]])
+            hpo_counts[start:start + chunk_size] = block.sum(axis=0, dtype=np.int64)
+        return hpo_counts
+
+    @staticmethod
+    def cumulative_overlap_counts(hpo_matrix: np.ndarray, gene_order: np.ndarray,
+                                    top_k: np.ndarray, terms: np.ndarray) -> np.ndarray:
+        """
+        Count for each HPO term how many of the top k ranked genes are HPO genes,
+        for a whole range of k. The counts are updated incrementally while moving
+        down the ranking, so every gene (row of the HPO matrix) is only added once.
+
+        :parameters
+        -----------
+        hpo_matrix - np.ndarray
+            Gene x term HPO matrix (0/1)
+        gene_order - np.ndarray
+            Row indices of the genes, from most to least prioritized
+        top_k - np.ndarray
+            Sorted numbers of top ranked genes
+        terms - np.ndarray
+            Column indices of the HPO terms
+
+        :returns
+        --------
+        overlap_counts - np.ndarray
+            Overlap counts of shape (len(top_k), len(terms))
+        """
+        overlap_counts = np.zeros((len(top_k), len(terms)), dtype=np.int64)
+        running = np.zeros(len(terms), dtype=np.int64)
+        previous = 0
+        for i, k in enumerate(top_k):
+            rows = np.sort(gene_order[previous:k])
+            running += np.asarray(hpo_matrix[rows])[:, terms].sum(axis=0, dtype=np.int64)
+            overlap_counts[i] = running
+            previous = k
+        return overlap_counts
+
+    def perform_threshold_sweep(self, hpo_data: pd.DataFrame, ranked_genes: pd.Series,
+                                hpo_info: pd.DataFrame, top_k: list,
+                                universe: Optional[GeneUniverse] = None,
+                                ontology: Optional[Ontology] = None) -> pd.DataFrame:
+        """
+        Perform fisher's exact tests on the intersect of the HPO genes and the top k
+        genes produced by a gene prioritization method, for a whole range of k at once.
+
+        :parameters
+        -----------
+        hpo_data - pd.DataFrame
+            HPO metric inside a pandas data frame
+        ranked_genes - pd.Series
+            List of genes, sorted from most to least prioritized
+        hpo_info - pd.DataFrame
+            A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
+        top_k - list
+            Numbers of top ranked genes to use as significant genes, values larger than
+            the number of ranked genes are skipped
+        universe - GeneUniverse
+            Universe of the genes (rows) of hpo_data, default = a universe made from
+            the genes of hpo_data
+        ontology - Ontology
+            Ontology of the HPO terms, if given HPO IDs that are alternative IDs are
+            looked up by the primary ID of their term
+
+        :returns
+        --------
+        sweep_scores - pd.DataFrame
+            The hpo_info data frame repeated for every k, with the additional columns:
+            top_k, the overlap between the top k genes and the HPO genes, OR, p values,
+            zscores and the corrected p values (corrected per k).
+        """
+        if universe is None:
+            universe = GeneUniverse(hpo_data.index)
+        gene_order = universe.encode(ranked_genes)
+        # Genes outside of the HPO data can not be counted, duplicates only count once
+        gene_order = pd.unique(gene_order[gene_order >= 0])
+
+        top_k = np.unique(np.asarray(top_k, dtype=np.int64))
+        top_k = top_k[(top_k > 0) & (top_k <= len(gene_order))]
+
+        term_index = hpo_data.columns.get_indexer(hpo_info["HPO ID"]) if ontology is None \
+            else ontology.get_indexer(hpo_data.columns, hpo_info["HPO ID"])
+        found = term_index >= 0
+
+        hpo_matrix = hpo_data.to_numpy()
+        terms = term_index[found]
+        hpo_counts = self.count_hpo_genes(hpo_matrix, terms)
+        overlap_counts = self.cumulative_overlap_counts(hpo_matrix, gene_order, top_k, terms)
+
+        n_genes = hpo_matrix.shape[0]
+        n_significant = top_k[:, None]
+
+        tables = np.empty((len(top_k), len(terms), 2, 2), dtype=np.int64)
+        tables[..., 0, 0] = n_genes - n_significant - hpo_counts + overlap_counts
+        tables[..., 0, 1] = hpo_counts - overlap_counts
+        tables[..., 1, 0] = n_significant - overlap_counts
+        tables[..., 1, 1] = overlap_counts
+
+        odds_ratios = np.full((len(top_k), len(hpo_info)), np.nan)
+        log_pvalues = np.full((len(top_k), len(hpo_info)), np.nan)
+        overlap = np.full((len(top_k), len(hpo_info)), np.nan)
+
+        sweep_odds_ratios, sweep_log_pvalues = self.fishers_exact_tests(tables.reshape(-1, 2, 2),
+                                                                        log=True)
+        odds_ratios[:, found] = sweep_odds_ratios.reshape(len(top_k), -1)
+        log_pvalues[:, found] = sweep_log_pvalues.reshape(len(top_k), -1)
+        overlap[:, found] = overlap_counts
+
+        sweep_scores = hpo_info.iloc[np.tile(np.arange(len(hpo_info)), len(top_k))]
+        sweep_scores = sweep_scores.reset_index(drop=True)
+        sweep_scores.insert(0, "top_k", np.repeat(top_k, len(hpo_info)))
+        sweep_scores["overlap"] = overlap.ravel()
+        sweep_scores["OR"] = odds_ratios.ravel()
+        sweep_scores["pvalues"] = np.exp(log_pvalues.ravel())
+        sweep_scores["zscores"] = self.calculate_zscores(log_p_values=log_pvalues.ravel())
+
+        # Every k is a separate family of tests
+        return add_corrections(sweep_scores, sweep_scores["top_k"].to_numpy())
+
+    @staticmethod
+    def calculate_zscores(p_values: Optional[np.ndarray] = None,
+                            log_p_values: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Convert p values to zscores, a p value of 1 gets a zscore of 4.
+
+        When the natural logarithm of the p values is given the zscores are
+        calculated in log space, so p values that are too small to be represented
+        (e.g. 1e-400) still get a finite zscore instead of -inf.
+
+        :parameters
+        -----------
+        p_values - np.ndarray
+            P values
+        log_p_values - np.ndarray
+            Natural logarithm of the p values, used instead of p_values
+
+        :returns
+        --------
+        zscores - np.ndarray
+            zscores of the p values
+        """
+        if log_p_values is None:
+            zscores = stats.norm.ppf(p_values)
+        else:
+            zscores = ndtri_exp(np.asarray(log_p_values, dtype=np.float64))
+        return np.where(zscores == np.inf, 4, zscores)
+
+
+def ndtri_exp(log_p: np.ndarray) -> np.ndarray:
+    """
+    Inverse of the log of the standard normal CDF: the zscores of log p values.
+    Uses scipy.special.ndtri_exp if it is available (scipy >= 1.10), otherwise
+    an asymptotic start value refined with Newton steps on scipy.special.log_ndtr.
+
+    :parameters
+    -----------
+    log_p - np.ndarray
+        Natural logarithm of p values
+
+    :returns
+    --------
+    zscores - np.ndarray
+        zscores of the p values
+    """
+    if hasattr(special, "ndtri_exp"):
+        return special.ndtri_exp(log_p)
+
+    log_p = np.asarray(log_p, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        zscores = special.ndtri(np.exp(log_p))
+        # Close to p = 1 the upper tail 1 - p = -expm1(log_p) is accurate
+        large = log_p > -np.log(2)
+        zscores[large] = -special.ndtri(-np.expm1(log_p[large]))
+        # exp underflows for very small p values, start from the asymptotic expansion
+        tiny = np.isfinite(log_p) & (log_p < -700)
+        t = -2 * log_p[tiny]
+        z = -np.sqrt(t - np.log(t) - np.log(2 * np.pi))
+        for _ in range(3):
+            log_cdf = special.log_ndtr(z)
+            log_pdf = -0.5 * z ** 2 - 0.5 * np.log(2 * np.pi)
+            z -= (log_cdf - log_p[tiny]) * np.exp(log_cdf - log_pdf)
+        zscores[tiny] = z
+    return zscores
+
+
+@lru_cache(maxsize=8)
+def log_factorials(n_max: int) -> np.ndarray:
+    """
+    Create a table with the natural logarithm of the factorials 0! up to and including n_max!.
+
+    :parameters
+    -----------
+    n_max - int
+        Largest factorial
+
+    :returns
+    --------
+    log_factorial - np.ndarray
+        log(k!) for k = 0 ... n_max
+    """
+    return special.gammaln(np.arange(n_max + 1, dtype=np.float64) + 1)
+
+
+def hypergeom_log_pvalues(overlap: np.ndarray, total: np.ndarray, n_hpo: np.ndarray,
+                        n_gwas: np.ndarray, max_elements: int = 1 << 22) -> np.ndarray:
+    """
+    Calculate the two-sided p values of the fisher's exact test from the
+    hypergeometric distribution for many tables at once. Like scipy (and R) the
+    p value is the total probability of all overlaps that are at most as likely as
+    the observed overlap. The probabilities are calculated from a cached
+    log-factorial table.
+
+    :parameters
+    -----------
+    overlap - np.ndarray
+        Number of significant genes that are HPO genes
+    total - np.ndarray
+        Total number of genes
+    n_hpo - np.ndarray
+        Number of HPO genes
+    n_gwas - np.ndarray
+        Number of significant genes
+    max_elements - int
+        Maximum number of probabilities that are calculated at once, bounds the memory usage
+
+    :returns
+    --------
+    log_pvalues - np.ndarray
+        Natural logarithm of the p values
+    """
+    overlap, total = np.asarray(overlap, dtype=np.int64), np.asarray(total, dtype=np.int64)
+    n_hpo, n_gwas = np.asarray(n_hpo, dtype=np.int64), np.asarray(n_gwas, dtype=np.int64)
+
+    log_pvalues = np.zeros(len(overlap))
+    if len(overlap) == 0:
+        return log_pvalues
+
+    log_fact = log_factorials(int(total.max()))
+
+    def log_pmf(k, n_total, n_success, n_draws):
+        return (log_fact[n_success] - log_fact[k] - log_fact[n_success - k]
+                + log_fact[n_total - n_success] - log_fact[n_draws - k]
+                - log_fact[n_total - n_success - n_draws + k]
+                - log_fact[n_total] + log_fact[n_draws] + log_fact[n_total - n_draws])
+
+    # Support of the hypergeometric distribution of each table
+    lower = np.maximum(0, n_gwas + n_hpo - total)
+    upper = np.minimum(n_gwas, n_hpo)
+
+    # Relative tolerance for probabilities that are equal to the observed one
+    log_tolerance = np.log1p(1e-7)
+
+    width = int((upper - lower).max()) + 1
+    chunk_size = max(1, max_elements // width)
+    for start in range(0, len(overlap), chunk_size):
+        part = slice(start, start + chunk_size)
+        support = lower[part, None] + np.arange(width)[None, :]
+        in_support = support <= upper[part, None]
+        support = np.where(in_support, support, lower[part, None])
+
+        log_probs = log_pmf(support, total[part, None], n_hpo[part, None], n_gwas[part, None])
+        log_observed = log_pmf(overlap[part], total[part], n_hpo[part], n_gwas[part])
+
+        as_extreme = in_support & (log_probs <= log_observed[:, None] + log_tolerance)
+        part_pvalues = special.logsumexp(np.where(as_extreme, log_probs, -np.inf), axis=1)
+
+        # If every possible overlap is as extreme the p value is exactly one
+        part_pvalues[(as_extreme == in_support).all(axis=1)] = 0.0
+        log_pvalues[part] = np.minimum(part_pvalues, 0.0)
 
-        return hpo_scores
+    return log_pvalues
@@ -0,0 +1,348 @@
+"""
+Module that provides a gene universe, which interns ensembl gene IDs as dense integer
+codes so that overlaps between gene lists become integer set operations, and a sparse
+representation of the gene sets of HPO terms on top of these codes.
+"""
+
+from typing import Union
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+GeneIDs = Union[pd.Series, pd.Index, np.ndarray, list]
+
+
+def normalize_gene_ids(genes: GeneIDs) -> pd.Series:
+    """
+    Normalize ensembl gene IDs by removing surrounding whitespace and
+    version suffixes (e.g. ENSG00000139618.12 -> ENSG00000139618).
+
+    :parameters
+    -----------
+    genes - pd.Series, pd.Index, np.ndarray or list
+        Gene IDs
+
+    :returns
+    --------
+    normalized - pd.Series
+        Normalized gene IDs, in the same order (and with the same index if
+        a pd.Series was supplied)
+    """
+    genes = pd.Series(genes, copy=False) if not isinstance(genes, pd.Series) else genes
+    if pd.api.types.is_numeric_dtype(genes):
+        return genes
+    return genes.str.strip().str.replace(r"\.\d+$", "", regex=True)
+
+
+class GeneUniverse:
+    """
+    Maps each ensembl gene ID of a fixed set of genes (e.g. the genes of the HPO database)
+    to a dense int32 code, which is the position of the gene in that set.
+
+    Gene lists that are encoded once can be carried around as (sorted) integer arrays
+    or boolean bitsets, all methods accept either gene IDs or, with encoded=True, the
+    codes of genes that were already encoded.
+    """
+
+    def __init__(self, genes: GeneIDs) -> None:
+        self.genes = pd.Index(normalize_gene_ids(genes).to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.genes)
+
+    def encode(self, genes: GeneIDs, encoded: bool = False) -> np.ndarray:
+        """
+        Get the codes of a list of genes, genes that are not part of the universe get -1.
+
+        :parameters
+        -----------
+        genes - pd.Series, pd.Index, np.ndarray or list
+            Gene IDs, or codes if encoded is True
+        encoded - bool
+            The genes are codes of this universe already and are returned as is.
+            Gene IDs are never taken for codes, also not numeric IDs (e.g. entrez IDs)
+
+        :returns
+        --------
+        codes - np.ndarray
+            int32 codes, in the same order as the genes
+        """
+        if encoded:
+            return np.asarray(genes).astype(np.int32, copy=False)
+
+        if isinstance(genes, pd.Series) and isinstance(genes.dtype, pd.CategoricalDtype):
+            # Only the categories are encoded (see compact_table of prioritization_methods)
+            category_codes = self.encode(genes.cat.categories)
+            codes = genes.cat.codes.to_numpy()
+            gene_codes = np.full(codes.shape[0], -1, dtype=np.int32)
+            gene_codes[codes >= 0] = category_codes[codes[codes >= 0]]
+            return gene_codes
+
+        return self.genes.get_indexer(normalize_gene_ids(np.asarray(genes))).astype(np.int32)
+
+    def codes(self, genes: GeneIDs, encoded: bool = False) -> np.ndarray:
+        """
+        Get the sorted, unique codes of the genes that are part of the universe.
+
+        :parameters
+        -----------
+        genes - pd.Series, pd.Index, np.ndarray or list
+            Gene IDs, or codes if encoded is True
+        encoded - bool
+            The genes are codes of this universe already
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 codes
+        """
+        codes = self.encode(genes, encoded)
+        return np.unique(codes[codes >= 0])
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Get the gene IDs belonging to a list of codes.
+
+        :parameters
+        -----------
+        codes - np.ndarray
+            int32 codes
+
+        :returns
+        --------
+        genes - np.ndarray
+            Gene IDs
+        """
+        return self.genes.to_numpy()[codes]
+
+    def bitset(self, genes: GeneIDs, encoded: bool = False) -> np.ndarray:
+        """
+        Get a boolean membership vector of a list of genes.
+
+        :parameters
+        -----------
+        genes - pd.Series, pd.Index, np.ndarray or list
+            Gene IDs, or codes if encoded is True
+        encoded - bool
+            The genes are codes of this universe already
+
+        :returns
+        --------
+        bitset - np.ndarray
+            Boolean vector of the size of the universe, True for each gene in the list
+        """
+        bitset = np.zeros(len(self), dtype=bool)
+        bitset[self.codes(genes, encoded)] = True
+        return bitset
+
+    def isin(self, genes: GeneIDs, other: GeneIDs) -> np.ndarray:
+        """
+        Integer equivalent of pd.Series.isin: check for each gene if it is part
+        of another list of genes. Genes outside of the universe are never part
+        of the other list.
+
+        :parameters
+        -----------
+        genes - pd.Series, pd.Index, np.ndarray or list
+            Gene IDs
+        other - pd.Series, pd.Index, np.ndarray or list
+            Gene IDs
+
+        :returns
+        --------
+        mask - np.ndarray
+            Boolean mask, True if a gene is part of the other list
+        """
+        codes = self.encode(genes)
+        return (codes >= 0) & self.bitset(other)[codes]
+
+
+class TermGeneSets:
+    """
+    Sparse representation of the genes of every HPO term: the term x gene matrix in
+    CSR form. The genes of a term are a slice of one sorted int32 array of gene codes
+    (indices[indptr[i]:indptr[i + 1]]), so looking up a term does not depend on the
+    number of genes and the memory usage only depends on the number of annotations.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, terms: pd.Index,
+                n_genes: int) -> None:
+        self.indptr = indptr
+        self.indices = indices
+        self.terms = pd.Index(terms)
+        self.n_genes = n_genes
+
+    @classmethod
+    def from_dense(cls, matrix: np.ndarray, terms: pd.Index,
+                    chunk_size: int = 1024) -> "TermGeneSets":
+        """
+        Create the gene sets from a dense term x gene matrix (0/1), a chunk of terms at
+        a time so a memory-mapped matrix is never loaded completely.
+
+        :parameters
+        -----------
+        matrix - np.ndarray
+            Term x gene matrix
+        terms - pd.Index
+            HPO terms, in the order of the rows of the matrix
+        chunk_size - int
+            Number of terms that are converted at once
+
+        :returns
+        --------
+        gene_sets - TermGeneSets
+            The gene sets of all terms
+        """
+        counts, indices = [], []
+        for start in range(0, matrix.shape[0], chunk_size):
+            rows, genes = np.nonzero(np.asarray(matrix[start:start + chunk_size]))
+            counts.append(np.bincount(rows, minlength=min(chunk_size, matrix.shape[0] - start)))
+            indices.append(genes.astype(np.int32))
+
+        indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+        if counts:
+            np.cumsum(np.concatenate(counts), out=indptr[1:])
+        indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.int32)
+        return cls(indptr, indices, terms, matrix.shape[1])
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes used by the gene sets.
+        """
+        return self.indptr.nbytes + self.indices.nbytes
+
+    def term_position(self, hpo_term: str) -> int:
+        """
+        Get the position of a HPO term.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+
+        :returns
+        --------
+        position - int
+            Row of the term
+
+        :raises
+        -------
+        KeyError
+            The HPO term is not part of the HPO database
+        """
+        return self.terms.get_loc(hpo_term)
+
+    def genes(self, hpo_term: str) -> np.ndarray:
+        """
+        Get the genes of a HPO term.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 gene codes
+        """
+        position = self.term_position(hpo_term)
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+    def sizes(self) -> pd.Series:
+        """
+        Get the number of genes of every HPO term.
+
+        :returns
+        --------
+        sizes - pd.Series
+            Number of genes, index: HPO terms
+        """
+        return pd.Series(np.diff(self.indptr), index=self.terms)
+
+    def union(self, hpo_terms: list) -> np.ndarray:
+        """
+        Get the genes that belong to at least one of the HPO terms.
+
+        :parameters
+        -----------
+        hpo_terms - list
+            IDs of HPO terms
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 gene codes
+        """
+        sets = [self.genes(hpo_term) for hpo_term in hpo_terms]
+        return np.unique(np.concatenate(sets)) if sets else np.empty(0, dtype=np.int32)
+
+    def intersection(self, hpo_terms: list) -> np.ndarray:
+        """
+        Get the genes that belong to all of the HPO terms.
+
+        :parameters
+        -----------
+        hpo_terms - list
+            IDs of HPO terms
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 gene codes
+        """
+        # Start with the smallest set, the intersection can only get smaller
+        sets = sorted((self.genes(hpo_term) for hpo_term in hpo_terms), key=len)
+        if not sets:
+            return np.empty(0, dtype=np.int32)
+        result = sets[0]
+        for genes in sets[1:]:
+            result = np.intersect1d(result, genes, assume_unique=True)
+        return result
+
+    def difference(self, hpo_term: str, other_terms: list) -> np.ndarray:
+        """
+        Get the genes of a HPO term that do not belong to any of the other HPO terms.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+        other_terms - list
+            IDs of HPO terms
+
+        :returns
+        --------
+        codes - np.ndarray
+            Sorted int32 gene codes
+        """
+        return np.setdiff1d(self.genes(hpo_term), self.union(other_terms), assume_unique=True)
+
+    def to_csr(self):
+        """
+        Get the gene sets as a sparse term x gene matrix.
+
+        :returns
+        --------
+        matrix - scipy.sparse.csr_matrix
+            Term x gene matrix (0/1)
+        """
+        return sparse.csr_matrix((np.ones(len(self.indices), dtype=np.uint8), self.indices,
+                                    self.indptr), shape=(len(self.terms), self.n_genes))
+
+    def to_csc(self):
+        """
+        Get the gene sets as a sparse gene x term matrix, in which the genes
+        of a term are a column.
+
+        :returns
+        --------
+        matrix - scipy.sparse.csc_matrix
+            Gene x term matrix (0/1)
+        """
+        return self.to_csr().T
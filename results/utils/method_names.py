@@ -0,0 +1,34 @@
+"""
+Module that provides command line validation of the names of the registered
+prioritization methods. The name is checked after the arguments are parsed, so the
+prioritization methods (and with them numpy, pandas and scipy) are only imported
+once all other arguments are valid and --help and other argument errors stay fast.
+"""
+
+import argparse
+
+
+def validate_method_name(parser: argparse.ArgumentParser, name: str) -> str:
+    """
+    Check that a name is the name of a registered prioritization method, ignoring
+    case like utils.prioritization_methods.get_method. An unknown name is reported
+    as an argument error of the parser.
+
+    :parameters
+    -----------
+    parser - argparse.ArgumentParser
+        Parser the name was parsed with
+    name - str
+        Name of the prioritization method
+
+    :returns
+    --------
+    name - str
+        The name the prioritization method is registered under
+    """
+    from utils.prioritization_methods import get_method
+
+    try:
+        return get_method(name).name
+    except ValueError as error:
+        parser.error(f"argument -m/--method: {error}")
@@ -0,0 +1,237 @@
+"""
+Module that provides multiple testing corrections of the p values of many fisher's
+exact tests at once: Bonferroni, Benjamini-Hochberg and Storey q values.
+
+All corrections are calculated in one pass over the p values of all families of
+tests (e.g. all traits of a method): the p values are sorted once by family and
+p value, which takes O(n log n) time for n tests. Missing p values (NaN) are not
+counted as tests and stay missing.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+# Name of the column that is added per correction
+CORRECTION_COLUMNS = {"bonferroni": "pvalues_bonferroni",
+                        "bh": "pvalues_BH",
+                        "qvalue": "qvalues"}
+
+# Levels at which the tests are grouped into families
+FAMILIES = ["trait", "method", "all"]
+
+
+class FamilyOrder:
+    """
+    The p values sorted by family and p value, shared by the corrections.
+
+    :parameters
+    -----------
+    p_values - np.ndarray
+        P values
+    groups - np.ndarray
+        Family of every p value, default = all p values are one family
+    """
+
+    def __init__(self, p_values: np.ndarray, groups: Optional[np.ndarray] = None) -> None:
+        self.p_values = np.asarray(p_values, dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(self.p_values))
+
+        if groups is None:
+            codes = np.zeros(len(valid), dtype=np.int64)
+        else:
+            codes = pd.factorize(np.asarray(groups)[valid])[0]
+
+        # Positions of the tests, sorted by family and within a family by p value
+        sort = np.lexsort((self.p_values[valid], codes))
+        self.order = valid[sort]
+        self.codes = codes[sort]
+        self.sorted = self.p_values[self.order]
+
+        # Number of tests per family and the rank of every test within its family
+        starts = np.flatnonzero(np.r_[True, self.codes[1:] != self.codes[:-1]]) \
+            if len(self.codes) else np.empty(0, dtype=np.int64)
+        sizes = np.diff(np.r_[starts, len(self.codes)])
+        self.n_tests = np.repeat(sizes, sizes)
+        self.ranks = np.arange(len(self.codes)) - np.repeat(starts, sizes) + 1
+
+    def scatter(self, sorted_values: np.ndarray) -> np.ndarray:
+        """
+        Put values of the sorted tests back in the original order of the tests.
+
+        :parameters
+        -----------
+        sorted_values - np.ndarray
+            A value for every test with a p value, in sorted order
+
+        :returns
+        --------
+        values - np.ndarray
+            The values in the order of the p values, NaN for missing p values
+        """
+        values = np.full(len(self.p_values), np.nan)
+        values[self.order] = sorted_values
+        return values
+
+    def step_up(self, sorted_values: np.ndarray) -> np.ndarray:
+        """
+        Make adjusted p values monotone by taking the minimum over all tests with
+        a larger (or equal) p value in the same family.
+
+        :parameters
+        -----------
+        sorted_values - np.ndarray
+            Adjusted p values in sorted order
+
+        :returns
+        --------
+        monotone - np.ndarray
+            Monotone adjusted p values in sorted order
+        """
+        reverse = pd.Series(sorted_values[::-1])
+        return reverse.groupby(self.codes[::-1]).cummin().to_numpy()[::-1]
+
+
+def bonferroni(p_values: np.ndarray, groups: Optional[np.ndarray] = None,
+                order: Optional[FamilyOrder] = None) -> np.ndarray:
+    """
+    Bonferroni corrected p values: the p values multiplied by the number of tests
+    of their family.
+
+    :parameters
+    -----------
+    p_values - np.ndarray
+        P values
+    groups - np.ndarray
+        Family of every p value, default = all p values are one family
+    order - FamilyOrder
+        Precalculated order of the p values, default = calculated from p_values and groups
+
+    :returns
+    --------
+    adjusted - np.ndarray
+        Bonferroni corrected p values
+    """
+    order = FamilyOrder(p_values, groups) if order is None else order
+    return order.scatter(np.minimum(order.sorted * order.n_tests, 1.0))
+
+
+def benjamini_hochberg(p_values: np.ndarray, groups: Optional[np.ndarray] = None,
+                        order: Optional[FamilyOrder] = None) -> np.ndarray:
+    """
+    Benjamini-Hochberg adjusted p values, which control the false discovery rate.
+
+    :parameters
+    -----------
+    p_values - np.ndarray
+        P values
+    groups - np.ndarray
+        Family of every p value, default = all p values are one family
+    order - FamilyOrder
+        Precalculated order of the p values, default = calculated from p_values and groups
+
+    :returns
+    --------
+    adjusted - np.ndarray
+        Benjamini-Hochberg adjusted p values
+    """
+    order = FamilyOrder(p_values, groups) if order is None else order
+    adjusted = order.step_up(order.sorted * order.n_tests / order.ranks)
+    return order.scatter(np.minimum(adjusted, 1.0))
+
+
+def storey_qvalues(p_values: np.ndarray, groups: Optional[np.ndarray] = None,
+                    order: Optional[FamilyOrder] = None, lambda_: float = 0.5) -> np.ndarray:
+    """
+    Storey q values: the Benjamini-Hochberg adjusted p values multiplied by the
+    estimated proportion of true null hypotheses (pi0) of the family. pi0 is
+    estimated from the p values above lambda_, which are mostly true nulls, with
+    the conservative estimator of Storey, Taylor and Siegmund (2004) that is
+    never zero.
+
+    :parameters
+    -----------
+    p_values - np.ndarray
+        P values
+    groups - np.ndarray
+        Family of every p value, default = all p values are one family
+    order - FamilyOrder
+        Precalculated order of the p values, default = calculated from p_values and groups
+    lambda_ - float
+        Tuning parameter of the pi0 estimate, between 0 and 1
+
+    :returns
+    --------
+    qvalues - np.ndarray
+        Storey q values
+    """
+    order = FamilyOrder(p_values, groups) if order is None else order
+
+    above = pd.Series(order.sorted > lambda_).groupby(order.codes).transform("sum").to_numpy()
+    pi0 = np.minimum((above + 1) / (order.n_tests * (1 - lambda_)), 1.0)
+
+    adjusted = order.step_up(pi0 * order.sorted * order.n_tests / order.ranks)
+    return order.scatter(np.minimum(adjusted, 1.0))
+
+
+def add_corrections(scores: pd.DataFrame, groups: Optional[np.ndarray] = None,
+                    column: str = "pvalues") -> pd.DataFrame:
+    """
+    Add the Bonferroni, Benjamini-Hochberg and Storey q value corrections of the
+    p values as columns (see CORRECTION_COLUMNS).
+
+    :parameters
+    -----------
+    scores - pd.DataFrame
+        Results of fisher's exact tests
+    groups - np.ndarray
+        Family of every test, default = all tests are one family
+    column - str
+        Column with the p values
+
+    :returns
+    --------
+    scores - pd.DataFrame
+        The scores with the corrected p values
+    """
+    order = FamilyOrder(scores[column].to_numpy(), groups)
+    corrections: Dict[str, np.ndarray] = {
+        CORRECTION_COLUMNS["bonferroni"]: bonferroni(None, order=order),
+        CORRECTION_COLUMNS["bh"]: benjamini_hochberg(None, order=order),
+        CORRECTION_COLUMNS["qvalue"]: storey_qvalues(None, order=order)}
+    for name, values in corrections.items():
+        scores[name] = values
+    return scores
+
+
+def correct_result_files(families: Dict[Path, str]) -> None:
+    """
+    Recalculate the corrected p values of result files (fisher_result_*.csv or
+    sweep_result_*.csv) with the tests of multiple files in one family, e.g. all
+    traits of a method. The p values of all files are corrected in one pass and
+    every file is rewritten. The tests of each k of a threshold sweep stay
+    separate families.
+
+    :parameters
+    -----------
+    families - dict
+        The family of every result file, files with the same family are corrected together
+    """
+    results = {file: pd.read_csv(file, sep="\t", index_col=0) for file in families}
+    if not results:
+        return
+
+    combined = pd.concat(list(results.values()), ignore_index=True)
+    groups = np.concatenate([np.full(len(data), families[file], dtype=object)
+                                for file, data in results.items()])
+    if "top_k" in combined.columns:
+        groups = groups + "|" + combined["top_k"].astype(str).to_numpy(dtype=object)
+    combined = add_corrections(combined, groups)
+
+    start = 0
+    for file, data in results.items():
+        for column in CORRECTION_COLUMNS.values():
+            data[column] = combined[column].to_numpy()[start:start + len(data)]
+        start += len(data)
+        data.to_csv(file, sep="\t")
@@ -0,0 +1,333 @@
+"""
+Module that provides the HPO ontology (hp.obo): the is_a DAG of the HPO terms, its
+transitive closure and gene sets propagated up the DAG following the true-path rule
+(a gene annotated to a term is also annotated to all ancestors of that term).
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from utils.genes import TermGeneSets
+
+
+def parse_obo(file: Path) -> Tuple[Dict[str, str], Dict[str, List[str]], Dict[str, str]]:
+    """
+    Parse the [Term] stanzas of an OBO file, obsolete terms are skipped.
+
+    :parameters
+    -----------
+    file - Path
+        OBO file (e.g. hp.obo)
+
+    :returns
+    --------
+    names - dict
+        Name per term, in the order of the file
+    parents - dict
+        is_a parents per term
+    alt_ids - dict
+        Alternative IDs mapped to the ID of their term
+    """
+    names, parents, alt_ids = {}, {}, {}
+
+    def add(stanza: dict) -> None:
+        if "id" in stanza and not stanza.get("is_obsolete"):
+            names[stanza["id"]] = stanza.get("name", "")
+            parents[stanza["id"]] = stanza["is_a"]
+            for alt_id in stanza["alt_id"]:
+                alt_ids[alt_id] = stanza["id"]
+
+    stanza = None
+    with open(file, "r", encoding="utf-8") as file_handler:
+        for line in file_handler:
+            line = line.strip()
+            if line.startswith("["):
+                if stanza is not None:
+                    add(stanza)
+                stanza = {"is_a": [], "alt_id": []} if line == "[Term]" else None
+            elif stanza is not None and ": " in line:
+                tag, value = line.split(": ", 1)
+                # Remove trailing comments, e.g. "HP:0000118 ! Phenotypic abnormality"
+                value = value.split(" !", 1)[0].strip()
+                if tag in ("is_a", "alt_id"):
+                    stanza[tag].append(value)
+                elif tag == "is_obsolete":
+                    stanza[tag] = value == "true"
+                elif tag in ("id", "name"):
+                    stanza[tag] = value
+    if stanza is not None:
+        add(stanza)
+
+    return names, parents, alt_ids
+
+
+class Ontology:
+    """
+    The is_a DAG of an ontology together with its transitive closure.
+
+    The closure is stored as a sparse boolean term x term matrix in CSR form, in which
+    row i contains term i and all its ancestors. It is computed once by repeatedly
+    squaring the parent matrix, which takes a number of sparse products logarithmic
+    in the depth of the DAG instead of a graph walk per query.
+    """
+
+    closure_file = "closure.npz"
+    terms_file = "terms.json"
+
+    def __init__(self, names: Dict[str, str], parents: Dict[str, List[str]],
+                alt_ids: Dict[str, str]) -> None:
+        self.terms = pd.Index(list(names))
+        self.names = pd.Series(names, dtype=object)
+        self.alt_ids = alt_ids
+        self.closure = self.transitive_closure(self.terms, parents)
+
+    @classmethod
+    def from_obo(cls, file: Path) -> "Ontology":
+        """
+        Read an ontology from an OBO file.
+
+        :parameters
+        -----------
+        file - Path
+            OBO file (e.g. hp.obo)
+
+        :returns
+        --------
+        ontology - Ontology
+            The ontology
+        """
+        return cls(*parse_obo(file))
+
+    @classmethod
+    def load(cls, directory: Path) -> "Ontology":
+        """
+        Load an ontology that was saved with Ontology.save.
+
+        :parameters
+        -----------
+        directory - Path
+            Directory containing the saved ontology
+
+        :returns
+        --------
+        ontology - Ontology
+            The ontology
+        """
+        ontology = cls.__new__(cls)
+        with open(Path(directory) / cls.terms_file, "r", encoding="utf-8") as file_handler:
+            terms = json.load(file_handler)
+        ontology.terms = pd.Index(list(terms["names"]))
+        ontology.names = pd.Series(terms["names"], dtype=object)
+        ontology.alt_ids = terms["alt_ids"]
+        ontology.closure = sparse.load_npz(Path(directory) / cls.closure_file).tocsr()
+        return ontology
+
+    def save(self, directory: Path) -> None:
+        """
+        Save the terms and the transitive closure of the ontology.
+
+        :parameters
+        -----------
+        directory - Path
+            Output directory
+        """
+        sparse.save_npz(Path(directory) / self.closure_file, self.closure)
+        with open(Path(directory) / self.terms_file, "w", encoding="utf-8") as file_handler:
+            json.dump({"names": self.names.to_dict(), "alt_ids": self.alt_ids}, file_handler)
+
+    @staticmethod
+    def transitive_closure(terms: pd.Index, parents: Dict[str, List[str]]) -> sparse.csr_matrix:
+        """
+        Calculate the ancestor-or-self matrix of a DAG.
+
+        :parameters
+        -----------
+        terms - pd.Index
+            Terms of the ontology
+        parents - dict
+            is_a parents per term, parents that are not part of terms are ignored
+
+        :returns
+        --------
+        closure - sparse.csr_matrix
+            Boolean term x term matrix, True at (i, j) if term j is term i or an ancestor of it
+        """
+        rows, cols = [], []
+        for term, term_parents in parents.items():
+            codes = terms.get_indexer(term_parents)
+            codes = codes[codes >= 0]
+            rows.append(np.full(len(codes), terms.get_loc(term)))
+            cols.append(codes)
+
+        n_terms = len(terms)
+        edges = sparse.csr_matrix((np.ones(sum(map(len, cols)), dtype=bool),
+                                    (np.concatenate(rows) if rows else [],
+                                    np.concatenate(cols) if cols else [])),
+                                    shape=(n_terms, n_terms))
+        closure = (sparse.identity(n_terms, dtype=bool, format="csr") + edges).astype(bool)
+
+        # Every squaring doubles the path length that is covered
+        while True:
+            squared = (closure @ closure).astype(bool)
+            if squared.nnz == closure.nnz:
+                break
+            closure = squared
+
+        closure.sort_indices()
+        return closure
+
+    def get_indexer(self, terms: pd.Index, hpo_terms) -> np.ndarray:
+        """
+        Get the positions of HPO terms in an index of terms (e.g. the columns of the
+        HPO matrix). Terms that are not found by their ID are looked up by their primary
+        ID, so an alternative ID finds the position of its term.
+
+        :parameters
+        -----------
+        terms - pd.Index
+            Unique IDs of HPO terms
+        hpo_terms - list
+            IDs of the HPO terms to look up
+
+        :returns
+        --------
+        term_index - np.ndarray
+            Position of every HPO term in terms, -1 if it is not found
+        """
+        hpo_terms = pd.Index(hpo_terms)
+        term_index = terms.get_indexer(hpo_terms)
+        missing = term_index < 0
+        if missing.any():
+            term_index[missing] = terms.get_indexer([self.resolve(hpo_term)
+                                                    for hpo_term in hpo_terms[missing]])
+        return term_index
+
+    def resolve(self, hpo_term: str) -> str:
+        """
+        Get the primary ID of a term that may be referred to by an alternative ID.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+
+        :returns
+        --------
+        hpo_term - str
+            Primary ID of the term
+        """
+        return self.alt_ids.get(hpo_term, hpo_term)
+
+    def ancestors(self, hpo_term: str, include_self: bool = False) -> pd.Index:
+        """
+        Get all ancestors of a term.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+        include_self - bool
+            Also return the term itself
+
+        :returns
+        --------
+        ancestors - pd.Index
+            IDs of the ancestors, in the order of the ontology file
+        """
+        position = self.terms.get_loc(self.resolve(hpo_term))
+        codes = self.closure.indices[self.closure.indptr[position]:self.closure.indptr[position + 1]]
+        if not include_self:
+            codes = codes[codes != position]
+        return self.terms[codes]
+
+    def descendants(self, hpo_term: str, include_self: bool = False) -> pd.Index:
+        """
+        Get all descendants of a term.
+
+        :parameters
+        -----------
+        hpo_term - str
+            ID of HPO term (e.g. HP:00002)
+        include_self - bool
+            Also return the term itself
+
+        :returns
+        --------
+        descendants - pd.Index
+            IDs of the descendants, in the order of the ontology file
+        """
+        position = self.terms.get_loc(self.resolve(hpo_term))
+        codes = self.closure[:, position].nonzero()[0]
+        if not include_self:
+            codes = codes[codes != position]
+        return self.terms[np.sort(codes)]
+
+    def propagate(self, gene_sets: TermGeneSets) -> TermGeneSets:
+        """
+        Propagate gene sets up the DAG: the propagated genes of a term are the genes of
+        the term and of all its descendants. All terms are propagated at once with one
+        sparse matrix product.
+
+        Terms of the gene sets that are not part of the ontology keep their own genes,
+        terms of the ontology without gene set only get the genes of their descendants.
+
+        :parameters
+        -----------
+        gene_sets - TermGeneSets
+            Gene sets of the terms (e.g. of the HPO database)
+
+        :returns
+        --------
+        propagated - TermGeneSets
+            Propagated gene sets of all terms of the ontology, followed by the
+            terms of the gene sets that are not part of the ontology
+        """
+        gene_set_terms = pd.Index([self.resolve(term) for term in gene_sets.terms])
+        codes = self.terms.get_indexer(gene_set_terms)
+        known = codes >= 0
+
+        annotations = gene_sets.to_csr().astype(bool)
+        # Move the annotations of the known terms to the rows of the ontology terms
+        mapping = sparse.csr_matrix((np.ones(known.sum(), dtype=bool),
+                                    (codes[known], np.flatnonzero(known))),
+                                    shape=(len(self.terms), len(gene_set_terms)))
+        ontology_annotations = (mapping @ annotations).astype(bool)
+
+        # The transpose of the closure maps every term to its descendants
+        propagated = (self.closure.T.tocsr() @ ontology_annotations).astype(bool).tocsr()
+        unknown = annotations[np.flatnonzero(~known)]
+
+        combined = sparse.vstack([propagated, unknown], format="csr")
+        combined.sort_indices()
+        terms = self.terms.append(pd.Index(gene_sets.terms[~known]))
+        return TermGeneSets(combined.indptr.astype(np.int64), combined.indices.astype(np.int32),
+                            terms, gene_sets.n_genes)
+
+    def add_ancestor_terms(self, hpo_info: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add a row for every ancestor of the HPO term of each row of the HPO info, so
+        the enrichment is also tested at every ancestor level of the term.
+
+        :parameters
+        -----------
+        hpo_info - pd.DataFrame
+            A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
+
+        :returns
+        --------
+        hpo_info - pd.DataFrame
+            Every original row followed by the rows of the ancestors of its term, with an
+            extra column 'Ancestor of' containing the original HPO ID for the added rows
+        """
+        rows = []
+        for _, row in hpo_info.iterrows():
+            rows.append({**row, "Ancestor of": ""})
+            if self.resolve(row["HPO ID"]) not in self.terms:
+                continue
+            for ancestor in self.ancestors(row["HPO ID"]):
+                rows.append({**row, "Related HPO term": self.names[ancestor],
+                            "HPO ID": ancestor, "Ancestor of": row["HPO ID"]})
+        return pd.DataFrame(rows, columns=list(hpo_info.columns) + ["Ancestor of"])
@@ -0,0 +1,226 @@
+"""
+Module that provides functionality to calculate empirical p values for the enrichment
+of HPO terms by comparing the observed overlap with the overlap of random gene sets.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from utils.genes import GeneUniverse
+from utils.ontology import Ontology
+
+# HPO matrix of a worker process, set once by _init_worker
+_worker_matrix = {}
+
+
+@dataclass
+class PermutationTest:
+    """
+    Dataclass for performing permutation tests on the overlap between significant genes
+    and the genes of HPO terms.
+
+    Random gene sets of the same size as the significant genes are drawn from the genes
+    that overlap between the prioritization method and the HPO database. The overlap of a
+    chunk of random gene sets with all HPO terms is calculated with one sparse matrix
+    product. Every chunk has its own random seed derived from the main seed, so the
+    results do not depend on the number of workers.
+    """
+    n_permutations: int = 10000
+    seed: Optional[int] = None
+    chunk_size: int = 500
+    workers: int = 1
+
+    def perform_permutation_test(self, hpo_data: pd.DataFrame, gene_data: pd.Series,
+                                    hpo_scores: pd.DataFrame,
+                                    universe: Optional[GeneUniverse] = None,
+                                    ontology: Optional[Ontology] = None) -> pd.DataFrame:
+        """
+        Calculate empirical p values for the HPO terms in hpo_scores.
+
+        :parameters
+        -----------
+        hpo_data - pd.DataFrame
+            HPO metric inside a pandas data frame, only containing the overlapping genes
+        gene_data - pd.Series
+            List of significant genes
+        hpo_scores - pd.DataFrame
+            A data frame containing (at least) the HPO ID column
+        universe - GeneUniverse
+            Universe of the genes (rows) of hpo_data, default = a universe made from
+            the genes of hpo_data
+        ontology - Ontology
+            Ontology of the HPO terms, if given HPO IDs that are alternative IDs are
+            looked up by the primary ID of their term
+
+        :returns
+        --------
+        hpo_scores - pd.DataFrame
+            The original hpo_scores data frame with some additional information: the
+            observed overlap, the mean and standard deviation of the overlap of the random
+            gene sets, empirical zscores and two-sided empirical p values.
+        """
+        hpo_scores = hpo_scores.copy()
+
+        term_index = hpo_data.columns.get_indexer(hpo_scores["HPO ID"]) if ontology is None \
+            else ontology.get_indexer(hpo_data.columns, hpo_scores["HPO ID"])
+        found = term_index >= 0
+
+        hpo_matrix = self.to_sparse(hpo_data.to_numpy(), term_index[found])
+        if universe is None:
+            universe = GeneUniverse(hpo_data.index)
+        significant = universe.bitset(gene_data)
+        n_genes, n_significant = hpo_matrix.shape[0], int(significant.sum())
+
+        observed = np.asarray(hpo_matrix[significant].sum(axis=0)).ravel()
+        expected = n_significant * np.asarray(hpo_matrix.sum(axis=0)).ravel() / n_genes
+
+        totals = self.run_permutations(hpo_matrix, n_significant, observed, expected)
+        as_extreme, null_sum, null_squared_sum = totals
+
+        null_mean = null_sum / self.n_permutations
+        null_sd = np.sqrt(np.maximum(null_squared_sum / self.n_permutations - null_mean ** 2, 0))
+
+        columns = {"overlap": observed,
+                    "null_mean": null_mean,
+                    "null_sd": null_sd,
+                    "empirical_zscores": np.divide(observed - null_mean, null_sd,
+                                                    out=np.full(len(observed), np.nan),
+                                                    where=null_sd > 0),
+                    "empirical_pvalues": (as_extreme + 1) / (self.n_permutations + 1)}
+
+        for name, values in columns.items():
+            hpo_scores[name] = np.nan
+            hpo_scores.loc[found, name] = values
+
+        return hpo_scores
+
+    def run_permutations(self, hpo_matrix: sparse.csr_matrix, n_significant: int,
+                        observed: np.ndarray, expected: np.ndarray
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Run all permutations in chunks, divided over the workers.
+
+        :parameters
+        -----------
+        hpo_matrix - sparse.csr_matrix
+            Gene x term HPO matrix
+        n_significant - int
+            Size of the random gene sets
+        observed - np.ndarray
+            Observed overlap per HPO term
+        expected - np.ndarray
+            Expected overlap per HPO term
+
+        :returns
+        --------
+        as_extreme - np.ndarray
+            Number of random gene sets with an overlap at least as far from the
+            expected overlap as the observed overlap
+        null_sum - np.ndarray
+            Sum of the overlaps of the random gene sets
+        null_squared_sum - np.ndarray
+            Sum of the squared overlaps of the random gene sets
+        """
+        chunk_sizes = [min(self.chunk_size, self.n_permutations - start)
+                        for start in range(0, self.n_permutations, self.chunk_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(chunk_sizes))
+        jobs = [(size, seed, n_significant, observed, expected)
+                for size, seed in zip(chunk_sizes, seeds)]
+
+        if self.workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                    initargs=(hpo_matrix,)) as executor:
+                results = list(executor.map(_permutation_chunk, *zip(*jobs)))
+        else:
+            _init_worker(hpo_matrix)
+            results = [_permutation_chunk(*job) for job in jobs]
+
+        return tuple(np.sum(values, axis=0) for values in zip(*results))
+
+    @staticmethod
+    def to_sparse(hpo_matrix: np.ndarray, terms: np.ndarray,
+                    chunk_size: int = 2048) -> sparse.csr_matrix:
+        """
+        Convert (a selection of terms of) the dense HPO matrix to a sparse matrix,
+        a chunk of terms at a time to bound the memory usage.
+
+        :parameters
+        -----------
+        hpo_matrix - np.ndarray
+            Gene x term HPO matrix (0/1)
+        terms - np.ndarray
+            Column indices of the HPO terms
+        chunk_size - int
+            Number of HPO terms that are converted at once
+
+        :returns
+        --------
+        hpo_matrix - sparse.csr_matrix
+            Sparse gene x term HPO matrix
+        """
+        blocks = [sparse.csc_matrix(np.asarray(hpo_matrix[:, terms[start:start + chunk_size]]),
+                                    dtype=np.int32)
+                    for start in range(0, len(terms), chunk_size)]
+        if not blocks:
+            return sparse.csr_matrix((hpo_matrix.shape[0], 0), dtype=np.int32)
+        return sparse.hstack(blocks, format="csr")
+
+
+def _init_worker(hpo_matrix: sparse.csr_matrix) -> None:
+    """
+    Store the HPO matrix in a worker process.
+
+    :parameters
+    -----------
+    hpo_matrix - sparse.csr_matrix
+        Gene x term HPO matrix
+    """
+    _worker_matrix["hpo"] = hpo_matrix
+
+
+def _permutation_chunk(n_permutations: int, seed: np.random.SeedSequence,
+                        n_significant: int, observed: np.ndarray, expected: np.ndarray
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Draw a chunk of random gene sets and count their overlap with all HPO terms
+    using one sparse matrix product.
+
+    :parameters
+    -----------
+    n_permutations - int
+        Number of random gene sets
+    seed - np.random.SeedSequence
+        Seed of the chunk
+    n_significant - int
+        Size of the random gene sets
+    observed - np.ndarray
+        Observed overlap per HPO term
+    expected - np.ndarray
+        Expected overlap per HPO term
+
+    :returns
+    --------
+    as_extreme, null_sum, null_squared_sum - tuple
+        See PermutationTest.run_permutations
+    """
+    hpo_matrix = _worker_matrix["hpo"]
+    n_genes = hpo_matrix.shape[0]
+    rng = np.random.default_rng(seed)
+
+    genes = np.concatenate([np.sort(rng.choice(n_genes, n_significant, replace=False))
+                            for _ in range(n_permutations)])
+    gene_sets = sparse.csr_matrix((np.ones(len(genes), dtype=np.int32), genes,
+                                    np.arange(n_permutations + 1) * n_significant),
+                                    shape=(n_permutations, n_genes))
+
+    overlap = (gene_sets @ hpo_matrix).toarray()
+
+    # Small tolerance so equal deviations are not lost to floating point errors
+    deviation = np.abs(observed - expected) - 1e-9
+    as_extreme = (np.abs(overlap - expected) >= deviation).sum(axis=0)
+
+    return as_extreme, overlap.sum(axis=0, dtype=np.float64), \
+        (overlap.astype(np.float64) ** 2).sum(axis=0)
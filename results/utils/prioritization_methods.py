@@ -1,440 +1,802 @@
 """
 Module that contains functionality to process data from
 different prioritization methods to be able to perform fisher exact tests.
+
+Every prioritization method is declared by a subclass of PrioritizationMethod that
+registers itself under its name and only describes its output file: the file format,
+the gene ID column, the score column, the direction of the ranking and the rule that
+determines which genes are significant. Only the gene ID and score columns (and the
+column the significance rule needs) are read, into a table with the same columns
+for every method: gene, score and (for flag based rules) significant.
+
+With the compact loading profile the gene IDs (and flags) of the table are stored as
+categoricals and the scores as float32, if float32 keeps the ranking of the genes and
+the genes selected by the significance rule the same. The categories of the gene IDs
+are the genes of the HPO database, so all gene tables share one copy of the IDs.
 """
 
-from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+import numpy as np
 import pandas as pd
-from scipy import stats
+from utils.cache import SheetCache
+from utils.genes import normalize_gene_ids
+from utils.ranking import top_k
+
+
+# Columns of the uniform gene table
+GENE = "gene"
+SCORE = "score"
+SIGNIFICANT = "significant"
+
+# Options for pd.read_csv per delimited file format. The whitespace aligned format is
+# parsed with round trip precision, identical to the python engine that was used before.
+FILE_FORMATS = {"csv": {"sep": ","},
+                "tsv": {"sep": "\t"},
+                "whitespace": {"sep": r"\s+", "float_precision": "round_trip"}}
+
+# Profiles for loading the gene tables: default keeps the dtypes of pd.read_csv,
+# compact uses categoricals and float32 (see compact_table)
+LOADING_PROFILES = ["default", "compact"]
 
+# Registered prioritization methods, by name
+METHODS: Dict[str, Type["PrioritizationMethod"]] = {}
 
-class PrioritizationMethod(ABC):
+
+def register(name: str) -> Callable[[Type["PrioritizationMethod"]], Type["PrioritizationMethod"]]:
     """
-    Base class for a prioritization method.
+    Class decorator that registers a prioritization method under a name.
+
+    :parameters
+    -----------
+    name - str
+        Name of the prioritization method, as used on the command line
+
+    :returns
+    --------
+    decorator - function
+        Decorator that registers the class and returns it unchanged
     """
+    def decorator(cls):
+        cls.name = name
+        METHODS[name] = cls
+        return cls
+    return decorator
 
-    @abstractmethod
-    def read_data(self, data):
-        """
-        Read in data from a CSV file.
 
-        :parameters
-        -----------
-        data - Path
-            File containing the data
-        """
+def get_method(name: str) -> Type["PrioritizationMethod"]:
+    """
+    Get a registered prioritization method by its name, ignoring case.
+
+    :parameters
+    -----------
+    name - str
+        Name of the prioritization method
+
+    :returns
+    --------
+    method - type
+        Subclass of PrioritizationMethod
+
+    :raises
+    -------
+    ValueError
+        There is no prioritization method registered under the name
+    """
+    methods = {method.lower(): cls for method, cls in METHODS.items()}
+    if name.lower() not in methods:
+        raise ValueError(f"Unknown prioritization method '{name}', "\
+            f"choose from: {', '.join(METHODS)}")
+    return methods[name.lower()]
 
-    @abstractmethod
-    def filter_data(self, data, threshold):
-        """
-        Filter the data by only keeping the 'significant' genes.
 
-        :parameters
-        -----------
-        data - pd.DataFrame
-            Data
-        threshold - float
-            Threshold to determine what significant is.
-        """
+def read_delimited(file: Path, columns: Dict[str, str], options: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Read only the given columns of a delimited file with the C engine. Column names
+    are matched after removing trailing whitespace.
+
+    :parameters
+    -----------
+    file - Path
+        File containing the data
+    columns - dict
+        Column names in the file mapped to the names in the gene table
+    options - dict
+        File format options for pd.read_csv
+
+    :returns
+    --------
+    data - pd.DataFrame
+        The requested columns, renamed to the names in the gene table
+    """
+    data = pd.read_csv(file, usecols=lambda column: column.rstrip() in columns, **options)
+    data.columns = data.columns.str.rstrip()
+    return data.rename(columns=columns)[list(columns.values())]
 
-    @abstractmethod
-    def get_overlap_genes(self, data, genes):
-        """
-        Get the data that overlaps with a list of specified genes.
 
-        :parameters
-        -----------
-        data - pd.DataFrame
-            Data
-        genes - pd.Series
-            List of gene IDs
-        """
+def compact_scores(scores: pd.Series, thresholds: Sequence[float] = ()) -> pd.Series:
+    """
+    Store scores as float32 if every score stays distinct from all other scores and
+    every score stays on the same side of the thresholds. Rounding to float32 is
+    monotone, so the ranking of the scores stays the same. The sides are checked by
+    comparing the scores to the thresholds before and after the cast, the way the
+    significance rules do, since a score equal to a threshold can end up above it.
+
+    :parameters
+    -----------
+    scores - pd.Series
+        Scores of the genes
+    thresholds - list
+        Thresholds the scores are compared to
+
+    :returns
+    --------
+    scores - pd.Series
+        The scores as float32, or unchanged if float32 is not precise enough
+    """
+    if not pd.api.types.is_float_dtype(scores) or scores.dtype == np.float32:
+        return scores
+
+    values = scores.to_numpy(dtype=np.float64)
+    values = values[~np.isnan(values)]
+    with np.errstate(over="ignore"):
+        rounded = values.astype(np.float32)
+
+    if np.isinf(rounded).sum() != np.isinf(values).sum() or \
+        np.unique(rounded).shape[0] != np.unique(values).shape[0]:
+        return scores
+
+    # Depending on the numpy version and the type of the threshold, float32 scores are
+    # compared to a threshold in float64 or to the threshold rounded to float32
+    rounded = rounded.astype(np.float64)
+    for threshold in thresholds:
+        with np.errstate(over="ignore"):
+            compared = [np.float64(threshold), np.float64(np.float32(threshold))]
+        for value in compared:
+            if not (np.array_equal(values > threshold, rounded > value) and
+                    np.array_equal(values < threshold, rounded < value)):
+                return scores
+    return scores.astype(np.float32)
+
+
+def shared_categorical(genes: pd.Series, shared: pd.Index) -> pd.Series:
+    """
+    Store gene IDs as a categorical whose categories are a shared index of gene IDs
+    (e.g. the genes of the HPO database) followed by the genes that are not part of it.
+
+    :parameters
+    -----------
+    genes - pd.Series
+        Gene IDs
+    shared - pd.Index
+        Unique gene IDs that are shared by all gene tables
+
+    :returns
+    --------
+    genes - pd.Series
+        Categorical gene IDs
+    """
+    codes = shared.get_indexer(genes)
+    unknown = genes[(codes < 0) & genes.notna()]
+    categories = shared
+    if len(unknown):
+        extra = pd.Index(pd.unique(unknown))
+        codes[codes < 0] = np.where(genes[codes < 0].notna(),
+                                    len(shared) + extra.get_indexer(genes[codes < 0]), -1)
+        categories = shared.append(extra)
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories)),
+                        index=genes.index, name=genes.name)
+
+
+def table_memory(data: pd.DataFrame, shared: Optional[pd.Index] = None) -> int:
+    """
+    Get the memory of a gene table in bytes, including the strings of text columns.
+    Gene IDs of categorical columns that are part of the shared gene IDs (see
+    shared_categorical) are not counted, they are stored once for all gene tables.
+
+    :parameters
+    -----------
+    data - pd.DataFrame
+        Gene table
+    shared - pd.Index
+        Unique gene IDs that are shared by all gene tables
+
+    :returns
+    --------
+    n_bytes - int
+        Memory of the gene table
+    """
+    n_bytes = data.index.memory_usage(deep=True)
+    for column in data.columns:
+        values = data[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            n_bytes += values.memory_usage(deep=True, index=False)
+            continue
+
+        categories = values.cat.categories
+        n_bytes += values.cat.codes.to_numpy().nbytes
+        if shared is not None and categories is shared:
+            continue
+        n_shared = len(shared) if shared is not None and \
+            categories[:len(shared)].equals(shared) else 0
+        # A copy of the shared index only stores references to the shared strings
+        n_bytes += n_shared * np.dtype(object).itemsize
+        n_bytes += pd.Series(categories[n_shared:]).memory_usage(deep=True, index=False)
+    return int(n_bytes)
+
+
+def compact_table(data: pd.DataFrame, thresholds: Sequence[float] = (),
+                    shared: Optional[pd.Index] = None) -> pd.DataFrame:
+    """
+    Reduce the memory of a gene table: text columns (gene IDs, flags) become
+    categoricals and the scores float32 where the precision allows it (see compact_scores).
+
+    :parameters
+    -----------
+    data - pd.DataFrame
+        Gene table
+    thresholds - list
+        Thresholds the scores are compared to
+    shared - pd.Index
+        Unique gene IDs that are shared by all gene tables (e.g. the genes of the HPO
+        database), used as categories of the gene IDs
+
+    :returns
+    --------
+    data - pd.DataFrame
+        The compact gene table
+    """
+    for column in data.columns:
+        if column == SCORE:
+            data[column] = compact_scores(data[column], thresholds)
+        elif not pd.api.types.is_string_dtype(data[column]):
+            continue
+        elif column == GENE and shared is not None:
+            data[column] = shared_categorical(data[column], shared)
+        else:
+            data[column] = data[column].astype("category")
+    return data
+
+
+@dataclass(frozen=True)
+class ScoreAbove:
+    """
+    Significance rule: genes with a score above a threshold are significant.
+    """
+    threshold: float
 
-    def get_overlap(self, hpo_data, genes):
+    def select(self, data: pd.DataFrame, threshold: Optional[float] = None) -> pd.DataFrame:
         """
-        Get the genes overlapping with the HPO database.
+        Select the significant genes.
 
         :parameters
         -----------
-        hpo_data - pd.DataFrame
-            HPO data inside a pandas dataframe
-        genes - pd.Series
-            Series of gene IDs
+        data - pd.DataFrame
+            Gene table
+        threshold - float
+            Overrides the default threshold of the rule
 
         :returns
         --------
-        overlap_hpo - pd.DataFrame
-            HPO data overlapping with the supplied genes
-        overlap_genes - pd.Series
-            Genes overlapping with the HPO data
-        total_overlap - int
-            Total number of overlapping genes
+        significant - pd.DataFrame
+            Rows of the significant genes
         """
-        overlapping_genes_data = hpo_data[hpo_data.index.isin(genes)]
-        overlapping_genes = overlapping_genes_data.index
-        total_overlap = overlapping_genes.shape[0]
+        return data[data[SCORE] > (self.threshold if threshold is None else threshold)]
 
-        # Only keep the genes that overlap with HPO
-        overlap_genes = genes[genes.isin(overlapping_genes)]
-
-        # Only keep releveant HPO data
-        overlap_hpo = hpo_data[hpo_data.index.isin(overlapping_genes)]
-        return overlap_hpo, overlap_genes, total_overlap
 
-
-class NetWAS(PrioritizationMethod):
+@dataclass(frozen=True)
+class ScoreBelow:
     """
-    Subclass for the gene prioritization method NetWAS.
+    Significance rule: genes with a score (p value) below a threshold are significant.
     """
+    threshold: float
 
-    def __init__(self, hpo, fisher):
-        self.hpo = hpo
-        self.fisher = fisher
-
-    def read_data(self, data):
+    def select(self, data: pd.DataFrame, threshold: Optional[float] = None) -> pd.DataFrame:
         """
-        Read in data from a CSV file.
+        Select the significant genes.
 
         :parameters
         -----------
-        data - Path
-            File containing the data
+        data - pd.DataFrame
+            Gene table
+        threshold - float
+            Overrides the default threshold of the rule
 
         :returns
         --------
-        netwas_data - pd.DataFrame
-            Data in a data frame
-        genes - pd.Series
-            Gene IDs
+        significant - pd.DataFrame
+            Rows of the significant genes
         """
-        netwas_data = pd.read_csv(data, sep=",")
-        genes = netwas_data.ensemble_id
-        return netwas_data, genes
+        return data[data[SCORE] < (self.threshold if threshold is None else threshold)]
 
-    def get_overlap_genes(self, data, genes):
+
+@dataclass(frozen=True)
+class TopRanked:
+    """
+    Significance rule: the k genes with the highest score are significant,
+    ties at the cutoff are broken by the order of the data.
+    """
+    k: int
+
+    def select(self, data: pd.DataFrame, threshold: Optional[int] = None) -> pd.DataFrame:
         """
-        Get the data that overlaps with a list of specified genes.
+        Select the significant genes.
 
         :parameters
         -----------
         data - pd.DataFrame
-            Data
-        genes - pd.Series
-            List of gene IDs
+            Gene table
+        threshold - int
+            Overrides the default number of genes of the rule
 
         :returns
         --------
-        overlap_netwas - pd.DataFrame
-            Data overlapping with specified genes
+        significant - pd.DataFrame
+            Rows of the significant genes
         """
-        overlap_netwas = data[data.ensemble_id.isin(genes)]
-        return overlap_netwas
+        k = self.k if threshold is None else threshold
+        return data.iloc[top_k(data[SCORE].to_numpy(), k)]
 
-    def filter_data(self, data, threshold=0.5):
+
+@dataclass(frozen=True)
+class FlagEquals:
+    """
+    Significance rule: genes for which a column of the method has a given value
+    (e.g. an FDR flag) are significant. The column is read into the gene table
+    as the significant column.
+    """
+    column: str
+    value: Any
+
+    def select(self, data: pd.DataFrame, threshold: Optional[float] = None) -> pd.DataFrame:
         """
-        Filter the data by only keeping the 'significant' genes.
+        Select the significant genes.
 
         :parameters
         -----------
         data - pd.DataFrame
-            Data
+            Gene table
         threshold - float
-            Threshold to determine what significant is.
+            Not used, the flag is set by the prioritization method
 
         :returns
         --------
-        significant_netwas - pd.DataFrame
-            Data containing only the significant genes
-        significant_genes - pd.Series
-            Gene IDs of the significant genes
+        significant - pd.DataFrame
+            Rows of the significant genes
         """
-        significant_netwas = data[data.netwas_score > threshold]
-        significant_genes = significant_netwas.ensemble_id
-        return significant_netwas, significant_genes
+        return data[data[SIGNIFICANT] == self.value]
 
 
-class PoPs(PrioritizationMethod):
+class GeneTable:
     """
-    Subclass for the gene prioritization method PoPs.
+    Gene table of the results of a prioritization method. Only the gene ID, score
+    and (if the significance rule needs it) flag columns are read, once, when the
+    data is first accessed.
+    """
+
+    def __init__(self, file: Path, method: "PrioritizationMethod",
+                    threshold: Optional[float] = None) -> None:
+        self.file = Path(file)
+        self.method = method
+        self.threshold = threshold
+        self._data = None
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """
+        The gene table, with the columns gene, score and (for flag based rules) significant.
+        """
+        if self._data is None:
+            data = self.method.read_columns(self.file, self.method.get_columns())
+            data[GENE] = normalize_gene_ids(data[GENE])
+            if self.method.profile == "compact":
+                universe = getattr(self.method.hpo, "universe", None)
+                shared = universe.genes if universe is not None else None
+
+                before = table_memory(data)
+                data = compact_table(data, self.method.thresholds(self.threshold), shared)
+                after = table_memory(data, shared)
+                print(f"Gene table {self.file.name} ({self.method.name}): "
+                        f"{before / 1e6:.2f} MB -> {after / 1e6:.2f} MB (compact)")
+            self._data = data
+        return self._data
+
+    @property
+    def genes(self) -> pd.Series:
+        """
+        The gene IDs.
+        """
+        return self.data[GENE]
+
+
+class PrioritizationMethod:
+    """
+    Base class for a prioritization method.
+
+    Subclasses declare:
+
+    file_format - str
+        Format of the output file: csv, tsv, whitespace (aligned columns) or excel
+    sheet - str
+        Name of the sheet (excel only)
+    id_column - str
+        Column containing the ensembl gene IDs
+    score_column - str
+        Column containing the score the genes are ranked on
+    ascending - bool
+        True if a lower score is better (p values)
+    significance - ScoreAbove, ScoreBelow, TopRanked or FlagEquals
+        Rule that determines which genes are significant
+
+    :parameters
+    -----------
+    hpo - HPO
+        HPO database
+    fisher - FisherTest
+        Fisher's exact test
+    profile - str
+        Loading profile of the gene tables: default or compact (see LOADING_PROFILES)
     """
 
-    def __init__(self, hpo, fisher):
+    name: str
+    file_format: str
+    sheet: Optional[str] = None
+    id_column: str
+    score_column: str
+    ascending: bool = False
+    significance: Any
+
+    def __init__(self, hpo, fisher, profile="default"):
+        if profile not in LOADING_PROFILES:
+            raise ValueError(f"Unsupported loading profile: {profile}, "\
+                f"choose from: {', '.join(LOADING_PROFILES)}")
         self.hpo = hpo
         self.fisher = fisher
+        self.profile = profile
 
-    def read_data(self, data):
+    def thresholds(self, threshold: Optional[float] = None) -> List[float]:
         """
-        Read in data from a CSV file.
+        Get the score thresholds of the significance rule.
 
         :parameters
         -----------
-        data - Path
-            File containing the data
+        threshold - float
+            Threshold that overrides the default threshold of the rule (see filter_data)
 
         :returns
         --------
-        pops_data - pd.DataFrame
-            Data in a data frame
-        genes - pd.Series
-            Gene IDs
+        thresholds - list
+            The threshold of a ScoreAbove or ScoreBelow rule, empty for other rules
         """
-        pops_data = pd.read_csv(data, sep="\t")
-        genes = pops_data["ENSGID"]
-        return pops_data, genes
+        if isinstance(self.significance, (ScoreAbove, ScoreBelow)):
+            return [self.significance.threshold if threshold is None else threshold]
+        return []
 
-    def get_overlap_genes(self, data, genes):
+    def get_columns(self) -> Dict[str, str]:
         """
-        Get the data that overlaps with a list of specified genes.
-
-        :parameters
-        -----------
-        data - pd.DataFrame
-            Data
-        genes - pd.Series
-            List of gene IDs
+        Get the columns that are read from the output file.
 
         :returns
         --------
-        overlap_pops - pd.DataFrame
-            Data overlapping with specified genes
+        columns - dict
+            Column names in the file mapped to the names in the gene table
         """
-        overlap_pops = data[data["ENSGID"].isin(genes)]
-        return overlap_pops
+        columns = {self.id_column: GENE, self.score_column: SCORE}
+        if isinstance(self.significance, FlagEquals):
+            columns[self.significance.column] = SIGNIFICANT
+        return columns
 
-    def filter_data(self, data, threshold=500):
+    def read_columns(self, file: Path, columns: Dict[str, str]) -> pd.DataFrame:
         """
-        Filter the data by only keeping the 'significant' genes.
+        Read only the given columns of the output file.
 
         :parameters
         -----------
-        data - pd.DataFrame
-            Data
-        threshold - float
-            Threshold to determine what significant is.
+        file - Path
+            File containing the data
+        columns - dict
+            Column names in the file mapped to the names in the gene table
 
         :returns
         --------
-        significant_pops - pd.DataFrame
-            Data containing only the significant genes
-        significant_genes - pd.Series
-            Gene IDs of the significant genes
+        data - pd.DataFrame
+            The requested columns, renamed to the names in the gene table
         """
-        significant_pops = data.sort_values("PoPS_Score", ascending=False).iloc[0:threshold, :]
-        significant_genes = significant_pops["ENSGID"]
-        return significant_pops, significant_genes
-
-
-class Depict(PrioritizationMethod):
-    """
-    Subclass for the gene prioritization method Depict
-    """
+        if self.file_format == "excel":
+            data = SheetCache(file, self.sheet, list(columns)).load()
+            return data.rename(columns=columns)
+        return read_delimited(file, columns, FILE_FORMATS[self.file_format])
 
-    def __init__(self, hpo, fisher):
-        self.hpo = hpo
-        self.fisher = fisher
-
-    def read_data(self, data):
+    def table(self, data: Path, threshold: Optional[float] = None) -> GeneTable:
         """
-        Read in data from a CSV file.
+        Get the gene table of an output file.
 
         :parameters
         -----------
         data - Path
             File containing the data
+        threshold - float
+            Threshold the significant genes will be selected with, default = the
+            default threshold of the prioritization method
 
         :returns
         --------
-        depict_data - pd.DataFrame
-            Data in a data frame
-        genes - pd.Series
-            Gene IDs
+        table - GeneTable
+            Gene table
         """
-        depict_data = pd.read_csv(data, sep="\t")
-        depict_data.columns = depict_data.columns.str.rstrip()
-        depict_data["Ensembl Gene ID"] = depict_data["Ensembl Gene ID"].str.rstrip()
-        depict_data["zscores"] = stats.zscore(depict_data["Nominal P value"], nan_policy='omit')
-        genes = depict_data["Ensembl Gene ID"]
-        return depict_data, genes
+        return GeneTable(data, self, threshold)
 
-    def get_overlap_genes(self, data, genes):
+    def read_data(self, data, threshold=None):
         """
-        Get the data that overlaps with a list of specified genes.
+        Read in the gene table of an output file.
 
         :parameters
         -----------
-        data - pd.DataFrame
-            Data
-        genes - pd.Series
-            List of gene IDs
+        data - Path
+            File containing the data
+        threshold - float
+            Threshold the significant genes will be selected with, default = the
+            default threshold of the prioritization method
 
         :returns
         --------
-        overlap_depict - pd.DataFrame
-            Data overlapping with specified genes
+        method_data - pd.DataFrame
+            Gene table with the columns gene, score and (for flag based rules) significant
+        genes - pd.Series
+            Gene IDs
         """
-        overlap_depict = data[data["Ensembl Gene ID"].isin(genes)]
-        return overlap_depict
+        table = self.table(data, threshold)
+        return table.data, table.genes
 
-    def filter_data(self, data, threshold = None):
+    def filter_data(self, data, threshold=None):
         """
         Filter the data by only keeping the 'significant' genes.
 
         :parameters
         -----------
         data - pd.DataFrame
-            Data
+            Gene table
         threshold - float
-            Threshold to determine what significant is.
+            Threshold to determine what significant is, default = the default
+            threshold of the prioritization method
 
         :returns
         --------
-        significant_depict - pd.DataFrame
+        significant_data - pd.DataFrame
             Data containing only the significant genes
         significant_genes - pd.Series
             Gene IDs of the significant genes
         """
-        significant_depict = data[data["False discovery rate < 5%"] == "Yes"]
-        significant_genes = significant_depict["Ensembl Gene ID"]
-        return significant_depict, significant_genes
-
-
-class Downstreamer(PrioritizationMethod):
-    """
-    Subclass for the gene prioritization method Downstreamer.
-    """
-
-    def __init__(self, hpo, fisher):
-        self.hpo = hpo
-        self.fisher = fisher
+        significant_data = self.significance.select(data, threshold)
+        return significant_data, significant_data[GENE]
 
-    def read_data(self, data):
+    def get_overlap_genes(self, data, genes):
         """
-        Read in data from a CSV file.
+        Get the data that overlaps with a list of specified genes.
 
         :parameters
         -----------
-        data - Path
-            File containing the data
+        data - pd.DataFrame
+            Gene table
+        genes - pd.Series
+            List of gene IDs
 
         :returns
         --------
-        downstreamer_data - pd.DataFrame
-            Data in a data frame
-        genes - pd.Series
-            Gene IDs
+        overlap_data - pd.DataFrame
+            Data overlapping with specified genes
         """
-        downstreamer_data = pd.read_excel(data, "GenePrioritization")
-        genes = downstreamer_data["Gene ID"]
-        return downstreamer_data, genes
+        return data[self.hpo.universe.isin(data[GENE], genes)]
 
-    def get_overlap_genes(self, data, genes):
+    def rank(self, data, k=None):
         """
-        Get the data that overlaps with a list of specified genes.
+        Get the positions of the k most prioritized genes, from most to least prioritized.
+        Genes with the same score keep the order of the data.
 
         :parameters
         -----------
         data - pd.DataFrame
-            Data
-        genes - pd.Series
-            List of gene IDs
+            Gene table
+        k - int
+            Number of genes, default = all genes
 
         :returns
         --------
-        overlap_downstreamer - pd.DataFrame
-            Data overlapping with specified genes
+        positions - np.ndarray
+            Row positions in the gene table
         """
-        overlap_downstreamer = data[data["Gene ID"].isin(genes)]
-        return overlap_downstreamer
+        return top_k(data[SCORE].to_numpy(), k, ascending=self.ascending)
 
-    def filter_data(self, data, threshold = None):
+    def rank_genes(self, data, k=None):
         """
-        Filter the data by only keeping the 'significant' genes.
+        Rank the genes from most to least prioritized by their score.
+        Genes with the same score keep the order of the data.
 
         :parameters
         -----------
         data - pd.DataFrame
-            Data
-        threshold - float
-            Threshold to determine what significant is.
+            Gene table
+        k - int
+            Only return the k most prioritized genes, default = all genes
 
         :returns
         --------
-        significant_downstreamer - pd.DataFrame
-            Data containing only the significant genes
-        significant_genes - pd.Series
-            Gene IDs of the significant genes
+        ranked_genes - pd.Series
+            Gene IDs sorted from most to least prioritized
         """
-        significant_downstreamer = data[data["FDR 5% significant"] == True]
-        significant_genes = significant_downstreamer["Gene ID"]
-        return significant_downstreamer, significant_genes
-
+        return data[GENE].iloc[self.rank(data, k)]
 
-class Magma(PrioritizationMethod):
-    """
-    Subclass for the gene prioritization method Magma.
-    """
-
-    def __init__(self, hpo, fisher):
-        self.hpo = hpo
-        self.fisher = fisher
-
-    def read_data(self, data):
+    def get_overlap(self, hpo_data, genes):
         """
-        Read in data from a CSV file.
+        Get the genes overlapping with the HPO database. The genes are encoded
+        once with the gene universe of the HPO database, the overlap is then
+        taken on the integer codes.
 
         :parameters
         -----------
-        data - Path
-            File containing the data
+        hpo_data - pd.DataFrame
+            HPO data inside a pandas dataframe
+        genes - pd.Series
+            Series of gene IDs
 
         :returns
         --------
-        magma_data - pd.DataFrame
-            Data in a data frame
-        genes - pd.Series
-            Gene IDs
+        overlap_hpo - pd.DataFrame
+            HPO data overlapping with the supplied genes
+        overlap_genes - pd.Series
+            Genes overlapping with the HPO data
+        total_overlap - int
+            Total number of overlapping genes
         """
-        magma_data = pd.read_csv(data, sep='\s\s+', engine='python')
-        genes = magma_data["GENE"]
-        return magma_data, genes
+        codes = self.hpo.get_universe(hpo_data).encode(genes)
+        found = codes >= 0
+        overlapping_codes = np.unique(codes[found])
+        total_overlap = overlapping_codes.shape[0]
 
-    def get_overlap_genes(self, data, genes):
+        # Only keep the genes that overlap with HPO
+        overlap_genes = genes[found]
+
+        # Only keep releveant HPO data
+        overlap_hpo = hpo_data.iloc[overlapping_codes]
+        return overlap_hpo, overlap_genes, total_overlap
+
+    def perform_threshold_sweep(self, data, hpo_info, k_values):
         """
-        Get the data that overlaps with a list of specified genes.
+        Perform fisher's exact tests on the top k genes of the prioritization
+        method for a whole range of k in one pass over the ranked genes.
 
         :parameters
         -----------
-        data - pd.DataFrame
-            Data
-        genes - pd.Series
-            List of gene IDs
+        data - Path
+            File containing the data
+        hpo_info - pd.DataFrame
+            A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
+        k_values - list
+            Numbers of top ranked genes to use as significant genes
 
         :returns
         --------
-        overlap_magma - pd.DataFrame
-            Data overlapping with specified genes
+        sweep_scores - pd.DataFrame
+            The hpo_info data frame repeated for every k, with the OR, p values and
+            zscores of the tests
         """
-        overlap_magma = data[data["GENE"].isin(genes)]
-        return overlap_magma
+        method_data, genes = self.read_data(data)
+
+        overlap_hpo, overlap_genes, _ = self.get_overlap(self.hpo.hpo_data, genes)
 
-    def filter_data(self, data, threshold=1.084e-4):
+        overlap_method = self.get_overlap_genes(method_data, overlap_genes)
+
+        # Genes ranked below the largest k are never used. A gene ID that occurs more
+        # than once (e.g. after mapping entrez to ensembl IDs) is only counted once, so
+        # every duplicate moves the cut one gene down
+        codes = self.hpo.universe.encode(overlap_method[GENE])
+        n_duplicates = codes.shape[0] - np.unique(codes).shape[0]
+        ranked_genes = self.rank_genes(overlap_method, max(k_values, default=0) + n_duplicates)
+
+        return self.fisher.perform_threshold_sweep(overlap_hpo, ranked_genes, hpo_info, k_values,
+                                                    self.hpo.get_universe(overlap_hpo),
+                                                    self.hpo.obo)
+
+    def perform_fisher_exact_tests(self, data, hpo_info, threshold=None, permutation_test=None):
         """
-        Filter the data by only keeping the 'significant' genes.
+        Perform fisher's exact tests on the results of the prioritization method
+        for a list of HPO terms: read in the data, take the overlap with the
+        HPO database, select the significant genes and test them.
 
         :parameters
         -----------
-        data - pd.DataFrame
-            Data
+        data - Path
+            File containing the data
+        hpo_info - pd.DataFrame
+            A data frame containing the name of the GWAS trait, Related HPO term, and HPO ID
         threshold - float
-            Threshold to determine what gene is significant.
+            Threshold to determine what significant is, default = the default
+            threshold of the prioritization method
+        permutation_test - PermutationTest
+            If supplied, empirical p values are calculated as well
 
         :returns
         --------
-        significant_magma - pd.DataFrame
-            Data containing only the significant genes
-        significant_genes - pd.Series
-            Gene IDs of the significant genes
+        hpo_scores - pd.DataFrame
+            The hpo_info data frame with the OR, p values and zscores of the tests
         """
-        significant_magma = data[data["P"] < threshold]
-        significant_genes = significant_magma["GENE"]
-        return significant_magma, significant_genes
+        method_data, genes = self.read_data(data, threshold)
+
+        overlap_hpo, overlap_genes, _ = self.get_overlap(self.hpo.hpo_data, genes)
+
+        overlap_method = self.get_overlap_genes(method_data, overlap_genes)
+
+        if threshold is None:
+            _, sig_genes = self.filter_data(overlap_method)
+        else:
+            _, sig_genes = self.filter_data(overlap_method, threshold)
+
+        universe = self.hpo.get_universe(overlap_hpo)
+        hpo_scores = self.fisher.perform_fisher_exact_tests(overlap_hpo, sig_genes, hpo_info,
+                                                            universe, self.hpo.obo)
+
+        if permutation_test is not None:
+            hpo_scores = permutation_test.perform_permutation_test(overlap_hpo, sig_genes,
+                                                                    hpo_scores, universe,
+                                                                    self.hpo.obo)
+        return hpo_scores
+
+
+@register("NetWAS")
+class NetWAS(PrioritizationMethod):
+    """
+    Subclass for the gene prioritization method NetWAS.
+    """
+    file_format = "csv"
+    id_column = "ensemble_id"
+    score_column = "netwas_score"
+    significance = ScoreAbove(0.5)
+
+
+@register("PoPs")
+class PoPs(PrioritizationMethod):
+    """
+    Subclass for the gene prioritization method PoPs.
+    """
+    file_format = "tsv"
+    id_column = "ENSGID"
+    score_column = "PoPS_Score"
+    significance = TopRanked(500)
+
+
+@register("DEPICT")
+class Depict(PrioritizationMethod):
+    """
+    Subclass for the gene prioritization method Depict
+    """
+    file_format = "tsv"
+    id_column = "Ensembl Gene ID"
+    score_column = "Nominal P value"
+    ascending = True
+    significance = FlagEquals("False discovery rate < 5%", "Yes")
+
+
+@register("Downstreamer")
+class Downstreamer(PrioritizationMethod):
+    """
+    Subclass for the gene prioritization method Downstreamer.
+    """
+    file_format = "excel"
+    sheet = "GenePrioritization"
+    id_column = "Gene ID"
+    score_column = "Enrichment P-value"
+    ascending = True
+    significance = FlagEquals("FDR 5% significant", True)
+
+
+@register("MAGMA")
+class Magma(PrioritizationMethod):
+    """
+    Subclass for the gene prioritization method Magma.
+    """
+    file_format = "whitespace"
+    id_column = "GENE"
+    score_column = "P"
+    ascending = True
+    significance = ScoreBelow(1.084e-4)
@@ -0,0 +1,50 @@
+"""
+Module that provides rank based selection of genes by their scores. The k best genes
+are found with a partial selection (np.argpartition) instead of sorting all genes.
+"""
+
+from typing import Optional
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: Optional[int] = None, ascending: bool = False) -> np.ndarray:
+    """
+    Get the positions of the k best scores, from best to worst. Only the k selected
+    scores are sorted, so this takes O(n + k log k) instead of O(n log n) time.
+
+    Ties are broken by position, so the result is deterministic and equal to the first
+    k positions of a stable sort. Missing scores (NaN) are ranked last.
+
+    :parameters
+    -----------
+    scores - np.ndarray
+        Scores of the genes
+    k - int
+        Number of positions to return, default = all positions
+    ascending - bool
+        True if lower scores are better (e.g. p values)
+
+    :returns
+    --------
+    positions - np.ndarray
+        Positions of the k best scores, best first
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    missing = np.isnan(scores)
+    valid = np.flatnonzero(~missing)
+    # Lower keys are better
+    keys = scores[valid] if ascending else -scores[valid]
+
+    n_valid = valid.shape[0]
+    k = scores.shape[0] if k is None else max(0, min(k, scores.shape[0]))
+
+    if k < n_valid:
+        kth = np.partition(keys, k - 1)[k - 1] if k > 0 else -np.inf
+        better = np.flatnonzero(keys < kth)
+        # Only the first positions of the scores equal to the k-th score are kept
+        tied = np.flatnonzero(keys == kth)[:k - better.shape[0]]
+        selected = np.concatenate([better, tied])
+        return valid[selected[np.argsort(keys[selected], kind="stable")]]
+
+    order = valid[np.argsort(keys, kind="stable")]
+    return np.concatenate([order, np.flatnonzero(missing)[:k - n_valid]])